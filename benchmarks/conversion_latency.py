@@ -0,0 +1,172 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Measures the latency of `malt.to_graph`.
+
+Usage:
+
+    python -m benchmarks.conversion_latency [--repeats N] [--json out.json]
+
+Cold measurements convert each function with an empty cache of converted
+functions, which is the latency of the first call to a function. Warm
+measurements hit the cache. The time of cold conversions is also broken down
+into the stages reported by `malt.stats`.
+"""
+
+import argparse
+import contextlib
+import json
+import statistics
+import sys
+import time
+
+import malt
+from malt.impl import api
+
+from benchmarks import corpus
+
+SYNTHETIC_SIZES = (1, 2, 4, 8, 16)
+SYNTHETIC_DEPTHS = (1, 2, 4, 8)
+
+
+@contextlib.contextmanager
+def _empty_cache():
+  """Temporarily replaces the transpiler, to start from an empty cache."""
+  transpiler = api._TRANSPILER  # pylint:disable=protected-access
+  api._TRANSPILER = api.PyToPy()  # pylint:disable=protected-access
+  try:
+    yield
+  finally:
+    api._TRANSPILER = transpiler  # pylint:disable=protected-access
+
+
+def _median_seconds(fn, repeats):
+  times = []
+  for _ in range(repeats):
+    start = time.perf_counter()
+    fn()
+    times.append(time.perf_counter() - start)
+  return statistics.median(times)
+
+
+def measure(fn, repeats=5, warm_repeats=100):
+  """Measures the conversion latency of a function.
+
+  Args:
+    fn: Callable, the function to convert.
+    repeats: int, the number of cold conversions.
+    warm_repeats: int, the number of warm conversions.
+
+  Returns:
+    Dict[Text, Any], with the median `cold` and `warm` latencies in seconds,
+    and the mean time of each conversion stage in `stages`.
+  """
+  cold_times = []
+  malt.reset_stats()
+  for _ in range(repeats):
+    with _empty_cache():
+      start = time.perf_counter()
+      malt.to_graph(fn)
+      cold_times.append(time.perf_counter() - start)
+  stages = {
+      name: s['seconds'] / repeats
+      for name, s in malt.stats()['stages'].items()
+  }
+
+  malt.to_graph(fn)
+  warm = _median_seconds(lambda: malt.to_graph(fn), warm_repeats)
+
+  return {
+      'cold': statistics.median(cold_times),
+      'warm': warm,
+      'stages': stages,
+  }
+
+
+def benchmark_functions():
+  """Returns the functions to benchmark, with their names."""
+  functions = corpus.reference_functions()
+  for size in SYNTHETIC_SIZES:
+    functions.append(('synthetic.size_{}'.format(size),
+                      corpus.synthetic_function(size, 2)))
+  for depth in SYNTHETIC_DEPTHS:
+    functions.append(('synthetic.depth_{}'.format(depth),
+                      corpus.synthetic_function(2, depth)))
+  return functions
+
+
+def run(repeats=5, warm_repeats=100):
+  """Runs the benchmarks.
+
+  Args:
+    repeats: int, see `measure`.
+    warm_repeats: int, see `measure`.
+
+  Returns:
+    Tuple[Dict[Text, Dict], Dict[Text, Text]], the results for each function,
+    and the errors for the functions that could not be converted.
+  """
+  results = {}
+  errors = {}
+  for name, fn in benchmark_functions():
+    try:
+      results[name] = measure(fn, repeats, warm_repeats)
+    except Exception as e:  # pylint:disable=broad-except
+      errors[name] = '{}: {}'.format(type(e).__name__, e)
+  return results, errors
+
+
+def _report(results, errors, out):
+  """Prints a summary of the results."""
+  print('{:<70} {:>10} {:>10}'.format('function', 'cold (ms)', 'warm (us)'),
+        file=out)
+  for name, r in results.items():
+    print('{:<70} {:>10.2f} {:>10.2f}'.format(name, r['cold'] * 1e3,
+                                              r['warm'] * 1e6), file=out)
+
+  totals = {}
+  for r in results.values():
+    for stage, seconds in r['stages'].items():
+      totals[stage] = totals.get(stage, 0.0) + seconds
+  total = sum(totals.values()) or 1.0
+  print('\n{:<40} {:>10} {:>8}'.format('stage', 'total (ms)', 'share'),
+        file=out)
+  for stage, seconds in sorted(totals.items(), key=lambda i: -i[1]):
+    print('{:<40} {:>10.2f} {:>7.1f}%'.format(stage, seconds * 1e3,
+                                               100 * seconds / total), file=out)
+
+  if errors:
+    print('\nNot converted:', file=out)
+    for name, error in errors.items():
+      print('  {}: {}'.format(name, error), file=out)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--repeats', type=int, default=5,
+                      help='the number of cold conversions per function')
+  parser.add_argument('--warm-repeats', type=int, default=100,
+                      help='the number of warm conversions per function')
+  parser.add_argument('--json', help='a file to write the results to')
+  args = parser.parse_args(argv)
+
+  results, errors = run(args.repeats, args.warm_repeats)
+  _report(results, errors, sys.stdout)
+  if args.json:
+    with open(args.json, 'w', encoding='utf-8') as f:
+      json.dump({'results': results, 'errors': errors}, f, indent=1)
+
+
+if __name__ == '__main__':
+  main()
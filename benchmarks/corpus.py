@@ -0,0 +1,122 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Functions used as inputs by the benchmarks."""
+
+import ast
+import atexit
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+
+TESTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tests')
+
+# Reference tests which exercise most converters.
+REFERENCE_TESTS = (
+    'call_to_user_function_test.py',
+    'composite_names_in_control_flow_test.py',
+    'cond_basic_test.py',
+    'early_return_test.py',
+    'logical_expression_test.py',
+    'loop_basic_test.py',
+    'loop_control_flow_test.py',
+    'nested_control_flow_test.py',
+)
+
+_synthetic_dir = None
+
+
+def reference_functions(file_names=REFERENCE_TESTS, tests_dir=TESTS_DIR):
+  """Loads the sample functions of reference tests.
+
+  The reference tests depend on TensorFlow, so they are not imported. Instead,
+  only their top level functions are compiled, with their original file names
+  and line numbers, so that their source code remains accessible. The
+  functions can be converted, but not necessarily called.
+
+  Args:
+    file_names: Iterable[Text], the file names of the reference tests.
+    tests_dir: Text, the directory holding the reference tests.
+
+  Returns:
+    List[Tuple[Text, Callable]], the functions along with descriptive names.
+  """
+  functions = []
+  for file_name in file_names:
+    path = os.path.join(tests_dir, file_name)
+    with open(path, encoding='utf-8') as f:
+      tree = ast.parse(f.read(), path)
+    tree.body = [n for n in tree.body if isinstance(n, ast.FunctionDef)]
+    stem = os.path.splitext(file_name)[0]
+    namespace = {'__name__': 'benchmarks.reference.' + stem}
+    exec(compile(tree, path, 'exec'), namespace)  # pylint:disable=exec-used
+    for node in tree.body:
+      functions.append(('{}.{}'.format(stem, node.name), namespace[node.name]))
+  return functions
+
+
+def _synthetic_source(name, size, depth):
+  """Generates a function with `size` blocks of nested control flow."""
+  lines = ['def {}(x, y):'.format(name), '  acc = 0']
+  for block in range(size):
+    indent = '  '
+    for level in range(depth):
+      var = 'i{}_{}'.format(block, level)
+      kind = level % 3
+      if kind == 0:
+        lines.append('{}for {} in range(x):'.format(indent, var))
+      elif kind == 1:
+        lines.append('{}if acc % {} == y:'.format(indent, level + 2))
+        lines.append('{}  {} = acc'.format(indent, var))
+      else:
+        lines.append('{}{} = y'.format(indent, var))
+        lines.append('{}while {} > 0:'.format(indent, var))
+        lines.append('{}  {} -= 1'.format(indent, var))
+      indent += '  '
+    lines.append('{}acc = acc + {} * y'.format(indent, block + 1))
+    lines.append('{}if acc > 1000:'.format(indent))
+    lines.append('{}  break'.format(indent) if depth else
+                 '{}  acc = 0'.format(indent))
+  lines.append('  return acc')
+  return '\n'.join(lines) + '\n'
+
+
+def synthetic_function(size, depth):
+  """Returns a generated function of the given size and nesting depth.
+
+  The function is loaded from a temporary file, like regular user code.
+
+  Args:
+    size: int, the number of blocks of control flow in the function.
+    depth: int, the nesting depth of each block.
+
+  Returns:
+    Callable
+  """
+  global _synthetic_dir
+  if _synthetic_dir is None:
+    _synthetic_dir = tempfile.mkdtemp(prefix='malt_benchmarks_')
+    atexit.register(shutil.rmtree, _synthetic_dir, True)
+
+  name = 'synthetic_{}_{}'.format(size, depth)
+  path = os.path.join(_synthetic_dir, name + '.py')
+  with open(path, 'w', encoding='utf-8') as f:
+    f.write(_synthetic_source(name, size, depth))
+  spec = importlib.util.spec_from_file_location(name, path)
+  module = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(module)
+  sys.modules[name] = module
+  return getattr(module, name)
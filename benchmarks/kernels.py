@@ -0,0 +1,105 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Kernels used by the runtime overhead benchmarks.
+
+Each kernel mostly exercises one kind of generated code, noted in its
+docstring.
+"""
+
+
+def straight_line(n):
+  """Variable loads: ag__.ld."""
+  a = n
+  b = a + 1
+  c = a * b
+  d = c - a + b
+  e = d * d - c
+  return a + b + c + d + e
+
+
+def tight_for_loop(n):
+  """ag__.for_stmt, with a trivial body."""
+  s = 0
+  for i in range(n):
+    s += i
+  return s
+
+
+def tight_while_loop(n):
+  """ag__.while_stmt, with a trivial body."""
+  s = 0
+  while n > 0:
+    s += n
+    n -= 1
+  return s
+
+
+def nested_conditionals(n):
+  """ag__.if_stmt, nested."""
+  s = 0
+  for i in range(n):
+    if i % 2:
+      if i % 3:
+        s += 1
+      else:
+        s -= 1
+    else:
+      s += 2
+  return s
+
+
+def _small_function(x):
+  return x + 1
+
+
+def many_small_calls(n):
+  """ag__.converted_call, and the function scope of the callee."""
+  s = 0
+  for _ in range(n):
+    s = _small_function(s)
+  return s
+
+
+def logical_expressions(n):
+  """ag__.and_, ag__.or_ and ag__.not_, with lambda-wrapped operands."""
+  s = 0
+  for i in range(n):
+    if (i > 3 and i % 2) or not i % 5:
+      s += 1
+  return s
+
+
+def conditional_expressions(n):
+  """ag__.if_exp, with lambda-wrapped branches."""
+  s = 0
+  for i in range(n):
+    s += 1 if i % 2 else -1
+  return s
+
+
+def list_building(n):
+  """ag__.list_append and the other list operators (Feature.LISTS)."""
+  l = []
+  for i in range(n):
+    l.append(i)
+  return l
+
+
+def early_return(n):
+  """Return statements, lowered to ag__ control flow and retval_ variables."""
+  for i in range(n):
+    if i == n - 1:
+      return i
+  return -1
@@ -0,0 +1,167 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Measures the runtime overhead of converted code over native Python.
+
+Usage:
+
+    python -m benchmarks.runtime_overhead [--size N] [--json out.json]
+        [--features CALL_SITE_CACHES ...]
+
+Each kernel in `kernels.py` runs natively, and converted with `malt.convert`,
+on Python values. The ratio between the two is the steady-state overhead of
+the generated code. The converted runs are also profiled, to attribute the
+overhead to the entry points of `malt.operators` and `malt.impl.api`.
+"""
+
+import argparse
+import cProfile
+import inspect
+import json
+import os
+import pstats
+import statistics
+import sys
+import time
+
+import malt
+
+from benchmarks import kernels
+
+# The generated code calls into these packages.
+_MALT_DIR = os.path.dirname(malt.__file__)
+
+# Kernels which use optional conversion features.
+_KERNEL_FEATURES = {
+    'list_building': malt.experimental.Feature.LISTS,
+}
+
+
+def _median_seconds(fn, arg, repeats):
+  times = []
+  for _ in range(repeats):
+    start = time.perf_counter()
+    fn(arg)
+    times.append(time.perf_counter() - start)
+  return statistics.median(times)
+
+
+def _kernels():
+  return [(name, fn)
+          for name, fn in inspect.getmembers(kernels, inspect.isfunction)
+          if not name.startswith('_')]
+
+
+def _operator_times(fn, arg):
+  """Profiles fn, returning the time spent in each DiastaticMalt function."""
+  profiler = cProfile.Profile()
+  profiler.runcall(fn, arg)
+  profile = pstats.Stats(profiler)
+  times = {}
+  for (file_name, _, fn_name), stat in profile.stats.items():  # pytype: disable=attribute-error
+    if not file_name.startswith(_MALT_DIR):
+      continue
+    module = os.path.relpath(file_name, os.path.dirname(_MALT_DIR))
+    module = os.path.splitext(module)[0].replace(os.sep, '.')
+    name = '{}.{}'.format(module, fn_name)
+    # The internal time, i.e. excluding calls to other functions.
+    times[name] = times.get(name, 0.0) + stat[2]
+  return times
+
+
+def measure(name, fn, size, repeats=20, features=()):
+  """Measures a kernel natively and converted.
+
+  Args:
+    name: Text, the kernel name.
+    fn: Callable, the kernel.
+    size: int, the kernel argument, typically a number of iterations.
+    repeats: int, the number of measurements.
+    features: Tuple[malt.experimental.Feature], optional conversion features
+      to enable, in addition to those required by the kernel.
+
+  Returns:
+    Dict[Text, Any], with the median `native` and `converted` times in
+    seconds, their `ratio`, and the time spent in each DiastaticMalt
+    function, in `operators`.
+  """
+  features = tuple(features)
+  if name in _KERNEL_FEATURES:
+    features += (_KERNEL_FEATURES[name],)
+  converted_fn = malt.convert(
+      recursive=True, optional_features=features or None)(fn)
+  if converted_fn(size) != fn(size):
+    raise ValueError('converted {} returned a different result'.format(name))
+
+  native = _median_seconds(fn, size, repeats)
+  converted = _median_seconds(converted_fn, size, repeats)
+  return {
+      'native': native,
+      'converted': converted,
+      'ratio': converted / native,
+      'operators': _operator_times(converted_fn, size),
+  }
+
+
+def run(size=1000, repeats=20, features=()):
+  """Runs the benchmarks. See `measure`."""
+  return {
+      name: measure(name, fn, size, repeats, features)
+      for name, fn in _kernels()
+  }
+
+
+def _report(results, out, top=3):
+  """Prints a summary of the results."""
+  print('{:<25} {:>12} {:>14} {:>8}  {}'.format('kernel', 'native (us)',
+                                               'converted (us)', 'ratio',
+                                               'top entry points'), file=out)
+  for name, r in results.items():
+    operators = sorted(r['operators'].items(), key=lambda i: -i[1])[:top]
+    print('{:<25} {:>12.1f} {:>14.1f} {:>7.1f}x  {}'.format(
+        name, r['native'] * 1e6, r['converted'] * 1e6, r['ratio'],
+        ', '.join(op.rsplit('.', 1)[-1] for op, _ in operators)), file=out)
+
+  totals = {}
+  for r in results.values():
+    for op, seconds in r['operators'].items():
+      totals[op] = totals.get(op, 0.0) + seconds
+  total = sum(totals.values()) or 1.0
+  print('\n{:<60} {:>8}'.format('entry point (profiled)', 'share'), file=out)
+  for op, seconds in sorted(totals.items(), key=lambda i: -i[1])[:20]:
+    print('{:<60} {:>7.1f}%'.format(op, 100 * seconds / total), file=out)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--size', type=int, default=1000,
+                      help='the number of iterations of each kernel')
+  parser.add_argument('--repeats', type=int, default=20,
+                      help='the number of measurements per kernel')
+  parser.add_argument('--json', help='a file to write the results to')
+  parser.add_argument('--features', nargs='*', default=(),
+                      choices=[f.name for f in malt.experimental.Feature],
+                      help='optional conversion features to enable')
+  args = parser.parse_args(argv)
+
+  features = tuple(malt.experimental.Feature[f] for f in args.features)
+  results = run(args.size, args.repeats, features)
+  _report(results, sys.stdout)
+  if args.json:
+    with open(args.json, 'w', encoding='utf-8') as f:
+      json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+  main()
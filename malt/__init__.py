@@ -28,17 +28,40 @@ import types as _types
 
 # (dime10) Replacement for tf_export to generate the AutoGraph API.
 from malt.core.ag_ctx import control_status_ctx
+from malt.core.config import Convert as _Convert
+from malt.core.config import DoNotConvert as _DoNotConvert
 from malt.core.converter import Feature as _Feature
+from malt.impl.api import compile_ahead_of_time as _compile_ahead_of_time
 from malt.impl.api import internal_convert as _internal_convert
 from malt.impl.api import convert
 from malt.impl.api import do_not_convert as _do_not_convert
+from malt.impl.api import precompile
+from malt.impl.api import register_conversion_rules as _register_conversion_rules
+from malt.impl.api import reset_stats
+from malt.impl.api import set_aot_dir as _set_aot_dir
+from malt.impl.api import set_cache_dir as _set_cache_dir
+from malt.impl.api import set_cache_limits as _set_cache_limits
+from malt.impl.api import start_trace as _start_trace
+from malt.impl.api import stats
+from malt.impl.api import stop_trace as _stop_trace
 from malt.impl.api import to_graph, to_code
 from malt.lang.directives import set_loop_options as _set_loop_options
+from malt.pyct.cache import EvictionPolicy as _EvictionPolicy
 
 experimental = _types.ModuleType('malt.experimental')
+experimental.__dict__["Convert"] = _Convert
+experimental.__dict__["DoNotConvert"] = _DoNotConvert
+experimental.__dict__["EvictionPolicy"] = _EvictionPolicy
 experimental.__dict__["Feature"] = _Feature
+experimental.__dict__["compile_ahead_of_time"] = _compile_ahead_of_time
 experimental.__dict__["do_not_convert"] = _do_not_convert
+experimental.__dict__["register_conversion_rules"] = _register_conversion_rules
+experimental.__dict__["set_aot_dir"] = _set_aot_dir
+experimental.__dict__["set_cache_dir"] = _set_cache_dir
+experimental.__dict__["set_cache_limits"] = _set_cache_limits
 experimental.__dict__["set_loop_options"] = _set_loop_options
+experimental.__dict__["start_trace"] = _start_trace
+experimental.__dict__["stop_trace"] = _stop_trace
 internal = _types.ModuleType('malt.internal')
 internal.__dict__["convert"] = _internal_convert
 
@@ -53,6 +76,9 @@ __all__ = [
     # tf_export
     'control_status_ctx',
     'convert',
+    'precompile',
+    'reset_stats',
+    'stats',
     'to_code',
     'to_graph',
     'experimental',
@@ -0,0 +1,95 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Converts the functions of Python packages ahead of time.
+
+Usage:
+
+    python -m malt.aot my_package [other_package ...] --output build/malt
+
+The output directory holds one generated module per converted function and
+conversion options, along with the corresponding source maps. It is loaded
+with `malt.experimental.set_aot_dir`, or the `AUTOGRAPH_AOT_DIR` environment
+variable, after which converted functions are loaded from it instead of
+being converted on their first call.
+"""
+
+import argparse
+import importlib
+import pkgutil
+import sys
+
+from malt.impl import api
+
+
+def walk_modules(package_name):
+  """Imports a package and its submodules, returning the imported modules.
+
+  Args:
+    package_name: Text, the name of a package or module.
+
+  Returns:
+    Tuple[List[ModuleType], List[Tuple[Text, Exception]]], the imported
+    modules, and the submodules that could not be imported with their errors.
+  """
+  package = importlib.import_module(package_name)
+  modules = [package]
+  errors = []
+  if not hasattr(package, '__path__'):
+    return modules, errors
+
+  def on_error(name):
+    errors.append((name, sys.exc_info()[1]))
+
+  for module_info in pkgutil.walk_packages(
+      package.__path__, package.__name__ + '.', onerror=on_error):
+    try:
+      modules.append(importlib.import_module(module_info.name))
+    except Exception as e:  # pylint:disable=broad-except
+      errors.append((module_info.name, e))
+  return modules, errors
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(
+      prog='python -m malt.aot',
+      description='Converts the functions of Python packages ahead of time.')
+  parser.add_argument(
+      'packages', nargs='+', help='the packages or modules to convert')
+  parser.add_argument(
+      '-o', '--output', default='malt_aot', help='the output directory')
+  parser.add_argument(
+      '-j', '--workers', type=int, default=None,
+      help='the number of worker processes; defaults to the number of CPUs')
+  args = parser.parse_args(argv)
+
+  modules = []
+  for package_name in args.packages:
+    package_modules, import_errors = walk_modules(package_name)
+    modules.extend(package_modules)
+    for name, e in import_errors:
+      print('Skipping {}: could not import: {}'.format(name, e),
+            file=sys.stderr)
+
+  count, errors = api.compile_ahead_of_time(
+      modules, args.output, workers=args.workers)
+  for f, e in errors:
+    print('Could not convert {}.{}: {}: {}'.format(
+        f.__module__, f.__qualname__, type(e).__name__, e), file=sys.stderr)
+  print('Wrote {} modules to {}'.format(count, args.output))
+  return 1 if errors else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -22,9 +22,13 @@ Requires function_scopes.
 """
 
 import ast
+import builtins
+import inspect
 
 from malt.core import converter
+from malt.impl import conversion
 from malt.pyct import anno
+from malt.pyct import inspect_utils
 from malt.pyct import parser
 from malt.pyct import qual_names
 from malt.pyct import templates
@@ -34,6 +38,30 @@ from malt.utils import ag_logging
 # TODO(mdan): Rename to FunctionCallsTransformer.
 
 
+# Builtins which converted_call runs with access to the caller's frame.
+_SCOPED_BUILTINS = (eval, globals, locals, super)
+
+
+def _bound_names(node):
+  """Returns the names that a function binds anywhere in its body."""
+  names = set()
+  for n in ast.walk(node):
+    if isinstance(n, ast.Name) and not isinstance(n.ctx, ast.Load):
+      names.add(n.id)
+    elif isinstance(n, ast.arg):
+      names.add(n.arg)
+    elif isinstance(n, (ast.Import, ast.ImportFrom)):
+      for alias in n.names:
+        names.add((alias.asname or alias.name).split('.')[0])
+    elif isinstance(getattr(n, 'name', None), str):
+      # Functions, classes, exception handlers and match captures.
+      names.add(n.name)
+    elif isinstance(getattr(n, 'rest', None), str):
+      # Match mappings.
+      names.add(n.rest)
+  return names
+
+
 class _Function(object):
 
   no_root = True
@@ -92,6 +120,74 @@ class _ArgTemplateBuilder(object):
 class CallTreeTransformer(converter.Base):
   """Transforms the call tree by renaming transformed symbols."""
 
+  def __init__(self, ctx, bound_names=None):
+    super(CallTreeTransformer, self).__init__(ctx)
+    self._bound_names = bound_names
+    # List[Tuple[Text, Text]], the name and label of each call site, see
+    # CALL_SITE_CACHES.
+    self.call_sites = []
+
+  def _resolve_static(self, full_name):
+    """Resolves a callee from the namespace of the function, if possible.
+
+    Only global, closure and builtin names and the module attributes reached
+    from them are resolved. Names bound by the function itself may hold
+    anything.
+
+    Args:
+      full_name: Text, the qualified name of the callee.
+
+    Returns:
+      Tuple[bool, Any], whether the callee could be resolved, and the callee.
+    """
+    parts = full_name.split('.')
+    if not all(p.isidentifier() for p in parts):
+      return False, None
+    root = parts[0]
+    if self._bound_names is None or root in self._bound_names:
+      return False, None
+
+    namespace = self.ctx.info.namespace
+    if root in namespace:
+      value = namespace[root]
+    elif len(parts) == 1 and root in builtins.__dict__:
+      value = builtins.__dict__[root]
+    else:
+      return False, None
+
+    for attr in parts[1:]:
+      # Attribute lookups other than module members may run arbitrary code.
+      if not inspect.ismodule(value) or attr not in value.__dict__:
+        return False, None
+      value = value.__dict__[attr]
+    return True, value
+
+  def _is_direct_call(self, full_name):
+    """Returns True if a call may bypass converted_call, see DIRECT_CALLS."""
+    if not self.ctx.user.options.uses(converter.Feature.DIRECT_CALLS):
+      return False
+    found, value = self._resolve_static(full_name)
+    if not found:
+      return False
+    if inspect_utils.isbuiltin(value):
+      # Builtins are called via their overloads.
+      return not any(value is b for b in _SCOPED_BUILTINS)
+    try:
+      return conversion.is_never_converted(value)
+    except Exception:  # pylint:disable=broad-except
+      return False
+
+  def _new_call_site(self, node, full_name):
+    """Returns the name of a new call site, see api.CallSite."""
+    name = self.ctx.namer.new_symbol('ag__call_site', self._bound_names or ())
+    origin = anno.getanno(node, anno.Basic.ORIGIN, default=None)
+    label = full_name or '<expression>'
+    if origin is not None:
+      label = '{} at {}:{}'.format(label, origin.loc.filename,
+                                   origin.loc.lineno)
+    self.call_sites.append((name, label))
+    return name
+
   def visit_Lambda(self, node):
     if not anno.hasanno(node, 'function_context_name'):
       # Lambda functions created during the conversion process have no
@@ -190,11 +286,26 @@ class CallTreeTransformer(converter.Base):
         not self.ctx.user.options.uses(converter.Feature.BUILTIN_FUNCTIONS)):
       return node
 
+    if full_name and self._is_direct_call(full_name):
+      # The callee is still checked at runtime, see api.direct_callee.
+      node.func = templates.replace_as_expression(
+          'ag__.direct_callee(func, function_ctx)',
+          func=node.func,
+          function_ctx=function_context_name)
+      return node
+
+    if self.ctx.user.options.uses(converter.Feature.CALL_SITE_CACHES):
+      # The call site is an object declared with the function, see
+      # call_site_definitions.
+      call_site = self._new_call_site(node, full_name)
+    else:
+      call_site = 'ag__'
     template = """
-      ag__.converted_call(func, args, kwargs, function_ctx)
+      call_site.converted_call(func, args, kwargs, function_ctx)
     """
     new_call = templates.replace_as_expression(
         template,
+        call_site=call_site,
         func=node.func,
         args=self._args_to_tuple(node),
         kwargs=self._kwargs_to_dict(node),
@@ -216,5 +327,33 @@ def transform(node, ctx):
   """
   node = qual_names.resolve(node)
 
-  node = CallTreeTransformer(ctx).visit(node)
+  bound_names = None
+  if (ctx.user.options.uses(converter.Feature.DIRECT_CALLS) or
+      ctx.user.options.uses(converter.Feature.CALL_SITE_CACHES)):
+    bound_names = _bound_names(node)
+  transformer = CallTreeTransformer(ctx, bound_names)
+  node = transformer.visit(node)
+  if transformer.call_sites:
+    anno.setanno(node, 'call_sites', transformer.call_sites)
   return node
+
+
+def call_site_definitions(node):
+  """Returns the declarations of the call sites used by a transformed function.
+
+  The declarations must precede the definition of the function, in the scope
+  of the factory which creates it. See `transpiler.PyToPy.get_extra_definitions`.
+
+  Args:
+    node: AST, the output of `transform`.
+
+  Returns:
+    List[ast.AST], the declarations.
+  """
+  definitions = []
+  for name, label in anno.getanno(node, 'call_sites', default=()):
+    definitions.extend(templates.replace(
+        'call_site = ag__.CallSite(label, ag__.converted_call)',
+        call_site=name,
+        label=ast.Constant(label)))
+  return definitions
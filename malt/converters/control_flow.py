@@ -51,9 +51,11 @@ class ControlFlowTransformer(converter.Base):
       return self.generic_visit(node)
 
   def _create_nonlocal_declarations(self, vars_):
-    vars_ = set(vars_)
+    # Note: iterating in the order of vars_, rather than over sets, keeps the
+    # generated code deterministic.
     results = []
-    global_vars = self.state[_Function].scope.globals & vars_
+    global_vars = [
+        v for v in vars_ if v in self.state[_Function].scope.globals]
 
     if global_vars:
       results.append(ast.Global([str(v) for v in global_vars]))
@@ -187,7 +189,8 @@ class ControlFlowTransformer(converter.Base):
     # composite ones will be implicitly checked at runtime.
     possibly_undefined = (
         modified - defined_in - fn_scope.globals - fn_scope.nonlocals)
-    undefined = tuple(v for v in possibly_undefined if not v.is_composite())
+    undefined = tuple(
+        sorted(v for v in possibly_undefined if not v.is_composite()))
 
     # Variables that are modified inside the scope, and depend on values outside
     # it.
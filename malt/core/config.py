@@ -61,3 +61,16 @@ CONVERSION_RULES = (
 
     DoNotConvert('keras'),
 )
+
+# Modules whose members are called unconverted, even when they are not reached
+# through a module of the same name. Unlike CONVERSION_RULES, this also
+# applies to members defined elsewhere, e.g. the C implementations imported by
+# `collections`. Changes don't affect the functions already called from
+# converted code.
+PERMANENTLY_ALLOWED_MODULES = (
+    'collections',
+    'pdb',
+    'copy',
+    'inspect',
+    're',
+)
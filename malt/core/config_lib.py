@@ -1,3 +1,4 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
 # Copyright 2016 The TensorFlow Authors. All Rights Reserved.
 #
 # Licensed under the Apache License, Version 2.0 (the "License");
@@ -17,45 +18,121 @@
 import enum
 
 
-# TODO(mdan): For better performance, allow each rule to take a set names.
+class Action(enum.Enum):
+  NONE = 0
+  CONVERT = 1
+  DO_NOT_CONVERT = 2
 
 
 class Rule(object):
   """Base class for conversion rules."""
 
+  action = Action.NONE
+
   def __init__(self, module_prefix):
     self._prefix = module_prefix
 
+  @property
+  def module_prefix(self):
+    return self._prefix
+
   def matches(self, module_name):
     return (module_name.startswith(self._prefix + '.') or
             module_name == self._prefix)
 
-
-class Action(enum.Enum):
-  NONE = 0
-  CONVERT = 1
-  DO_NOT_CONVERT = 2
+  def get_action(self, module):
+    if self.matches(module.__name__):
+      return self.action
+    return Action.NONE
 
 
 class DoNotConvert(Rule):
   """Indicates that this module should be not converted."""
 
+  action = Action.DO_NOT_CONVERT
+
   def __str__(self):
     return 'DoNotConvert rule for {}'.format(self._prefix)
 
-  def get_action(self, module):
-    if self.matches(module.__name__):
-      return Action.DO_NOT_CONVERT
-    return Action.NONE
-
 
 class Convert(Rule):
   """Indicates that this module should be converted."""
 
+  action = Action.CONVERT
+
   def __str__(self):
     return 'Convert rule for {}'.format(self._prefix)
 
+
+def _is_prefix_rule(rule):
+  """Returns True if the rule only depends on a module name prefix."""
+  rule_type = type(rule)
+  return (isinstance(rule, Rule) and rule_type.get_action is Rule.get_action and
+          rule_type.matches is Rule.matches)
+
+
+class RuleIndex(object):
+  """Finds the first rule of a sequence that applies to a module.
+
+  The rules are compiled into a trie of module name components, so a lookup
+  visits one node per component of the module name instead of every rule.
+  Lookups are also memoized by module name.
+
+  Rules which override `matches` or `get_action` may decide based on more than
+  the module name; if any is present, lookups fall back to testing each rule
+  in order.
+
+  Attributes:
+    rules: Tuple[Rule], the indexed rules.
+  """
+
+  def __init__(self, rules):
+    self.rules = rules
+    self._memo = {}
+    self._indexed = all(_is_prefix_rule(r) for r in rules)
+    # Each node is a pair of the first rule with the node's prefix, as an
+    # (index, rule) tuple, and a dict of child nodes by name component.
+    self._root = [None, {}]
+    if self._indexed:
+      for i, rule in enumerate(rules):
+        node = self._root
+        for component in rule.module_prefix.split('.'):
+          node = node[1].setdefault(component, [None, {}])
+        if node[0] is None:
+          node[0] = (i, rule)
+
+  def _lookup(self, module_name):
+    first = None
+    node = self._root
+    for component in module_name.split('.'):
+      node = node[1].get(component)
+      if node is None:
+        break
+      if node[0] is not None and (first is None or node[0][0] < first[0]):
+        first = node[0]
+    if first is None:
+      return Action.NONE, None
+    return first[1].action, first[1]
+
   def get_action(self, module):
-    if self.matches(module.__name__):
-      return Action.CONVERT
-    return Action.NONE
+    """Returns the action of the first rule that applies to a module.
+
+    Args:
+      module: ModuleType, the module to test.
+
+    Returns:
+      Tuple[Action, Optional[Rule]], the action and the rule that decided it,
+      or (Action.NONE, None) if no rule applies.
+    """
+    if not self._indexed:
+      for rule in self.rules:
+        action = rule.get_action(module)
+        if action != Action.NONE:
+          return action, rule
+      return Action.NONE, None
+
+    module_name = module.__name__
+    result = self._memo.get(module_name)
+    if result is None:
+      result = self._memo[module_name] = self._lookup(module_name)
+    return result
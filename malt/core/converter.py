@@ -97,6 +97,11 @@ class Feature(enum.Enum):
     ASSERT_STATEMENTS: Convert Tensor-dependent assert statements to tf.Assert.
     BUILTIN_FUNCTIONS: Convert builtin functions applied to Tensors to
       their TF counterparts.
+    CALL_SITE_CACHES: Give each call in the generated code its own cache of
+      the functions it called, see `api.CallSite`.
+    DIRECT_CALLS: Call functions which are never converted, like builtins and
+      the functions of allowlisted modules, without going through
+      `converted_call`, when they can be resolved at conversion time.
     EQUALITY_OPERATORS: Whether to convert the equality operator ('==') to
       tf.math.equal.
     LISTS: Convert list idioms, like initializers, slices, append, etc.
@@ -109,10 +114,17 @@ class Feature(enum.Enum):
   AUTO_CONTROL_DEPS = 'AUTO_CONTROL_DEPS'
   ASSERT_STATEMENTS = 'ASSERT_STATEMENTS'
   BUILTIN_FUNCTIONS = 'BUILTIN_FUNCTIONS'
+  CALL_SITE_CACHES = 'CALL_SITE_CACHES'
+  DIRECT_CALLS = 'DIRECT_CALLS'
   EQUALITY_OPERATORS = 'EQUALITY_OPERATORS'
   LISTS = 'LISTS'
   NAME_SCOPES = 'NAME_SCOPES'
 
+  # Members are singletons and compare by identity, so they can hash by
+  # identity too. This is much faster than Enum.__hash__, and features are
+  # hashed each time options are created or queried.
+  __hash__ = object.__hash__
+
   @classmethod
   def all(cls):
     """Returns a tuple that enables all options."""
@@ -128,10 +140,19 @@ class Feature(enum.Enum):
 
 STANDARD_OPTIONS = None  # Forward definition.
 
+# Maps the arguments of ConversionOptions, both as given and normalized, to the
+# interned instance. The number of distinct options used by a program is small.
+_INTERNED_OPTIONS = {}
+
 
 class ConversionOptions(object):
   """Immutable container for global conversion flags.
 
+  Instances are interned: constructing options equal to existing ones returns
+  the existing instance. This makes them cheap to create in generated code and
+  cheap to use as cache keys, since their hash is computed once and equal
+  options are usually identical.
+
   Attributes:
     recursive: bool, whether to recursively convert any user functions or
       classes that the converted function may use.
@@ -143,33 +164,74 @@ class ConversionOptions(object):
       options.
   """
 
-  def __init__(self,
-               recursive=False,
-               user_requested=False,
-               internal_convert_user_code=True,
-               optional_features=Feature.ALL):
-    self.recursive = recursive
-    self.user_requested = user_requested
-    # TODO(mdan): Rename to conversion_recursion_depth?
-    self.internal_convert_user_code = internal_convert_user_code
+  __slots__ = ('recursive', 'user_requested', 'internal_convert_user_code',
+               'optional_features', '_key', '_hash', '_call_options')
+
+  def __new__(cls,
+              recursive=False,
+              user_requested=False,
+              internal_convert_user_code=True,
+              optional_features=Feature.ALL):
+    # Fast path: the same arguments were used before. Generated code passes the
+    # features as a tuple. Other iterables may be mutable, so they are only
+    # looked up after normalization.
+    raw_key = None
+    if (optional_features is None or
+        isinstance(optional_features, (Feature, tuple, frozenset))):
+      raw_key = (cls, recursive, user_requested, internal_convert_user_code,
+                 optional_features)
+      self = _INTERNED_OPTIONS.get(raw_key)
+      if self is not None:
+        return self
 
     if optional_features is None:
       optional_features = ()
     elif isinstance(optional_features, Feature):
       optional_features = (optional_features,)
     optional_features = frozenset(optional_features)
-    self.optional_features = optional_features
+
+    key = (recursive, user_requested, internal_convert_user_code,
+           optional_features)
+    self = _INTERNED_OPTIONS.get((cls,) + key)
+    if self is None:
+      self = super(ConversionOptions, cls).__new__(cls)
+      object.__setattr__(self, 'recursive', recursive)
+      object.__setattr__(self, 'user_requested', user_requested)
+      # TODO(mdan): Rename to conversion_recursion_depth?
+      object.__setattr__(self, 'internal_convert_user_code',
+                         internal_convert_user_code)
+      object.__setattr__(self, 'optional_features', optional_features)
+      object.__setattr__(self, '_key', key)
+      object.__setattr__(self, '_hash', hash(key))
+      object.__setattr__(self, '_call_options', None)
+      # Concurrent callers may race to intern equal options; the first wins.
+      self = _INTERNED_OPTIONS.setdefault((cls,) + key, self)
+    if raw_key is not None:
+      _INTERNED_OPTIONS[raw_key] = self
+    return self
+
+  def __setattr__(self, name, value):
+    raise AttributeError('ConversionOptions are immutable')
+
+  def __delattr__(self, name):
+    raise AttributeError('ConversionOptions are immutable')
+
+  def __reduce__(self):
+    # Unpickling and copying go through __new__, so they return the interned
+    # instance.
+    return (type(self), self._key)
 
   def as_tuple(self):
-    return (self.recursive, self.user_requested,
-            self.internal_convert_user_code, self.optional_features)
+    return self._key
 
   def __hash__(self):
-    return hash(self.as_tuple())
+    return self._hash
 
   def __eq__(self, other):
+    if self is other:
+      return True
     assert isinstance(other, ConversionOptions)
-    return self.as_tuple() == other.as_tuple()
+    return self._hash == other._hash and self._key == other._key
 
   def __str__(self):
     return 'ConversionOptions[{}]'
@@ -180,11 +242,13 @@ class ConversionOptions(object):
 
   def call_options(self):
     """Returns the corresponding options to be used for recursive conversion."""
-    return ConversionOptions(
-        recursive=self.recursive,
-        user_requested=False,
-        internal_convert_user_code=self.recursive,
-        optional_features=self.optional_features)
+    if self._call_options is None:
+      object.__setattr__(self, '_call_options', ConversionOptions(
+          recursive=self.recursive,
+          user_requested=False,
+          internal_convert_user_code=self.recursive,
+          optional_features=self.optional_features))
+    return self._call_options
 
   def to_ast(self):
     """Returns a representation of this object as an AST node.
@@ -15,14 +15,16 @@
 # ==============================================================================
 """This module contains the user- and codegen-facing API for DiastaticMalt."""
 
+import concurrent.futures
 import functools
 import importlib
 import inspect
 import os
 import sys
 import textwrap
-import traceback
+import weakref
 
+from malt import _version
 from malt import operators
 from malt import utils
 from malt.converters import asserts
@@ -39,12 +41,14 @@ from malt.converters import return_statements
 from malt.converters import slices
 from malt.converters import variables
 from malt.core import ag_ctx
+from malt.core import config
 from malt.core import converter
 from malt.core import unsupported_features_checker
 from malt.impl import conversion
 from malt.lang import special_functions
 from malt.operators import py_builtins
 from malt.pyct import anno
+from malt.pyct import cache
 from malt.pyct import cfg
 from malt.pyct import error_utils
 from malt.pyct import errors
@@ -54,6 +58,12 @@ from malt.pyct import transpiler
 from malt.pyct.static_analysis import activity
 from malt.pyct.static_analysis import reaching_definitions
 from malt.utils import ag_logging as logging
+from malt.utils import stats as conversion_stats
+from malt.utils import tracing
+
+
+CACHE_DIR_VAR_NAME = 'AUTOGRAPH_CACHE_DIR'
+AOT_DIR_VAR_NAME = 'AUTOGRAPH_AOT_DIR'
 
 
 def is_autograph_strict_conversion_mode():
@@ -111,12 +121,15 @@ def _attach_error_metadata(e, f):
   source_map = f.ag_source_map
 
   if metadata is None:
-    logging.log(1, 'Caught error in user callable %s', f, exc_info=True)
+    if logging.enabled:
+      logging.log(1, 'Caught error in user callable %s', f, exc_info=True)
     message = '{}: {}'.format(e.__class__.__name__, e)
   else:
     message = None
 
-  cause_tb = traceback.extract_tb(sys.exc_info()[2])[1:]
+  # Skips the frame of the caller. The traceback is only summarized if the
+  # message of the error is rendered, see ErrorMetadataBase.
+  cause_tb = sys.exc_info()[2].tb_next or ()
 
   e.ag_error_metadata = _ErrorMetadata(cause_tb, metadata, message, source_map,
                                        __file__)
@@ -158,14 +171,27 @@ class PyToPy(transpiler.PyToPy):
       self._extra_locals = {'ag__': ag_internal}
     return self._extra_locals
 
+  def get_extra_definitions(self, node, ctx):
+    return call_trees.call_site_definitions(node)
+
   def get_caching_key(self, ctx):
     return ctx.options
 
+  def get_persistent_caching_key(self, ctx):
+    options = ctx.options
+    return (_version.__version__, options.recursive, options.user_requested,
+            options.internal_convert_user_code,
+            tuple(sorted(f.value for f in options.optional_features)))
+
   def initial_analysis(self, node, ctx):
-    graphs = cfg.build(node)
-    node = qual_names.resolve(node)
-    node = activity.resolve(node, ctx, None)
-    node = reaching_definitions.resolve(node, ctx, graphs)
+    with conversion_stats.stage('analysis.cfg'):
+      graphs = cfg.build(node)
+    with conversion_stats.stage('analysis.qual_names'):
+      node = qual_names.resolve(node)
+    with conversion_stats.stage('analysis.activity'):
+      node = activity.resolve(node, ctx, None)
+    with conversion_stats.stage('analysis.reaching_definitions'):
+      node = reaching_definitions.resolve(node, ctx, graphs)
     anno.dup(
         node,
         {
@@ -174,28 +200,34 @@ class PyToPy(transpiler.PyToPy):
     )
     return node
 
+  def _apply(self, converter_module, node, ctx):
+    name = converter_module.__name__.rsplit('.', 1)[-1]
+    with conversion_stats.stage('converters.' + name):
+      return converter_module.transform(node, ctx)
+
   def transform_ast(self, node, ctx):
-    unsupported_features_checker.verify(node)
+    with conversion_stats.stage('analysis.unsupported_features'):
+      unsupported_features_checker.verify(node)
     node = self.initial_analysis(node, ctx)
 
-    node = functions.transform(node, ctx)
-    node = directives.transform(node, ctx)
-    node = break_statements.transform(node, ctx)
+    node = self._apply(functions, node, ctx)
+    node = self._apply(directives, node, ctx)
+    node = self._apply(break_statements, node, ctx)
     if ctx.user.options.uses(converter.Feature.ASSERT_STATEMENTS):
-      node = asserts.transform(node, ctx)
+      node = self._apply(asserts, node, ctx)
     # Note: sequencing continue canonicalization before for loop one avoids
     # dealing with the extra loop increment operation that the for
     # canonicalization creates.
-    node = continue_statements.transform(node, ctx)
-    node = return_statements.transform(node, ctx)
+    node = self._apply(continue_statements, node, ctx)
+    node = self._apply(return_statements, node, ctx)
     if ctx.user.options.uses(converter.Feature.LISTS):
-      node = lists.transform(node, ctx)
-      node = slices.transform(node, ctx)
-    node = call_trees.transform(node, ctx)
-    node = control_flow.transform(node, ctx)
-    node = conditional_expressions.transform(node, ctx)
-    node = logical_expressions.transform(node, ctx)
-    node = variables.transform(node, ctx)
+      node = self._apply(lists, node, ctx)
+      node = self._apply(slices, node, ctx)
+    node = self._apply(call_trees, node, ctx)
+    node = self._apply(control_flow, node, ctx)
+    node = self._apply(conditional_expressions, node, ctx)
+    node = self._apply(logical_expressions, node, ctx)
+    node = self._apply(variables, node, ctx)
     return node
 
 
@@ -210,10 +242,11 @@ def _convert_actual(entity, program_ctx):
 
   transformed, module, source_map = _TRANSPILER.transform(entity, program_ctx)
 
-  assert not hasattr(transformed, 'ag_module')
-  assert not hasattr(transformed, 'ag_source_map')
-  transformed.ag_module = module
-  transformed.ag_source_map = source_map
+  # The transpiler reuses the instances of converted functions, which are only
+  # annotated once.
+  if getattr(transformed, 'ag_module', None) is not module:
+    transformed.ag_module = module
+    transformed.ag_source_map = source_map
   return transformed
 
 
@@ -234,6 +267,403 @@ def is_autograph_artifact(entity):
   return hasattr(entity, 'autograph_info__')
 
 
+#
+# Dispatch decisions of converted_call
+#
+
+
+class _DispatchDecision(object):
+  """The cached outcome of a call to `converted_call`.
+
+  Decisions are only cached for outcomes that don't depend on the arguments of
+  the call, and they are checked against the state that they depend on before
+  being reused: the conversion rules and, for converted functions, the code
+  and defaults of the function.
+
+  Attributes:
+    convert: bool, whether the function is called converted.
+    converted_f: Optional[Callable], the converted function, if it can be
+      kept, see converted_function.
+    options: Optional[converter.ConversionOptions], the options with which the
+      function is converted.
+    target: Optional[Callable], the `__call__` method that was converted, for
+      callable objects.
+    code: the code object of target.
+    defaults: the argument defaults of target.
+    kwdefaults: the keyword-only argument defaults of target.
+    self_arg: Optional[Text], 'bound' if the `__self__` of the callable is
+      passed as first argument, 'callable' if the callable itself is, as is the
+      case for callable objects.
+    rules: Tuple, the conversion rules at the time of the decision.
+  """
+
+  __slots__ = ('convert', 'converted_f', 'options', 'target', 'code',
+               'defaults', 'kwdefaults', 'self_arg', 'rules')
+
+  def __init__(self, converted_f=None, target=None, self_arg=None,
+               options=None):
+    self.convert = converted_f is not None
+    # The decisions are cached against weak references to their callables.
+    # Converted functions share the closure and globals of their target, which
+    # may refer back to the callable, in which case they are not kept.
+    if converted_f is not None and not inspect_utils.isselfcontained(target):
+      converted_f = None
+    self.converted_f = converted_f
+    self.options = options
+    # Functions and methods are the cache keys, which must only be referenced
+    # weakly, so the target is only kept for callable objects.
+    self.target = target if self_arg == 'callable' else None
+    self.code = getattr(target, '__code__', None)
+    self.defaults = getattr(target, '__defaults__', None)
+    self.kwdefaults = getattr(target, '__kwdefaults__', None)
+    self.self_arg = self_arg
+    self.rules = config.CONVERSION_RULES
+
+  def is_valid(self, f):
+    if self.rules is not config.CONVERSION_RULES:
+      return False
+    if not self.convert:
+      return True
+    if self.self_arg == 'callable':
+      target = type(f).__call__
+      if target is not self.target:
+        return False
+    elif (self.self_arg == 'bound') != inspect.ismethod(f):
+      # Functions and the methods bound to them share cache entries.
+      return False
+    else:
+      target = f
+    return (target.__code__ is self.code and
+            target.__defaults__ is self.defaults and
+            target.__kwdefaults__ is self.kwdefaults)
+
+  def converted_function(self, f):
+    """Returns the converted function to call for f."""
+    if self.converted_f is not None:
+      return self.converted_f
+    # Converted again, which is a lookup in the cache of the transpiler.
+    target = self.target if self.self_arg == 'callable' else f
+    return _convert_actual(target,
+                           converter.ProgramContext(options=self.options))
+
+  def effective_args(self, f, args):
+    if self.self_arg == 'bound':
+      return (f.__self__,) + args
+    if self.self_arg == 'callable':
+      return (f,) + args
+    return args
+
+  def dispatch(self, f, args, kwargs):
+    """Calls f according to this decision."""
+    if not self.convert:
+      return _call_unconverted(f, args, kwargs, None, False)
+    if ag_ctx.control_status_ctx().status == ag_ctx.Status.DISABLED:
+      return _call_unconverted(f, args, kwargs, None, False)
+    return _call_converted(self.converted_function(f),
+                           self.effective_args(f, args), kwargs)
+
+
+# Maps callables to _DispatchDecision, by conversion options.
+_DISPATCH_CACHE = cache.UnboundInstanceCache()
+
+# Maps builtin functions to their overloads. Builtin functions don't support
+# weak references, but the ones cached here are never destroyed.
+_BUILTIN_OVERLOADS = {}
+
+# Builtins which are overloaded with access to the caller's scope.
+_SCOPED_BUILTINS = (eval, super, globals, locals)
+
+
+def _lookup_dispatch_decision(f, options):
+  """Returns the cached _DispatchDecision for calling f, if any is valid."""
+  try:
+    decision = _DISPATCH_CACHE.get(f, options)
+  except TypeError:
+    # Catch-all for entities that are unhashable or don't allow weakrefs.
+    return None
+  if decision is not None and decision.is_valid(f):
+    return decision
+  return None
+
+
+def _cached_dispatch_decision(f, options):
+  """Like _lookup_dispatch_decision, and records the lookup in the stats."""
+  decision = _lookup_dispatch_decision(f, options)
+  if decision is not None:
+    conversion_stats.hit('dispatch')
+  else:
+    conversion_stats.miss('dispatch')
+  return decision
+
+
+def _cache_dispatch_decision(f, options, decision):
+  try:
+    _DISPATCH_CACHE[f][options] = decision
+  except TypeError:
+    pass
+
+
+def _cache_builtin_overload(f, overload):
+  # Only builtins of modules and types live as long as the process. Bound
+  # builtin methods, like `[].append`, are not cached.
+  f_self = getattr(f, '__self__', None)
+  if f_self is None or inspect.ismodule(f_self):
+    if f not in _SCOPED_BUILTINS:
+      _BUILTIN_OVERLOADS[f] = overload
+
+
+# Maps functions to the conversion rules that were in effect when they were
+# found to be never converted. See direct_callee.
+_NEVER_CONVERTED = weakref.WeakKeyDictionary()
+
+
+def _is_never_converted(f):
+  """Cached version of conversion.is_never_converted."""
+  try:
+    rules = _NEVER_CONVERTED.get(f)
+  except TypeError:
+    # Catch-all for entities that are unhashable or don't allow weakrefs.
+    return conversion.is_never_converted(f)
+  if rules is config.CONVERSION_RULES:
+    return True
+  if not conversion.is_never_converted(f):
+    return False
+  _NEVER_CONVERTED[f] = config.CONVERSION_RULES
+  return True
+
+
+def _indirect_call(f, caller_fn_scope, /, *args, **kwargs):
+  # The parameters are positional-only, so that the callee may take keyword
+  # arguments with the same names.
+  return converted_call(f, args, kwargs or None, caller_fn_scope)
+
+
+def direct_callee(f, caller_fn_scope):
+  """Returns a callable that calls f in the same way as `converted_call`.
+
+  For internal use only. Generated code uses this at call sites which were
+  resolved at conversion time to functions that are never converted, see
+  `Feature.DIRECT_CALLS`:
+
+    ag__.direct_callee(np.sum, fscope)(x, axis=1)
+
+  The callee is checked again when called, so calls are still routed through
+  `converted_call` if they need to be, e.g. when the global variable that
+  held the callee was rebound.
+
+  Args:
+    f: The function to call.
+    caller_fn_scope: function_wrappers.FunctionScope, the function scope of the
+      converted function in which the call is made.
+
+  Returns:
+    Callable, which takes the original arguments of f.
+  """
+  try:
+    overload = _BUILTIN_OVERLOADS.get(f)
+  except TypeError:  # Unhashable callable.
+    overload = None
+  if overload is not None:
+    if ag_ctx.control_status_ctx().status == ag_ctx.Status.DISABLED:
+      return f
+    return overload
+  if _is_never_converted(f):
+    return f
+  return functools.partial(_indirect_call, f, caller_fn_scope)
+
+
+#
+# Inline caches of call sites
+#
+
+
+class _BuiltinOverload(object):
+  """The equivalent of _DispatchDecision for builtins, see _BUILTIN_OVERLOADS."""
+
+  __slots__ = ('overload',)
+
+  def __init__(self, overload):
+    self.overload = overload
+
+  def is_valid(self, f):
+    del f
+    return True
+
+  def dispatch(self, f, args, kwargs):
+    if ag_ctx.control_status_ctx().status == ag_ctx.Status.DISABLED:
+      return _call_unconverted(f, args, kwargs, None, False)
+    if kwargs:
+      return self.overload(*args, **kwargs)
+    return self.overload(*args)
+
+
+class _StrongRef(object):
+  """Stands in for a weakref to an object which lives as long as the process."""
+
+  __slots__ = ('obj',)
+
+  def __init__(self, obj):
+    self.obj = obj
+
+  def __call__(self):
+    return self.obj
+
+
+class CallSite(object):
+  """The inline cache of a call site in generated code.
+
+  For internal use only. With `Feature.CALL_SITE_CACHES`, each call made from
+  generated code has its own `CallSite`, declared alongside the generated
+  function:
+
+    ag__call_site = ag__.CallSite('f at test.py:12', ag__.converted_call)
+    def ag__g(x):
+      ...
+      ag__call_site.converted_call(f, (x,), None, fscope)
+
+  The site remembers the dispatch decisions taken for the callees it saw, so
+  that calling the same callee again skips the lookups of `converted_call`.
+  Sites start as monomorphic, holding a single callee. They become
+  polymorphic if they see more callees, up to `MAX_POLYMORPHIC_CALLEES`, and
+  megamorphic after that, in which case they stop caching and always defer to
+  `converted_call`.
+
+  Callees are only referenced weakly. The decisions are taken from the cache
+  of `converted_call`, and are checked in the same way before being reused.
+  Calls which miss the site, like the first call of each callee, go through
+  `converted_call`, which does that caching.
+
+  Args:
+    label: Text, describes the call site, for `malt.stats`.
+    converted_call_fn: Optional[Callable], the implementation of
+      `converted_call` which handles misses. Defaults to `converted_call`.
+
+  Attributes:
+    label: Text, describes the call site, for `malt.stats`.
+    state: Text, one of UNINITIALIZED, MONOMORPHIC, POLYMORPHIC or
+      MEGAMORPHIC.
+    hits: int, the number of calls dispatched by the site.
+    misses: int, the number of other calls. The counters are not
+      synchronized across threads, so they are approximate.
+  """
+
+  UNINITIALIZED = 'uninitialized'
+  MONOMORPHIC = 'monomorphic'
+  POLYMORPHIC = 'polymorphic'
+  MEGAMORPHIC = 'megamorphic'
+
+  MAX_POLYMORPHIC_CALLEES = 4
+
+  __slots__ = ('label', 'state', 'hits', 'misses', '_converted_call',
+               '_entries', '__weakref__')
+
+  def __init__(self, label, converted_call_fn=None):
+    self.label = label
+    self._converted_call = converted_call_fn or converted_call
+    self.state = CallSite.UNINITIALIZED
+    self.hits = 0
+    self.misses = 0
+    # Tuple[Tuple[Callable, Union[_DispatchDecision, _BuiltinOverload]]], the
+    # references to each callee and their decisions. Replaced as a whole,
+    # so it can be read without locking.
+    self._entries = ()
+    _CALL_SITES.add(self)
+
+  def converted_call(self, f, args, kwargs, caller_fn_scope):
+    """Equivalent to `api.converted_call`, with the same arguments."""
+    if tracing.enabled:
+      # The site bypasses the decisions recorded in the trace.
+      return self._converted_call(f, args, kwargs, caller_fn_scope)
+
+    key = f.__func__ if inspect.ismethod(f) else f
+    for ref, decision in self._entries:
+      if ref() is key:
+        if decision.is_valid(f):
+          self.hits += 1
+          return decision.dispatch(f, args, kwargs)
+        break
+
+    self.misses += 1
+    if self.state != CallSite.MEGAMORPHIC:
+      decision = self._update(key, f, caller_fn_scope.callopts)
+      if decision is not None:
+        return decision.dispatch(f, args, kwargs)
+    return self._converted_call(f, args, kwargs, caller_fn_scope)
+
+  def _update(self, key, f, options):
+    """Caches the decision already taken by converted_call for f, if any."""
+    try:
+      overload = _BUILTIN_OVERLOADS.get(f)
+    except TypeError:  # Unhashable callable.
+      return None
+    if overload is not None:
+      ref = _StrongRef(key)
+      decision = _BuiltinOverload(overload)
+    else:
+      decision = _lookup_dispatch_decision(f, options)
+      if decision is None:
+        return None
+      try:
+        # The entry is removed with the callee, since its decision may hold on
+        # to the closure of the callee.
+        ref = weakref.ref(
+            key, functools.partial(_remove_call_site_entry, weakref.ref(self)))
+      except TypeError:
+        return None
+
+    # Entries of dead or invalidated callees are replaced.
+    entries = tuple(e for e in self._entries
+                    if e[0]() is not None and e[0]() is not key)
+    if len(entries) >= CallSite.MAX_POLYMORPHIC_CALLEES:
+      self.state = CallSite.MEGAMORPHIC
+      self._entries = ()
+      return decision
+    self._entries = entries + ((ref, decision),)
+    if self._entries[1:]:
+      self.state = CallSite.POLYMORPHIC
+    elif self.state == CallSite.UNINITIALIZED:
+      self.state = CallSite.MONOMORPHIC
+    return decision
+
+  def reset_counters(self):
+    self.hits = 0
+    self.misses = 0
+
+
+def _remove_call_site_entry(site_ref, ref):
+  site = site_ref()
+  if site is not None:
+    site._entries = tuple(e for e in site._entries if e[0] is not ref)  # pylint:disable=protected-access
+
+
+# All live call sites, for stats.
+_CALL_SITES = weakref.WeakSet()
+
+_CALL_SITE_STATES = (CallSite.UNINITIALIZED, CallSite.MONOMORPHIC,
+                     CallSite.POLYMORPHIC, CallSite.MEGAMORPHIC)
+
+
+def _call_site_stats():
+  """Returns the counters of all call sites, merged by label."""
+  result = {}
+  for site in list(_CALL_SITES):
+    record = result.get(site.label)
+    if record is None:
+      record = result[site.label] = {
+          'state': site.state,
+          'hits': 0,
+          'misses': 0,
+          'instances': 0,
+      }
+    elif (_CALL_SITE_STATES.index(site.state) >
+          _CALL_SITE_STATES.index(record['state'])):
+      record['state'] = site.state
+    record['hits'] += site.hits
+    record['misses'] += site.misses
+    record['instances'] += 1
+  return result
+
+
 def converted_call(f, args, kwargs, caller_fn_scope=None, options=None):
   """Converts a function call inline.
 
@@ -260,24 +690,76 @@ def converted_call(f, args, kwargs, caller_fn_scope=None, options=None):
     Any, the result of executing a possibly-converted `f` with the given
       arguments.
   """
-  logging.log(1, 'Converted call: %s\n    args: %s\n    kwargs: %s\n', f, args,
-              kwargs)
+  if tracing.enabled:
+    with tracing.span(_qualified_name(f), 'converted_call'):
+      return _converted_call(f, args, kwargs, caller_fn_scope, options)
+  return _converted_call(f, args, kwargs, caller_fn_scope, options)
+
+
+def _qualified_name(f):
+  return '{}.{}'.format(
+      getattr(f, '__module__', None),
+      getattr(f, '__qualname__', getattr(f, '__name__', type(f).__name__)))
+
+
+def _converted_call(f, args, kwargs, caller_fn_scope, options):
+  """Implementation of converted_call."""
+  if logging.enabled:
+    logging.log(1, 'Converted call: %s\n    args: %s\n    kwargs: %s\n', f,
+                args, kwargs)
 
   if options is None:
     if caller_fn_scope is None:
       raise ValueError('either caller_fn_scope or options must have a value')
     options = caller_fn_scope.callopts
 
+  try:
+    overload = _BUILTIN_OVERLOADS.get(f)
+  except TypeError:  # Unhashable callable.
+    overload = None
+  if (overload is not None and
+      ag_ctx.control_status_ctx().status != ag_ctx.Status.DISABLED):
+    if tracing.enabled:
+      tracing.annotate(decision='builtin_overload')
+    if kwargs:
+      return overload(*args, **kwargs)
+    return overload(*args)
+
+  decision = _cached_dispatch_decision(f, options)
+  if decision is not None:
+    if not decision.convert:
+      if logging.enabled:
+        logging.log(2, 'Allowlisted %s: from cache', f)
+      if tracing.enabled:
+        tracing.annotate(decision='dispatch_cache')
+      return _call_unconverted(f, args, kwargs, options, False)
+    # Converted functions are called unconverted when AutoGraph is disabled,
+    # which is handled below.
+    if ag_ctx.control_status_ctx().status != ag_ctx.Status.DISABLED:
+      if tracing.enabled:
+        tracing.annotate(decision='dispatch_cache')
+      return _call_converted(decision.converted_function(f),
+                             decision.effective_args(f, args), kwargs)
+
   if conversion.is_in_allowlist_cache(f, options):
-    logging.log(2, 'Allowlisted %s: from cache', f)
+    if logging.enabled:
+      logging.log(2, 'Allowlisted %s: from cache', f)
+    if tracing.enabled:
+      tracing.annotate(decision='allowlist_cache')
     return _call_unconverted(f, args, kwargs, options, False)
 
   if ag_ctx.control_status_ctx().status == ag_ctx.Status.DISABLED:
-    logging.log(2, 'Allowlisted: %s: AutoGraph is disabled in context', f)
+    if logging.enabled:
+      logging.log(2, 'Allowlisted: %s: AutoGraph is disabled in context', f)
+    if tracing.enabled:
+      tracing.annotate(decision='disabled')
     return _call_unconverted(f, args, kwargs, options, False)
 
   if is_autograph_artifact(f):
-    logging.log(2, 'Permanently allowed: %s: AutoGraph artifact', f)
+    if logging.enabled:
+      logging.log(2, 'Permanently allowed: %s: AutoGraph artifact', f)
+    if tracing.enabled:
+      tracing.annotate(decision='autograph_artifact')
     return _call_unconverted(f, args, kwargs, options)
 
   # If this is a partial, unwrap it and redo all the checks.
@@ -289,8 +771,11 @@ def converted_call(f, args, kwargs, caller_fn_scope=None, options=None):
     if kwargs is not None:
       new_kwargs.update(kwargs)
     new_args = f.args + args
-    logging.log(3, 'Forwarding call of partial %s with\n%s\n%s\n', f, new_args,
-                new_kwargs)
+    if logging.enabled:
+      logging.log(3, 'Forwarding call of partial %s with\n%s\n%s\n', f,
+                  new_args, new_kwargs)
+    if tracing.enabled:
+      tracing.annotate(decision='partial')
     return converted_call(
         f.func,
         new_args,
@@ -299,6 +784,8 @@ def converted_call(f, args, kwargs, caller_fn_scope=None, options=None):
         options=options)
 
   if inspect_utils.isbuiltin(f):
+    if tracing.enabled:
+      tracing.annotate(decision='builtin_overload')
     if f is eval:
       return py_builtins.eval_in_original_context(f, args, caller_fn_scope)
     if f is super:
@@ -307,15 +794,21 @@ def converted_call(f, args, kwargs, caller_fn_scope=None, options=None):
       return py_builtins.globals_in_original_context(caller_fn_scope)
     if f is locals:
       return py_builtins.locals_in_original_context(caller_fn_scope)
+    overload = py_builtins.overload_of(f)
+    _cache_builtin_overload(f, overload)
     if kwargs:
-      return py_builtins.overload_of(f)(*args, **kwargs)
+      return overload(*args, **kwargs)
     else:
-      return py_builtins.overload_of(f)(*args)
+      return overload(*args)
 
   if conversion.is_unsupported(f):
+    if tracing.enabled:
+      tracing.annotate(decision='unsupported')
     return _call_unconverted(f, args, kwargs, options)
 
   if not options.user_requested and conversion.is_allowlisted(f):
+    if tracing.enabled:
+      tracing.annotate(decision='allowlisted')
     return _call_unconverted(f, args, kwargs, options)
 
   # internal_convert_user_code is for example turned off when issuing a dynamic
@@ -323,17 +816,21 @@ def converted_call(f, args, kwargs, caller_fn_scope=None, options=None):
   # case we evidently don't want to recurse, but we still have to convert
   # things like builtins.
   if not options.internal_convert_user_code:
+    if tracing.enabled:
+      tracing.annotate(decision='not_recursive')
     return _call_unconverted(f, args, kwargs, options)
 
   try:
     if inspect.ismethod(f) or inspect.isfunction(f):
       target_entity = f
       effective_args = args
+      self_arg = None
 
       f_self = getattr(f, '__self__', None)
       if f_self is not None:
         # (dime10) strip TfMethodTarget case
         effective_args = (f_self,) + effective_args
+        self_arg = 'bound'
 
     elif hasattr(f, '__class__') and hasattr(f.__class__, '__call__'):
       # Callable objects. Dunder methods have special lookup rules, see:
@@ -342,6 +839,7 @@ def converted_call(f, args, kwargs, caller_fn_scope=None, options=None):
       # This should be handled in the same way as partials.
       target_entity = f.__class__.__call__
       effective_args = (f,) + args
+      self_arg = 'callable'
 
     else:
       target_entity = f
@@ -351,18 +849,26 @@ def converted_call(f, args, kwargs, caller_fn_scope=None, options=None):
     logging.log(1, 'Error transforming entity %s', target_entity, exc_info=True)
     if is_autograph_strict_conversion_mode():
       raise
+    if tracing.enabled:
+      tracing.annotate(decision='fallback')
     return _fall_back_unconverted(f, args, kwargs, options, e)
 
   if not hasattr(target_entity, '__code__'):
     logging.log(2, 'Permanently allowed: %s: native binding', target_entity)
+    if tracing.enabled:
+      tracing.annotate(decision='native_binding')
     return _call_unconverted(f, args, kwargs, options)
   elif (hasattr(target_entity.__code__, 'co_filename') and
         target_entity.__code__.co_filename == '<string>'):
     # TODO(mdan): __globals__['txt'] might work in Py3.
     logging.log(2, 'Permanently allowed: %s: dynamic code (exec?)',
                 target_entity)
+    if tracing.enabled:
+      tracing.annotate(decision='dynamic_code')
     return _call_unconverted(f, args, kwargs, options)
 
+  if tracing.enabled:
+    tracing.annotate(decision='convert')
   try:
     program_ctx = converter.ProgramContext(options=options)
     converted_f = _convert_actual(target_entity, program_ctx)
@@ -372,8 +878,18 @@ def converted_call(f, args, kwargs, caller_fn_scope=None, options=None):
     logging.log(1, 'Error transforming entity %s', target_entity, exc_info=True)
     if is_autograph_strict_conversion_mode():
       raise
+    if tracing.enabled:
+      tracing.annotate(decision='fallback')
     return _fall_back_unconverted(f, args, kwargs, options, e)
 
+  _cache_dispatch_decision(
+      f, options,
+      _DispatchDecision(converted_f, target_entity, self_arg, options))
+  return _call_converted(converted_f, effective_args, kwargs)
+
+
+def _call_converted(converted_f, effective_args, kwargs):
+  """Calls a converted function."""
   # (dime10) strip stack trace mapper & filter which rely on compiled TF cpp code
   try:
     if kwargs is not None:
@@ -391,6 +907,7 @@ def _call_unconverted(f, args, kwargs, options, update_cache=True):
   """Calls the original function without converting with AutoGraph."""
   if update_cache:
     conversion.cache_allowlisted(f, options)
+    _cache_dispatch_decision(f, options, _DispatchDecision())
 
   # (dime10) strip TfMethodTarget case
 
@@ -612,15 +1129,16 @@ def convert(recursive=False,
     function that uses TensorFlow ops.
   """
 
+  options = converter.ConversionOptions(
+      recursive=recursive,
+      user_requested=user_requested,
+      optional_features=optional_features)
+
   def decorator(f):
     """Decorator implementation."""
 
     def wrapper(*args, **kwargs):
       """Wrapper that calls the converted version of f."""
-      options = converter.ConversionOptions(
-          recursive=recursive,
-          user_requested=user_requested,
-          optional_features=optional_features)
       try:
         with conversion_ctx:
           return converted_call(f, args, kwargs, options=options)
@@ -756,4 +1274,393 @@ def to_code(entity, recursive=True, experimental_optional_features=None):
   return textwrap.dedent(source)
 
 
+def _resolve_by_name(module_name, qualname):
+  """Returns the object with the given qualified name, or None if missing."""
+  if '<locals>' in qualname or '<lambda>' in qualname:
+    return None
+  try:
+    obj = importlib.import_module(module_name)
+    for name in qualname.split('.'):
+      obj = getattr(obj, name)
+  except (ImportError, AttributeError):
+    return None
+  return obj
+
+
+def _precompile_in_worker(module_name, qualname, fingerprint, options):
+  """Converts a function in a worker process. See precompile."""
+  f = _resolve_by_name(module_name, qualname)
+  # The module may have been imported from a different version of the source
+  # code. The bytecode alone doesn't tell, because it leaves out constants and
+  # names.
+  if (not inspect.isfunction(f) or
+      cache.code_fingerprint(f.__code__) != fingerprint):
+    return None
+  program_ctx = converter.ProgramContext(options=options)
+  return _TRANSPILER.precompile(f, program_ctx)
+
+
+def _precompile_targets(entities):
+  """Expands modules and classes into the functions that they define."""
+  targets = []
+  for entity in entities:
+    if inspect.ismodule(entity) or inspect.isclass(entity):
+      for member in entity.__dict__.values():
+        if isinstance(member, (staticmethod, classmethod)):
+          member = member.__func__
+        if (inspect.isclass(member) and inspect.ismodule(entity) and
+            member.__module__ == entity.__name__):
+          targets.extend(_precompile_targets((member,)))
+        elif (inspect.isfunction(member) and
+              member.__module__ == getattr(entity, '__name__', None)):
+          targets.append(member)
+        elif inspect.isfunction(member) and inspect.isclass(entity):
+          targets.append(member)
+    else:
+      targets.append(entity)
+
+  return [
+      t for t in targets if hasattr(t, '__code__') and
+      not is_autograph_artifact(t) and t.__code__.co_filename != '<string>'
+  ]
+
+
+def precompile(entities, options=None, workers=None):
+  """Converts functions ahead of their first call, using parallel processes.
+
+  Conversion is CPU-bound, and normally happens when a function is first
+  called. This function allows converting many functions at once, for example
+  at startup, using a pool of processes. The converted code is then loaded
+  into the cache of the current process, so that subsequent calls with the
+  same conversion options don't convert these functions again.
+
+  Functions are converted in worker processes when they can be imported
+  there by name, i.e. for functions defined at the top level of a module or
+  class. Other functions, like lambdas and nested functions, are converted in
+  the current process.
+
+  Example usage:
+
+  >>> import my_module
+  >>> malt.precompile([my_module], workers=4)
+
+  Args:
+    entities: Iterable[Union[Callable, ModuleType, type]], the functions to
+      convert. Modules and classes are expanded to the functions and methods
+      that they define.
+    options: Optional[ConversionOptions], the conversion options. Defaults to
+      the options used by `to_graph`. Converted functions are cached
+      separately for each set of options, so these should match the options
+      that the functions will be called with.
+    workers: Optional[int], the number of worker processes. Defaults to the
+      number of processors. With one worker or less, all conversions run in the
+      current process.
+
+  Raises:
+    Exception: if a function could not be converted, and strict conversion mode
+      is enabled (see `AUTOGRAPH_STRICT_CONVERSION`). Otherwise, the error is
+      logged, and the function will be converted again when called.
+  """
+  if options is None:
+    options = converter.ConversionOptions(
+        recursive=True, user_requested=True, optional_features=None)
+  program_ctx = converter.ProgramContext(options=options)
+
+  def load(f, precompiled):
+    _TRANSPILER.load_precompiled(f, program_ctx, precompiled)
+
+  def handle_error(f, e):
+    logging.log(1, 'Error precompiling %s', f, exc_info=(type(e), e,
+                                                          e.__traceback__))
+    if is_autograph_strict_conversion_mode():
+      raise e
+
+  targets = [
+      f for f in _precompile_targets(entities)
+      if not _TRANSPILER.load_cached(f, program_ctx)
+  ]
+  _precompile_functions(targets, options, workers, load, handle_error)
+
+
+def _precompile_functions(targets, options, workers, callback, on_error):
+  """Calls _TRANSPILER.precompile for each function, in parallel if possible.
+
+  Args:
+    targets: List[Callable], the functions to convert.
+    options: ConversionOptions, the conversion options.
+    workers: Optional[int], see precompile.
+    callback: Callable[[Callable, Any], None], called in the current process
+      with each function and the output of precompile.
+    on_error: Callable[[Callable, Exception], None], called for each function
+      that could not be converted.
+  """
+  program_ctx = converter.ProgramContext(options=options)
+  if workers is None:
+    workers = os.cpu_count() or 1
+
+  local_targets = []
+  remote_targets = []
+  for f in targets:
+    if (workers > 1 and
+        _resolve_by_name(f.__module__, f.__qualname__) is not None):
+      remote_targets.append(f)
+    else:
+      local_targets.append(f)
+
+  if remote_targets:
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=min(workers, len(remote_targets))) as executor:
+      futures = [
+          executor.submit(_precompile_in_worker, f.__module__, f.__qualname__,
+                          cache.code_fingerprint(f.__code__), options)
+          for f in remote_targets
+      ]
+      for f, future in zip(remote_targets, futures):
+        try:
+          precompiled = future.result()
+          if precompiled is None:
+            local_targets.append(f)
+          else:
+            callback(f, precompiled)
+        except Exception as e:  # pylint:disable=broad-except
+          on_error(f, e)
+
+  for f in local_targets:
+    try:
+      callback(f, _TRANSPILER.precompile(f, program_ctx))
+    except Exception as e:  # pylint:disable=broad-except
+      on_error(f, e)
+
+
+def compile_ahead_of_time(entities, directory, options=None, workers=None):
+  """Converts functions and saves the generated code as importable modules.
+
+  The output directory can be loaded with `set_aot_dir`, in which case the
+  functions are loaded from it instead of being converted when first called.
+  Unlike `set_cache_dir`, looking up functions doesn't require reading their
+  source code. See also the `malt.aot` command line tool.
+
+  Args:
+    entities: Iterable[Union[Callable, ModuleType, type]], the functions to
+      convert. See `precompile`.
+    directory: Text, the output directory. Existing entries are kept, unless
+      overwritten by new ones.
+    options: Optional[Iterable[ConversionOptions]], the conversion options to
+      generate code for. Defaults to the options used by `to_graph`, and the
+      options that it uses for recursively converted functions.
+    workers: Optional[int], see `precompile`.
+
+  Returns:
+    Tuple[int, List[Tuple[Callable, Exception]]], the number of generated
+    modules, and the functions that could not be converted with their errors.
+  """
+  if options is None:
+    to_graph_options = converter.ConversionOptions(
+        recursive=True, user_requested=True, optional_features=None)
+    options = (to_graph_options, to_graph_options.call_options())
+
+  store = cache.GeneratedModuleStore(directory)
+  targets = _precompile_targets(entities)
+  errors = []
+  for opts in options:
+    program_ctx = converter.ProgramContext(options=opts)
+
+    def save(f, precompiled, program_ctx=program_ctx):
+      _TRANSPILER.store_precompiled(store, f, program_ctx, precompiled)
+
+    def record_error(f, e):
+      logging.log(1, 'Error precompiling %s', f, exc_info=(type(e), e,
+                                                            e.__traceback__))
+      errors.append((f, e))
+
+    _precompile_functions(targets, opts, workers, save, record_error)
+
+  store.save()
+  return len(store), errors
+
+
+def stats():
+  """Returns statistics about conversions and the caches of converted code.
+
+  Conversion time is broken down into stages: fetching the source code
+  (`source`), parsing it (`parse`), resolving origin information
+  (`origin_info`), static analysis (`analysis.*`), each converter
+  (`converters.*`), and generating, loading and mapping the output code
+  (`unparse`, `load`, `compile`, `source_map`). Stage times exclude the time
+  spent in nested stages.
+
+  Cache statistics are reported for the in-memory cache of converted functions
+  (`transpiler`), the instances of converted functions reused across calls
+  (`instance`), the cache of allowlisted functions (`allowlist`), and if
+  enabled, the persistent cache (`persistent`) and ahead of time directory
+  (`aot`).
+
+  Example:
+
+  >>> s = malt.stats()
+  >>> sorted(s['stages'].items(), key=lambda i: -i[1]['seconds'])[:3]
+
+  Returns:
+    Dict[Text, Dict], with the following items:
+      * 'stages': maps stage names to a dict holding the number of `calls` and
+        the total time, in `seconds`
+      * 'caches': maps cache names to a dict holding the number of `hits` and
+        `misses`
+      * 'functions': maps the qualified name of each converted function to a
+        dict holding the number of `conversions`, their total time in
+        `seconds`, and the time spent in each stage, under `stages`
+      * 'call_sites': with `Feature.CALL_SITE_CACHES`, maps the call sites of
+        generated code to a dict holding the `state` of their inline cache
+        (e.g. 'monomorphic'), their number of `hits` and `misses`, and the
+        number of `instances` of the site, one for each converted closure
+  """
+  result = conversion_stats.snapshot()
+  result['call_sites'] = _call_site_stats()
+  return result
+
+
+def reset_stats():
+  """Clears the statistics returned by `stats`."""
+  conversion_stats.reset()
+  for site in list(_CALL_SITES):
+    site.reset_counters()
+
+
+def start_trace():
+  """Starts recording a timeline of conversions and converted calls.
+
+  The timeline includes a span for each call made from converted code,
+  annotated with the decision taken for the called function, e.g. whether it
+  was converted, called unconverted because it is allowlisted, or overloaded
+  because it is a builtin. Conversions, and their stages, are recorded as
+  nested spans, so a conversion triggered by a call appears under that call.
+
+  Tracing can also be enabled for the entire process using the environment
+  variable `AUTOGRAPH_TRACE_FILE`, which holds the file to which the trace
+  is written on exit.
+
+  Tracing adds some overhead, and is disabled by default.
+  """
+  tracing.start()
+
+
+def stop_trace(path=None):
+  """Stops recording, and optionally writes the recorded timeline to a file.
+
+  Args:
+    path: Optional[Text], the output file. The trace is written in the Chrome
+      trace event format, which can be opened with https://ui.perfetto.dev or
+      chrome://tracing.
+
+  Returns:
+    List[Dict[Text, Any]], the recorded trace events.
+  """
+  events = tracing.stop()
+  if path is not None:
+    tracing.write(path, events)
+  return events
+
+
+def set_aot_dir(path):
+  """Loads converted functions from a directory generated ahead of time.
+
+  See `compile_ahead_of_time` and the `malt.aot` command line tool. Functions
+  which are missing from the directory, or which changed since it was
+  generated, are converted as usual.
+
+  The directory can also be set using the environment variable
+  `AUTOGRAPH_AOT_DIR`. This function takes precedence over the environment
+  variable.
+
+  Note: the directory must only be writable by trusted users, because its
+  contents are loaded as executable code.
+
+  Args:
+    path: Optional[Text], the directory. None disables the lookup.
+  """
+  _TRANSPILER.set_aot_directory(path)
+
+
+def set_cache_dir(path):
+  """Enables a persistent cache of converted code, shared across processes.
+
+  Converting a function requires parsing, analyzing and transforming its source
+  code, which is repeated by every new process. When a cache directory is set,
+  the generated code is saved there and subsequent processes load it directly,
+  provided that the source code of the function and the conversion options
+  are unchanged.
+
+  The cache directory can also be set using the environment variable
+  `AUTOGRAPH_CACHE_DIR`. This function takes precedence over the environment
+  variable.
+
+  Note: the cache directory must only be writable by trusted users, because
+  its contents are loaded as executable code.
+
+  Args:
+    path: Optional[Text], the cache directory. It will be created if it does not
+      exist. None disables the persistent cache.
+  """
+  _TRANSPILER.set_persistent_cache(path)
+
+
+def set_cache_limits(max_entries=None, max_bytes=None,
+                     policy=cache.EvictionPolicy.LRU):
+  """Bounds the memory used to cache converted functions.
+
+  By default, converted functions, their generated code and the results of
+  allowlist checks are cached for as long as the original functions are alive.
+  Long-running processes which convert many distinct functions may bound these
+  caches instead. Entries evicted from the cache are converted again when
+  needed.
+
+  The limits apply separately to the cache of converted functions, to the
+  cache of allowlisted functions and to the cache of the decisions made when
+  calling functions from converted code.
+
+  Args:
+    max_entries: Optional[int], the maximum number of entries in each cache.
+      Each combination of function and conversion options counts separately.
+    max_bytes: Optional[int], the maximum memory held by each cache, in bytes.
+      The memory is estimated from the size of the generated code and source
+      maps, so this is an approximation.
+    policy: malt.experimental.EvictionPolicy, selects the entries to evict
+      first.
+  """
+  _TRANSPILER.set_cache_limits(
+      max_entries=max_entries, max_bytes=max_bytes, policy=policy)
+  conversion.set_allowlist_cache_limits(
+      max_entries=max_entries, max_bytes=max_bytes, policy=policy)
+  _DISPATCH_CACHE.set_limits(
+      max_entries=max_entries, max_bytes=max_bytes, policy=policy)
+
+
+def register_conversion_rules(*rules):
+  """Registers rules that decide which modules are converted.
+
+  Functions called from converted code are converted recursively, unless they
+  belong to a module which is known not to need it, e.g. a numerical library.
+  The rules registered here take precedence over the default ones, and over
+  the rules registered previously. The first rule that matches the module of
+  a function decides.
+
+  Example:
+
+    malt.experimental.register_conversion_rules(
+        malt.experimental.Convert('my_lib.models'),
+        malt.experimental.DoNotConvert('my_lib'))
+
+  Args:
+    *rules: malt.experimental.Convert or malt.experimental.DoNotConvert, the
+      rules to register, in order of precedence.
+  """
+  config.CONVERSION_RULES = tuple(rules) + config.CONVERSION_RULES
+  # Previous checks may have been decided by the default rules.
+  conversion.clear_allowlist_cache()
+
+
 _TRANSPILER = PyToPy()
+if os.environ.get(CACHE_DIR_VAR_NAME):
+  _TRANSPILER.set_persistent_cache(os.environ[CACHE_DIR_VAR_NAME])
+if os.environ.get(AOT_DIR_VAR_NAME):
+  _TRANSPILER.set_aot_directory(os.environ[AOT_DIR_VAR_NAME])
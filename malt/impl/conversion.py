@@ -15,24 +15,51 @@
 # ==============================================================================
 """Core conversion logic, serves as main point of access."""
 
+import collections
 import functools
 import inspect
 import sys
+import threading
 import unittest
+import weakref
 
 from malt.core import config
+from malt.core import config_lib
 from malt.pyct import cache
 from malt.pyct import inspect_utils
 from malt.utils import ag_logging as logging
+from malt.utils import stats
 
 
 _ALLOWLIST_CACHE = cache.UnboundInstanceCache()
 
+# Fallback for the entities that _ALLOWLIST_CACHE can't hold, because they are
+# unhashable or don't allow weakrefs, e.g. callable objects with __slots__.
+# Maps (id(entity), options) to the entity, in order of recency. The entities
+# are held strongly, so their ids can't be reused while they are cached; the
+# cache is bounded to limit the entities it keeps alive.
+_ALLOWLIST_ID_CACHE = collections.OrderedDict()
+_ALLOWLIST_ID_CACHE_MAX_ENTRIES = 256
+_allowlist_id_cache_lock = threading.Lock()
+
+# The index of config.CONVERSION_RULES. Rebuilt when the rules are replaced.
+_rule_index = config_lib.RuleIndex(())
+
+
+def _conversion_rules():
+  global _rule_index
+  index = _rule_index
+  if index.rules is not config.CONVERSION_RULES:
+    index = _rule_index = config_lib.RuleIndex(config.CONVERSION_RULES)
+  return index
+
 
 def _is_of_known_loaded_module(f, module_name):
   mod = sys.modules.get(module_name, None)
   if mod is None:
     return False
+  # The live namespace is scanned, so that rebinding its members takes effect.
+  # The verdicts of the callers are cached, see _ALLOWLIST_CACHE.
   if any(v is not None for v in mod.__dict__.values() if f is v):
     return True
   return False
@@ -75,33 +102,38 @@ def is_unsupported(o):
         '{} appears to be decorated by wrapt, which is not yet supported'
         ' by AutoGraph. The function will run as-is.'
         ' You may still apply AutoGraph before the wrapt decorator.'.format(o))
-    logging.log(2, 'Permanently allowed: %s: wrapt decorated', o)
+    if logging.enabled:
+      logging.log(2, 'Permanently allowed: %s: wrapt decorated', o)
     return True
 
   if _is_known_loaded_type(o, 'functools', '_lru_cache_wrapper'):
-    logging.log(2, 'Permanently allowed: %s: lru_cache', o)
+    if logging.enabled:
+      logging.log(2, 'Permanently allowed: %s: lru_cache', o)
     return True
 
   # Constructors are permanently allowed.
   # TODO(mdan): Toggle as experimental feature instead.
   # TODO(b/124016764): Remove this limitation.
   if inspect_utils.isconstructor(o):
-    logging.log(2, 'Permanently allowed: %s: constructor', o)
+    if logging.enabled:
+      logging.log(2, 'Permanently allowed: %s: constructor', o)
     return True
 
   # Other built-in modules are permanently allowed.
   # TODO(mdan): Figure out how to do this consistently for all stdlib modules.
   if any(
       _is_of_known_loaded_module(o, m)
-      for m in ('collections', 'pdb', 'copy', 'inspect', 're')):
-    logging.log(2, 'Permanently allowed: %s: part of builtin module', o)
+      for m in config.PERMANENTLY_ALLOWED_MODULES):
+    if logging.enabled:
+      logging.log(2, 'Permanently allowed: %s: part of builtin module', o)
     return True
 
   # Custom ops and kernels are also permanently allowed.
   # See tensorflow.framework.load_library.
   if (hasattr(o, '__module__') and
       hasattr(o.__module__, '_IS_TENSORFLOW_PLUGIN')):
-    logging.log(2, 'Permanently allowed: %s: TensorFlow plugin', o)
+    if logging.enabled:
+      logging.log(2, 'Permanently allowed: %s: TensorFlow plugin', o)
     return True
 
   return False
@@ -137,20 +169,23 @@ def is_allowlisted(
 
   # Examples of callables that lack a __module__ property include builtins.
   if hasattr(m, '__name__'):
-    for rule in config.CONVERSION_RULES:
-      action = rule.get_action(m)
-      if action == config.Action.CONVERT:
+    action, rule = _conversion_rules().get_action(m)
+    if action == config.Action.CONVERT:
+      if logging.enabled:
         logging.log(2, 'Not allowed: %s: %s', o, rule)
-        return False
-      elif action == config.Action.DO_NOT_CONVERT:
+      return False
+    elif action == config.Action.DO_NOT_CONVERT:
+      if logging.enabled:
         logging.log(2, 'Allowlisted: %s: %s', o, rule)
-        return True
+      return True
 
   # The check for __code__ below is because isgeneratorfunction crashes
   # without one.
   # (dime10) replacement for tf_inspect.isgeneratorfunction
   if hasattr(o, '__code__') and inspect.isgeneratorfunction(o):
-    logging.log(2, 'Allowlisted: %s: generator functions are not converted', o)
+    if logging.enabled:
+      logging.log(2, 'Allowlisted: %s: generator functions are not converted',
+                  o)
     return True
 
   # (dime10) replacement for tf_inspect.isclass
@@ -160,7 +195,8 @@ def is_allowlisted(
     # The type check avoids infinite recursion around the __call__ method
     # of function objects.
     if (type(o) != type(o.__call__)) and is_allowlisted(o.__call__):  # pylint: disable=unidiomatic-typecheck
-      logging.log(2, 'Allowlisted: %s: object __call__ allowed', o)
+      if logging.enabled:
+        logging.log(2, 'Allowlisted: %s: object __call__ allowed', o)
       return True
 
   owner_class = None
@@ -183,19 +219,8 @@ def is_allowlisted(
 
     owner_class = inspect_utils.getmethodclass(o)
     # (dime10) strip TfMethodTarget case
-    if owner_class is not None:
-      if issubclass(owner_class, unittest.TestCase):
-        logging.log(2, 'Allowlisted: %s: method of TestCase subclass', o)
-        return True
-
-      owner_class = inspect_utils.getdefiningclass(o, owner_class)
-      if is_allowlisted(
-          owner_class,
-          check_call_override=False,
-          allow_namedtuple_subclass=True):
-        logging.log(2, 'Allowlisted: %s: owner is allowed %s', o,
-                    owner_class)
-        return True
+    if owner_class is not None and _is_allowlisted_by_owner(o, owner_class):
+      return True
 
   if inspect_utils.isnamedtuple(o):
     # Due to the way they're constructed, namedtuple types cannot be converted
@@ -203,22 +228,163 @@ def is_allowlisted(
     # graph mode since they are just containers.
     if allow_namedtuple_subclass:
       if not any(inspect_utils.isnamedtuple(base) for base in o.__bases__):
-        logging.log(2, 'Allowlisted: %s: named tuple', o)
+        if logging.enabled:
+          logging.log(2, 'Allowlisted: %s: named tuple', o)
         return True
     else:
-      logging.log(2, 'Allowlisted: %s: named tuple or subclass', o)
+      if logging.enabled:
+        logging.log(2, 'Allowlisted: %s: named tuple or subclass', o)
       return True
 
-  logging.log(2, 'Not allowed: %s: default rule', o)
+  if logging.enabled:
+    logging.log(2, 'Not allowed: %s: default rule', o)
   return False
 
 
+class _OwnerVerdict(object):
+  """The memoized result of _is_allowlisted_by_owner for a method."""
+
+  __slots__ = ('func_ref', 'superclasses', 'definer_ref', 'module', 'rules',
+               'allowed')
+
+  def __init__(self, func, superclasses, definer, rules, allowed):
+    # The method may refer to its class, e.g. through the __class__ cell used
+    # by super(), so it's referenced weakly to let the class be released.
+    self.func_ref = weakref.ref(func)
+    self.superclasses = superclasses
+    self.definer_ref = weakref.ref(definer)
+    self.module = definer.__module__
+    self.rules = rules
+    self.allowed = allowed
+
+
+# Class -> Dict[Text, _OwnerVerdict], indexed by method name.
+_owner_verdicts = weakref.WeakKeyDictionary()
+
+
+def _check_owner(m, owner_class, definer):
+  """Checks whether a method is allowed because of the class that defines it."""
+  if issubclass(owner_class, unittest.TestCase):
+    if logging.enabled:
+      logging.log(2, 'Allowlisted: %s: method of TestCase subclass', m)
+    return True
+
+  if is_allowlisted(
+      definer,
+      check_call_override=False,
+      allow_namedtuple_subclass=True):
+    if logging.enabled:
+      logging.log(2, 'Allowlisted: %s: owner is allowed %s', m, definer)
+    return True
+  return False
+
+
+def _is_allowlisted_by_owner(m, owner_class):
+  """Memoized version of _check_owner.
+
+  The result is memoized for each class and method name. It is recomputed if
+  the method is replaced, the MRO of the class changes (which includes changes
+  to the bases of any of its superclasses), the module of the class that
+  defines the method changes, or the conversion rules are replaced.
+
+  Args:
+    m: A bound method.
+    owner_class: The class that m was retrieved from.
+
+  Returns:
+    Boolean
+  """
+  func = m.__func__
+  name = m.__name__
+  try:
+    verdicts = _owner_verdicts.get(owner_class)
+  except TypeError:
+    # Catch-all for classes that are unhashable or don't allow weakrefs.
+    return _check_owner(
+        m, owner_class, inspect_utils.getdefiningclass(m, owner_class))
+
+  # The MRO includes owner_class itself, which must not be referenced by the
+  # verdict.
+  superclasses = owner_class.__mro__[1:]
+  if verdicts is not None:
+    verdict = verdicts.get(name)
+    if (verdict is not None and verdict.func_ref() is func and
+        verdict.superclasses == superclasses and
+        verdict.rules is config.CONVERSION_RULES):
+      definer = verdict.definer_ref()
+      if definer is not None and definer.__module__ == verdict.module:
+        return verdict.allowed
+
+  rules = config.CONVERSION_RULES
+  definer = inspect_utils.getdefiningclass(m, owner_class)
+  allowed = _check_owner(m, owner_class, definer)
+  if verdicts is None:
+    verdicts = _owner_verdicts.setdefault(owner_class, {})
+  try:
+    verdicts[name] = _OwnerVerdict(func, superclasses, definer, rules, allowed)
+  except TypeError:
+    # Methods or classes that don't allow weakrefs, e.g. builtin methods.
+    pass
+  return allowed
+
+
+def is_never_converted(o):
+  """Checks whether calls to an entity from converted code never convert it.
+
+  This holds regardless of the conversion options of the caller, because the
+  options of recursive calls never force conversion. Builtins are excluded,
+  because they are called via their overloads.
+
+  Args:
+    o: A Python entity.
+
+  Returns:
+    Boolean
+  """
+  # AutoGraph artifacts, see api.autograph_artifact.
+  if hasattr(o, 'autograph_info__'):
+    return True
+  if isinstance(o, functools.partial) or inspect_utils.isbuiltin(o):
+    return False
+  return is_unsupported(o) or is_allowlisted(o)
+
+
+def set_allowlist_cache_limits(max_entries=None, max_bytes=None,
+                               policy=cache.EvictionPolicy.LRU):
+  """Bounds the cache of allowlisted entities. See cache.set_limits."""
+  _ALLOWLIST_CACHE.set_limits(
+      max_entries=max_entries, max_bytes=max_bytes, policy=policy)
+
+
+def clear_allowlist_cache():
+  """Discards the results of previous allowlist checks."""
+  _ALLOWLIST_CACHE.clear()
+  _owner_verdicts.clear()
+  with _allowlist_id_cache_lock:
+    _ALLOWLIST_ID_CACHE.clear()
+
+
+def _id_cache_key(entity, options):
+  if inspect.ismethod(entity):
+    entity = entity.__func__
+  return entity, (id(entity), options)
+
+
 def is_in_allowlist_cache(entity, options):
   try:
-    return _ALLOWLIST_CACHE.has(entity, options)
+    cached = _ALLOWLIST_CACHE.has(entity, options)
   except TypeError:
     # Catch-all for entities that are unhashable or don't allow weakrefs.
-    return False
+    entity, key = _id_cache_key(entity, options)
+    with _allowlist_id_cache_lock:
+      cached = _ALLOWLIST_ID_CACHE.get(key) is entity
+      if cached:
+        _ALLOWLIST_ID_CACHE.move_to_end(key)
+  if cached:
+    stats.hit('allowlist')
+  else:
+    stats.miss('allowlist')
+  return cached
 
 
 def cache_allowlisted(entity, options):
@@ -226,4 +392,9 @@ def cache_allowlisted(entity, options):
     _ALLOWLIST_CACHE[entity][options] = True
   except TypeError:
     # Catch-all for entities that are unhashable or don't allow weakrefs.
-    pass
+    entity, key = _id_cache_key(entity, options)
+    with _allowlist_id_cache_lock:
+      _ALLOWLIST_ID_CACHE[key] = entity
+      _ALLOWLIST_ID_CACHE.move_to_end(key)
+      if len(_ALLOWLIST_ID_CACHE) > _ALLOWLIST_ID_CACHE_MAX_ENTRIES:
+        _ALLOWLIST_ID_CACHE.popitem(last=False)
@@ -1,3 +1,4 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
 # Copyright 2016 The TensorFlow Authors. All Rights Reserved.
 #
 # Licensed under the Apache License, Version 2.0 (the "License");
@@ -14,11 +15,71 @@
 # ==============================================================================
 """Caching utilities."""
 
+import collections
+import enum
+import hashlib
 import inspect
+import itertools
+import json
+import os
+import pickle
+import py_compile
+import sys
+import tempfile
+import threading
+import types
 import weakref
 
+from malt.utils import ag_logging as logging
+
+
+class EvictionPolicy(enum.Enum):
+  """Selects the entries that a bounded cache discards first.
+
+  Attributes:
+    LRU: Discard the least recently used entries.
+    LFU: Discard the least frequently used entries, except for the most
+      recently used one. Ties are broken by discarding the least recently used
+      entry.
+  """
+
+  LRU = 'LRU'
+  LFU = 'LFU'
+
+
+class _Bucket(dict):
+  """The values stored under a single cache key, indexed by subkey.
+
+  Reports insertions to the owner cache, so that the following usage remains
+  accounted for when the cache is bounded:
+
+    cache[key][subkey] = value
+  """
+
+  __slots__ = ('owner', 'keyref')
+
+  def __init__(self, owner):
+    super(_Bucket, self).__init__()
+    self.owner = owner
+    self.keyref = None
+
+  def __setitem__(self, subkey, value):
+    super(_Bucket, self).__setitem__(subkey, value)
+    self.owner._record_insert(self, subkey, value)  # pylint:disable=protected-access
+
+
+class _Usage(object):
+  """Usage statistics of a cache entry."""
+
+  __slots__ = ('bucket', 'subkey', 'size', 'hits')
+
+  def __init__(self, bucket, subkey, size):
+    self.bucket = bucket
+    self.subkey = subkey
+    self.size = size
+    self.hits = 0
+
 
-# TODO(mdan): Add a garbage collection hook for cleaning up modules.
 class _TransformedFnCache(object):
   """Generic hierarchical cache for transformed functions.
 
@@ -26,22 +87,178 @@ class _TransformedFnCache(object):
   destroyed) created from the source function by `_get_key`. The subkeys are
   strong references and can be any value. Typically they identify different
   kinds of transformation.
+
+  By default, the cache is only bounded by the lifetime of the keys. Processes
+  which keep many keys alive may also bound the number or the total size of
+  the entries (i.e. (key, subkey) pairs) using `set_limits`; the entries are
+  then discarded according to an `EvictionPolicy`.
+
+  Attributes:
+    evictions: int, the number of entries discarded to satisfy the limits.
   """
 
-  __slots__ = ('_cache',)
+  __slots__ = ('_cache', '_lock', '_sizeof', '_on_evict', '_policy',
+               '_max_entries', '_max_bytes', '_usage', '_total_bytes',
+               'evictions')
 
-  def __init__(self):
+  def __init__(self, sizeof=sys.getsizeof, on_evict=None):
+    """Creates a new cache.
+
+    Args:
+      sizeof: Callable[[Any], int], estimates the memory held by a value, in
+        bytes. Only used when the cache is bounded by size.
+      on_evict: Optional[Callable[[Any], None]], called with each value
+        discarded to satisfy the limits. Useful to release the resources held
+        by the value.
+    """
     self._cache = weakref.WeakKeyDictionary()
+    self._lock = threading.RLock()
+    self._sizeof = sizeof
+    self._on_evict = on_evict
+    self._policy = EvictionPolicy.LRU
+    self._max_entries = None
+    self._max_bytes = None
+    # Maps (id(bucket), subkey) to _Usage, in order of recency. Only used when
+    # the cache is bounded.
+    self._usage = None
+    self._total_bytes = 0
+    self.evictions = 0
 
   def _get_key(self, entity):
     raise NotImplementedError('subclasses must override')
 
+  @property
+  def bounded(self):
+    return self._usage is not None
+
+  def set_limits(self, max_entries=None, max_bytes=None,
+                 policy=EvictionPolicy.LRU):
+    """Bounds the cache. Entries are evicted when either limit is exceeded.
+
+    Args:
+      max_entries: Optional[int], the maximum number of entries, i.e. of
+        (key, subkey) pairs.
+      max_bytes: Optional[int], the maximum total size of the values, as
+        estimated by the cache's `sizeof` function.
+      policy: EvictionPolicy, selects the entries to evict first.
+    """
+    with self._lock:
+      self._policy = policy
+      self._max_entries = max_entries
+      self._max_bytes = max_bytes
+
+      if max_entries is None and max_bytes is None:
+        self._usage = None
+        self._total_bytes = 0
+        return
+
+      if self._usage is None:
+        self._usage = collections.OrderedDict()
+        self._total_bytes = 0
+        for key, bucket in list(self._cache.items()):
+          self._track(key, bucket)
+          for subkey, value in bucket.items():
+            self._record_insert(bucket, subkey, value)
+      self._evict()
+
+  def _track(self, key, bucket):
+    """Arranges for the entries of bucket to be forgotten when key dies."""
+    if bucket.keyref is None:
+      bucket.keyref = weakref.ref(key, lambda _: self._forget(bucket))
+
+  def _forget(self, bucket):
+    with self._lock:
+      if self._usage is None:
+        return
+      for subkey in bucket:
+        usage = self._usage.pop((id(bucket), subkey), None)
+        if usage is not None:
+          self._total_bytes -= usage.size
+
+  def _record_insert(self, bucket, subkey, value):
+    if self._usage is None:
+      return
+    with self._lock:
+      if self._usage is None:
+        return
+      size = self._sizeof(value) if self._max_bytes is not None else 0
+      usage_key = (id(bucket), subkey)
+      previous = self._usage.pop(usage_key, None)
+      if previous is not None:
+        self._total_bytes -= previous.size
+      self._usage[usage_key] = _Usage(bucket, subkey, size)
+      self._total_bytes += size
+      self._evict()
+
+  def _record_hit(self, bucket, subkey):
+    with self._lock:
+      if self._usage is None:
+        return
+      usage_key = (id(bucket), subkey)
+      usage = self._usage.get(usage_key)
+      if usage is not None:
+        usage.hits += 1
+        self._usage.move_to_end(usage_key)
+
+  def _over_limits(self):
+    return ((self._max_entries is not None and
+             len(self._usage) > self._max_entries) or
+            (self._max_bytes is not None and
+             self._total_bytes > self._max_bytes))
+
+  def _evict(self):
+    """Evicts entries until the cache is within limits. Requires the lock."""
+    while self._usage and self._over_limits():
+      if self._policy == EvictionPolicy.LFU and len(self._usage) > 1:
+        # The most recent entry is exempt, otherwise new entries, which have
+        # no hits yet, would always be evicted first.
+        candidates = itertools.islice(self._usage, len(self._usage) - 1)
+        usage_key = min(candidates, key=lambda k: self._usage[k].hits)
+      else:
+        usage_key = next(iter(self._usage))
+      usage = self._usage.pop(usage_key)
+      self._total_bytes -= usage.size
+
+      bucket = usage.bucket
+      value = dict.pop(bucket, usage.subkey)
+      if not bucket:
+        key = bucket.keyref()
+        if key is not None and self._cache.get(key) is bucket:
+          del self._cache[key]
+
+      self.evictions += 1
+      if self._on_evict is not None:
+        self._on_evict(value)
+
+  def clear(self):
+    """Discards all entries."""
+    with self._lock:
+      self._cache.clear()
+      if self._usage is not None:
+        self._usage.clear()
+        self._total_bytes = 0
+
   def has(self, entity, subkey):
     key = self._get_key(entity)
     parent = self._cache.get(key, None)
     if parent is None:
       return False
-    return subkey in parent
+    if subkey not in parent:
+      return False
+    if self._usage is not None:
+      self._record_hit(parent, subkey)
+    return True
+
+  def get(self, entity, subkey, default=None):
+    """Returns the value for (entity, subkey), or default if missing."""
+    key = self._get_key(entity)
+    parent = self._cache.get(key, None)
+    if parent is None:
+      return default
+    value = parent.get(subkey, default)
+    if self._usage is not None and value is not default:
+      self._record_hit(parent, subkey)
+    return value
 
   def __getitem__(self, entity):
     key = self._get_key(entity)
@@ -49,7 +266,12 @@ class _TransformedFnCache(object):
     if parent is None:
       # The bucket is initialized to support this usage:
       #   cache[key][subkey] = value
-      self._cache[key] = parent = {}
+      with self._lock:
+        parent = self._cache.get(key, None)
+        if parent is None:
+          self._cache[key] = parent = _Bucket(self)
+          if self._usage is not None:
+            self._track(key, parent)
     return parent
 
   def __len__(self):
@@ -91,3 +313,186 @@ class UnboundInstanceCache(_TransformedFnCache):
     return entity
 
 
+def digest(key_parts):
+  """Returns a hex digest of a sequence of strings, stable across processes."""
+  h = hashlib.sha256()
+  for part in key_parts:
+    part = str(part).encode('utf-8')
+    # Prefixing the length avoids ambiguities between concatenated parts.
+    h.update(str(len(part)).encode('ascii'))
+    h.update(b':')
+    h.update(part)
+  return h.hexdigest()
+
+
+def _code_parts(code, parts):
+  # co_lnotab is deprecated since Python 3.10.
+  line_table = getattr(code, 'co_linetable', None) or code.co_lnotab
+  parts.extend((code.co_name, code.co_argcount, code.co_kwonlyargcount,
+                code.co_flags, code.co_code.hex(), code.co_firstlineno,
+                line_table.hex(), code.co_names, code.co_varnames,
+                code.co_freevars, code.co_cellvars))
+  for const in code.co_consts:
+    if isinstance(const, types.CodeType):
+      _code_parts(const, parts)
+    elif isinstance(const, frozenset):
+      # The iteration order of sets varies across processes.
+      parts.append(sorted(repr(c) for c in const))
+    else:
+      parts.append(repr(const))
+
+
+def code_fingerprint(code):
+  """Returns a digest of a code object, stable across processes.
+
+  The digest covers the bytecode, constants and line numbers of the code
+  object and its nested code objects, so it changes with the source code
+  that produced it. Unlike hashing the source code, this doesn't require
+  reading source files. The file name is not included, so that the digest
+  doesn't depend on where the code is installed.
+
+  Args:
+    code: types.CodeType
+
+  Returns:
+    Text
+  """
+  parts = []
+  _code_parts(code, parts)
+  return digest(parts)
+
+
+class PersistentCache(object):
+  """An on-disk cache for transformed functions, shared across processes.
+
+  Entries are stored as individual files inside a directory, named after a
+  digest of their key. The keys are built by the caller from values which
+  remain stable across processes, such as the entity's source code and the
+  conversion options. The values can be any picklable object.
+
+  Writes are atomic, so the directory may be shared by concurrent processes.
+  Unreadable or corrupted entries are treated as cache misses.
+
+  Note: entries are unpickled when read, so the cache directory must only be
+  writable by trusted users.
+  """
+
+  __slots__ = ('directory',)
+
+  def __init__(self, directory):
+    self.directory = directory
+    os.makedirs(directory, exist_ok=True)
+
+  def digest(self, key_parts):
+    """Returns a digest suitable for use as key, from a sequence of strings."""
+    return digest(key_parts)
+
+  def _path(self, key):
+    return os.path.join(self.directory, key + '.pkl')
+
+  def get(self, key):
+    """Returns the entry stored under key, or None if there is no such entry."""
+    try:
+      with open(self._path(key), 'rb') as f:
+        return pickle.load(f)
+    except FileNotFoundError:
+      return None
+    except Exception:  # pylint:disable=broad-except
+      logging.log(1, 'Discarding unreadable cache entry %s', key, exc_info=True)
+      return None
+
+  def put(self, key, value):
+    """Stores value under key, replacing any previous entry."""
+    fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+      os.replace(temp_path, self._path(key))
+    except Exception:  # pylint:disable=broad-except
+      logging.log(1, 'Could not write cache entry %s', key, exc_info=True)
+      try:
+        os.remove(temp_path)
+      except OSError:
+        pass
+
+
+class GeneratedModuleStore(object):
+  """A directory of transformed functions, generated ahead of time.
+
+  Each entry is an importable Python module, holding the generated source
+  code, and a JSON file, holding the source map. A `manifest.json` file maps
+  the entry keys to modules. The modules are byte-compiled when the store is
+  saved, so loading them doesn't parse any source code.
+
+  The output is deterministic: the same keys and entries produce the same
+  files.
+  """
+
+  __slots__ = ('directory', '_entries')
+
+  MANIFEST_NAME = 'manifest.json'
+
+  def __init__(self, directory):
+    self.directory = directory
+    manifest_path = os.path.join(directory, self.MANIFEST_NAME)
+    try:
+      with open(manifest_path, 'r', encoding='utf-8') as f:
+        self._entries = json.load(f)['entries']
+    except FileNotFoundError:
+      self._entries = {}
+
+  def __len__(self):
+    return len(self._entries)
+
+  def module_path(self, key):
+    return os.path.join(self.directory, self._entries[key]['module'] + '.py')
+
+  def get(self, key):
+    """Returns the entry stored under key, or None if there is no such entry.
+
+    Args:
+      key: Text, the entry key.
+
+    Returns:
+      Optional[Dict[Text, Any]], the entry, as passed to `put`, with an
+      additional `source_map` item.
+    """
+    entry = self._entries.get(key)
+    if entry is None:
+      return None
+    map_path = os.path.join(self.directory, entry['module'] + '.map.json')
+    with open(map_path, 'r', encoding='utf-8') as f:
+      entry = dict(entry)
+      entry['source_map'] = json.load(f)
+    return entry
+
+  def put(self, key, source, source_map, **entry):
+    """Adds an entry. See `save`.
+
+    Args:
+      key: Text, the entry key.
+      source: Text, the generated source code.
+      source_map: JSON-serializable object, the source map.
+      **entry: JSON-serializable metadata, returned by `get`.
+    """
+    module = 'ag__{}'.format(key[:32])
+    os.makedirs(self.directory, exist_ok=True)
+    with open(os.path.join(self.directory, module + '.py'), 'w',
+              encoding='utf-8') as f:
+      f.write(source)
+    with open(os.path.join(self.directory, module + '.map.json'), 'w',
+              encoding='utf-8') as f:
+      json.dump(source_map, f, indent=1)
+    entry['module'] = module
+    self._entries[key] = entry
+
+  def save(self):
+    """Writes the manifest and byte-compiles the modules."""
+    for key in self._entries:
+      py_compile.compile(
+          self.module_path(key),
+          doraise=True,
+          invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH)
+    manifest_path = os.path.join(self.directory, self.MANIFEST_NAME)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+      json.dump({'entries': self._entries}, f, indent=1, sort_keys=True)
@@ -16,6 +16,8 @@
 """Code transformation exceptions."""
 
 import collections
+import traceback
+import types
 
 from malt.pyct import origin_info
 
@@ -153,23 +155,63 @@ class ErrorMetadataBase(object):
   This metadata allows re-raising exceptions that occur in generated code, with
   a custom error message that includes a stack trace relative to user-readable
   code from which the generated code originated.
+
+  The stack trace is translated when first needed, typically when the message
+  is rendered. Exceptions which are caught before that, e.g. when used for
+  control flow, don't pay for it.
   """
 
-  __slots__ = ('translated_stack', 'cause_message')
+  __slots__ = ('_callsite_tb', '_cause_metadata', '_source_map',
+               '_converter_filename', '_translated_stack', '_cause_message')
 
   def __init__(self, callsite_tb, cause_metadata, cause_message, source_map,
                converter_filename):
-    translated_stack = _stack_trace_inside_mapped_code(
-        callsite_tb, source_map, converter_filename)
-
-    if cause_metadata is None:
-      self.translated_stack = translated_stack
-      self.cause_message = cause_message
-    else:
-      # Daisy chain the translated stacks.
-      self.translated_stack = (
-          cause_metadata.translated_stack + (translated_stack[-1],))
-      self.cause_message = cause_metadata.cause_message
+    """Creates a new metadata object.
+
+    Args:
+      callsite_tb: Union[types.TracebackType, Sequence[traceback.FrameSummary]],
+        the stack trace of the error, starting at the call site of the
+        converted function. Traceback objects are summarized lazily.
+      cause_metadata: Optional[ErrorMetadataBase], the metadata already attached
+        to the error, if it was raised from nested converted code.
+      cause_message: Optional[Text], the message of the error. Ignored if
+        cause_metadata is set.
+      source_map: Dict[LineLocation, OriginInfo], the source map of the
+        converted code.
+      converter_filename: Text, see _stack_trace_inside_mapped_code.
+    """
+    self._callsite_tb = callsite_tb
+    self._cause_metadata = cause_metadata
+    self._source_map = source_map
+    self._converter_filename = converter_filename
+    self._translated_stack = None
+    self._cause_message = cause_message
+
+  @property
+  def translated_stack(self):
+    """Tuple[FrameInfo], the translated stack trace, outermost frame last."""
+    if self._translated_stack is None:
+      callsite_tb = self._callsite_tb
+      if isinstance(callsite_tb, types.TracebackType):
+        callsite_tb = traceback.extract_tb(callsite_tb)
+      translated_stack = _stack_trace_inside_mapped_code(
+          callsite_tb, self._source_map, self._converter_filename)
+
+      if self._cause_metadata is not None:
+        # Daisy chain the translated stacks.
+        translated_stack = (
+            self._cause_metadata.translated_stack + (translated_stack[-1],))
+      self._translated_stack = translated_stack
+      # The traceback holds the frames of the error, release it.
+      self._callsite_tb = None
+      self._source_map = None
+    return self._translated_stack
+
+  @property
+  def cause_message(self):
+    if self._cause_metadata is not None:
+      return self._cause_metadata.cause_message
+    return self._cause_message
 
   def get_message(self):
     """Returns the message for the underlying exception."""
@@ -24,13 +24,24 @@ import linecache
 import sys
 import threading
 import types
+import weakref
 
-# This lock seems to help avoid linecache concurrency errors.
-_linecache_lock = threading.Lock()
+# Locks by source file. These seem to help avoid linecache concurrency errors.
+_linecache_locks = {}
+
+# Maps the source files of loaded modules to weak references to the modules,
+# see _module_of_file. Unloaded modules are not kept alive.
+_modules_by_file = {}
+# The contents of sys.modules when _modules_by_file was built, see _loaded_ref.
+_modules_snapshot = None
 
 # Cache all the builtin elements in a frozen set for faster lookup.
 _BUILTIN_FUNCTION_IDS = frozenset(id(v) for v in builtins.__dict__.values())
 
+# The types of values which can't refer to other objects, see isselfcontained.
+_ATOMIC_TYPES = frozenset(
+    (type(None), bool, int, float, complex, str, bytes))
+
 
 def islambda(f):
   # (dime10) replacement for tf_inspect.isfunction
@@ -93,6 +104,106 @@ def isconstructor(cls):
                cls.__class__.__call__ is not type.__call__))
 
 
+def _isatomic(value):
+  if type(value) in (tuple, frozenset):
+    return all(_isatomic(v) for v in value)
+  return type(value) in _ATOMIC_TYPES
+
+
+def isselfcontained(f):
+  """Returns True if the state captured by a function can't refer back to it.
+
+  This is the case of functions whose closure and argument defaults only hold
+  atomic values, like numbers and strings, and whose globals are those of a
+  loaded module. Objects which share that state, like the functions converted
+  from f, may then be cached against a weak reference to f without keeping it
+  alive, at least for as long as its module is loaded. Otherwise they may,
+  e.g. through the `__class__` cell of methods which call `super()`, or the
+  closures of mutually recursive functions.
+
+  Args:
+    f: Any
+
+  Returns:
+    Bool
+  """
+  f = getattr(f, '__func__', f)
+  if not isinstance(f, types.FunctionType):
+    return False
+  module = sys.modules.get(f.__module__)
+  if module is None or f.__globals__ is not getattr(module, '__dict__', None):
+    return False
+  for cell in f.__closure__ or ():
+    try:
+      if not _isatomic(cell.cell_contents):
+        return False
+    except ValueError:
+      # Empty cells may later refer to anything.
+      return False
+  if not _isatomic(f.__defaults__ or ()):
+    return False
+  return _isatomic(tuple((f.__kwdefaults__ or {}).values()))
+
+
+def _loaded_ref(m):
+  """Returns a reference to an entry of sys.modules for _modules_snapshot."""
+  try:
+    return weakref.ref(m)
+  except TypeError:
+    # Some entries aren't modules. They can't be found by _module_of_file, so
+    # their identity is enough.
+    return id(m)
+
+
+def _modules_unchanged():
+  """Returns True if sys.modules has the contents of _modules_snapshot."""
+  snapshot = _modules_snapshot
+  if snapshot is None or len(sys.modules) != len(snapshot):
+    return False
+  for name, m in tuple(sys.modules.items()):
+    ref = snapshot.get(name)
+    if isinstance(ref, weakref.ref):
+      if ref() is not m:
+        return False
+    elif ref != id(m):
+      return False
+  return True
+
+
+def _module_of_file(filename):
+  """Returns the loaded module whose source file is `filename`, if any."""
+  global _modules_by_file, _modules_snapshot
+
+  ref = _modules_by_file.get(filename)
+  if ref is not None:
+    m = ref()
+    if (m is not None and getattr(m, '__file__', None) == filename and
+        sys.modules.get(getattr(m, '__name__', None)) is m):
+      return m
+  elif _modules_unchanged():
+    # Comparing the contents rather than just the number of modules catches
+    # modules that were replaced, or unloaded while others were loaded. This
+    # is still much cheaper than rebuilding the index.
+    return None
+
+  # The index is rebuilt when modules were loaded, unloaded or replaced since
+  # it was built, or if it's stale. A snapshot of the loaded modules helps
+  # avoid "dict changed size during iteration" errors.
+  loaded_modules = tuple(sys.modules.items())
+  index = {}
+  for _, m in loaded_modules:
+    m_file = getattr(m, '__file__', None)
+    if isinstance(m_file, str) and m_file not in index:
+      try:
+        index[m_file] = weakref.ref(m)
+      except TypeError:
+        continue
+  _modules_by_file = index
+  _modules_snapshot = {name: _loaded_ref(m) for name, m in loaded_modules}
+  ref = index.get(filename)
+  return None if ref is None else ref()
+
+
 def _fix_linecache_record(obj):
   """Fixes potential corruption of linecache in the presence of functools.wraps.
 
@@ -110,22 +221,47 @@ def _fix_linecache_record(obj):
   if hasattr(obj, '__module__'):
     obj_file = inspect.getfile(obj)
     obj_module = obj.__module__
+    if isinstance(obj_module, str):
+      obj_module = sys.modules.get(obj_module)
+
+    # Fast path: no mismatch.
+    if getattr(obj_module, '__file__', None) == obj_file:
+      return
+
+    m = _module_of_file(obj_file)
+    if m is not None and m is not obj_module:
+      linecache.updatecache(obj_file, m.__dict__)
+
+
+def _linecache_lock(filename):
+  lock = _linecache_locks.get(filename)
+  if lock is None:
+    lock = _linecache_locks.setdefault(filename, threading.Lock())
+  return lock
 
-    # A snapshot of the loaded modules helps avoid "dict changed size during
-    # iteration" errors.
-    loaded_modules = tuple(sys.modules.values())
-    for m in loaded_modules:
-      if hasattr(m, '__file__') and m.__file__ == obj_file:
-        if obj_module is not m:
-          linecache.updatecache(obj_file, m.__dict__)
+
+def getimmediatesourcelines(obj):
+  """A variant of inspect.findsource that fixes the linecache record first.
+
+  Like inspect.findsource, and unlike inspect.getsourcelines, this ignores the
+  __wrapped__ property.
+
+  Args:
+    obj: Any
+
+  Returns:
+    List[Text], int: all the lines of the source file of obj; the index of the
+    line where obj is defined.
+  """
+  with _linecache_lock(inspect.getfile(obj)):
+    _fix_linecache_record(obj)
+    return inspect.findsource(obj)
 
 
 def getimmediatesource(obj):
   """A variant of inspect.getsource that ignores the __wrapped__ property."""
-  with _linecache_lock:
-    _fix_linecache_record(obj)
-    lines, lnum = inspect.findsource(obj)
-    return ''.join(inspect.getblock(lines[lnum:]))
+  lines, lnum = getimmediatesourcelines(obj)
+  return ''.join(inspect.getblock(lines[lnum:]))
 
 
 def getnamespace(f):
@@ -20,13 +20,46 @@ Adapted from Tangent.
 
 import atexit
 import errno
-import importlib
+import importlib.machinery
+import importlib.util
+import itertools
+import linecache
 import os
 import sys
 import tempfile
+import types
 
 from malt.pyct import origin_info
 from malt.pyct import parser
+from malt.utils import stats
+
+DUMP_DIR_VAR_NAME = 'AUTOGRAPH_DUMP_DIR'
+
+dump_dir = None  # Takes precedence over the env variable.
+
+_module_counter = itertools.count()
+
+
+def set_dump_dir(path):
+  """Sets a directory where code loaded in memory is also written to.
+
+  By default, code loaded with `in_memory=True` only exists in memory. Setting
+  a dump directory is useful for debugging, as it allows opening the generated
+  code in external tools. The directory can also be set using the environment
+  variable `AUTOGRAPH_DUMP_DIR`. This function takes precedence over the
+  environment variable.
+
+  Args:
+    path: Optional[Text], the dump directory. None restores the default.
+  """
+  global dump_dir
+  dump_dir = path
+
+
+def get_dump_dir():
+  if dump_dir is not None:
+    return dump_dir
+  return os.getenv(DUMP_DIR_VAR_NAME) or None
 
 
 def _remove_file(file_name):
@@ -42,12 +75,13 @@ def _remove_file(file_name):
       raise
 
 
-def load_source(source, delete_on_exit):
-  """Loads the given source code as a Python module."""
+def _write_source(source, delete_on_exit, directory=None):
+  """Writes source code to a temporary file, returning its module name."""
   with tempfile.NamedTemporaryFile(
       mode='w',
       suffix='.py',
       prefix='__autograph_generated_file',
+      dir=directory,
       delete=False,
       encoding='utf-8') as f:
     module_name = os.path.basename(f.name[:-3])
@@ -57,6 +91,101 @@ def load_source(source, delete_on_exit):
   if delete_on_exit:
     atexit.register(lambda: _remove_file(file_name))
 
+  return module_name, file_name
+
+
+def _with_filename(code, file_name):
+  """Returns a copy of a code object and its children, with a new file name."""
+  consts = tuple(
+      _with_filename(c, file_name) if isinstance(c, types.CodeType) else c
+      for c in code.co_consts)
+  return code.replace(co_filename=file_name, co_consts=consts)
+
+
+class _GeneratedSourceLoader(object):
+  """Minimal PEP 302 loader which serves the source of in-memory modules.
+
+  Tools like `inspect` and `linecache` query the loader of a module for its
+  source code when it doesn't exist as a file.
+  """
+
+  def __init__(self, source):
+    self._source = source
+
+  def get_source(self, fullname):
+    del fullname
+    return self._source
+
+
+def _in_memory_location(source):
+  """Returns a module name and file name for source code loaded in memory."""
+  directory = get_dump_dir()
+  if directory is not None:
+    os.makedirs(directory, exist_ok=True)
+    return _write_source(source, delete_on_exit=False, directory=directory)
+
+  module_name = '__autograph_generated_module{}'.format(next(_module_counter))
+  return module_name, '<{}>'.format(module_name)
+
+
+def _load_in_memory(code, source, module_name, file_name):
+  """Executes compiled code in a new module, without using the file system."""
+  loader = _GeneratedSourceLoader(source)
+  module = types.ModuleType(module_name)
+  module.__file__ = file_name
+  module.__loader__ = loader
+  module.__spec__ = importlib.machinery.ModuleSpec(
+      module_name, loader, origin=file_name)
+
+  # Registering the source allows e.g. `pdb`, `inspect` and tracebacks to
+  # display the code. A missing modification time marks the entry as
+  # permanent; linecache.checkcache will not discard it.
+  linecache.cache[file_name] = (len(source), None, source.splitlines(True),
+                                file_name)
+
+  exec(code, module.__dict__)  # pylint:disable=exec-used
+  # TODO(mdan): Use our own garbage-collected cache instead of sys.modules.
+  sys.modules[module_name] = module
+  return module
+
+
+def unload(module):
+  """Releases the global references to a module loaded by this module.
+
+  The module is removed from `sys.modules` and its source code from
+  `linecache`, if it was loaded in memory. The module's functions remain
+  usable, but their source code may no longer be accessible.
+
+  Args:
+    module: types.ModuleType, a module returned by one of the loader functions.
+  """
+  if sys.modules.get(module.__name__) is module:
+    del sys.modules[module.__name__]
+  if isinstance(getattr(module, '__loader__', None), _GeneratedSourceLoader):
+    linecache.cache.pop(module.__file__, None)
+
+
+def load_source(source, delete_on_exit, in_memory=False):
+  """Loads the given source code as a Python module.
+
+  Args:
+    source: Text, the source code to load.
+    delete_on_exit: bool, whether to delete the temporary file used for
+      compilation on exit. Ignored when `in_memory` is True.
+    in_memory: bool, whether to compile the code in memory rather than
+      importing it from a temporary file. The source code remains readable
+      through `linecache`. See `set_dump_dir` to also save it to a file.
+
+  Returns:
+    Tuple[module, Text], the loaded module and the name of its source file.
+  """
+  if in_memory:
+    module_name, file_name = _in_memory_location(source)
+    code = compile(source, file_name, 'exec', dont_inherit=True)
+    return _load_in_memory(code, source, module_name, file_name), file_name
+
+  module_name, file_name = _write_source(source, delete_on_exit)
+
   spec = importlib.util.spec_from_file_location(module_name, file_name)
   module = importlib.util.module_from_spec(spec)
   spec.loader.exec_module(module)
@@ -65,10 +194,63 @@ def load_source(source, delete_on_exit):
   return module, file_name
 
 
+def load_code(code, source, delete_on_exit, in_memory=False):
+  """Loads precompiled code as a Python module.
+
+  This skips compilation, for example when the code was restored from a
+  persistent cache. The source code is still saved alongside, so that the
+  module remains readable by e.g. `pdb` or `inspect`.
+
+  Args:
+    code: types.CodeType, the compiled module code.
+    source: Text, the source code that `code` was compiled from.
+    delete_on_exit: bool, whether to delete the temporary file holding the
+      source code on exit. Ignored when `in_memory` is True.
+    in_memory: bool, see `load_source`.
+
+  Returns:
+    Tuple[module, Text], the loaded module and the name of its source file.
+  """
+  if in_memory:
+    module_name, file_name = _in_memory_location(source)
+    code = _with_filename(code, file_name)
+    return _load_in_memory(code, source, module_name, file_name), file_name
+
+  module_name, file_name = _write_source(source, delete_on_exit)
+
+  spec = importlib.util.spec_from_file_location(module_name, file_name)
+  module = importlib.util.module_from_spec(spec)
+  exec(_with_filename(code, file_name), module.__dict__)  # pylint:disable=exec-used
+  sys.modules[module_name] = module
+  return module, file_name
+
+
+def load_file(file_name, module_name):
+  """Imports a module from a source file generated ahead of time.
+
+  Unlike the other loader functions, this uses the standard import machinery,
+  which reuses the file's cached bytecode when it is up to date.
+
+  Args:
+    file_name: Text, the name of the source file.
+    module_name: Text, the name under which the module is registered in
+      `sys.modules`.
+
+  Returns:
+    module, the loaded module.
+  """
+  spec = importlib.util.spec_from_file_location(module_name, file_name)
+  module = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(module)
+  sys.modules[module_name] = module
+  return module
+
+
 def load_ast(nodes,
              indentation='  ',
              include_source_map=False,
-             delete_on_exit=True):
+             delete_on_exit=True,
+             in_memory=False):
   """Loads the given AST as a Python module.
 
   Compiling the AST code this way ensures that the source code is readable by
@@ -81,6 +263,8 @@ def load_ast(nodes,
     include_source_map: bool, whether return a source map.
     delete_on_exit: bool, whether to delete the temporary file used for
       compilation on exit.
+    in_memory: bool, whether to compile the code in memory, without writing
+      it to a temporary file. See `load_source`.
 
   Returns:
     Tuple[module, Text, Dict[LineLocation, OriginInfo]], containing:
@@ -91,11 +275,15 @@ def load_ast(nodes,
   if not isinstance(nodes, (list, tuple)):
     nodes = (nodes,)
 
-  source = parser.unparse(nodes, indentation=indentation)
-  module, _ = load_source(source, delete_on_exit)
+  with stats.stage('unparse'):
+    source = parser.unparse(nodes, indentation=indentation)
+  with stats.stage('load'):
+    module, _ = load_source(source, delete_on_exit, in_memory=in_memory)
 
   if include_source_map:
-    source_map = origin_info.create_source_map(nodes, source, module.__file__)
+    with stats.stage('source_map'):
+      source_map = origin_info.create_source_map(nodes, source,
+                                                 module.__file__)
   else:
     source_map = None
 
@@ -248,6 +248,13 @@ def resolve(node, source, context_filepath, context_lineno, context_col_offset):
     context_lineno: int
     context_col_offset: int
   """
+  comments_map = _comments_map(node, source)
+  _resolve(node, source, comments_map, context_filepath, context_lineno,
+           context_col_offset)
+
+
+def _comments_map(node, source):
+  """Returns the comments of the source code, by line number."""
   # TODO(mdan): Pull this to a separate utility.
   code_reader = io.StringIO(source)
   comments_map = {}
@@ -264,7 +271,11 @@ def resolve(node, source, context_filepath, context_lineno, context_col_offset):
       pass
     else:
       raise
+  return comments_map
+
 
+def _resolve(node, source, comments_map, context_filepath, context_lineno,
+             context_col_offset):
   source_lines = source.split('\n')
   visitor = OriginResolver(node, source_lines, comments_map,
                            context_lineno, context_col_offset,
@@ -286,6 +297,20 @@ def resolve_entity(node, source, entity):
   resolve(node, source, filepath, lineno, col_offset)
 
 
+def resolve_source_info(node, source_info):
+  """Like resolve, but uses the context information of a parser.SourceInfo.
+
+  Args:
+    node: ast.AST, the AST to annotate.
+    source_info: parser.SourceInfo, the source that node was parsed from.
+  """
+  comments_map = source_info.comments
+  if comments_map is None:
+    comments_map = _comments_map(node, source_info.source)
+  _resolve(node, source_info.source, comments_map, source_info.source_file,
+           source_info.lineno, source_info.col_offset)
+
+
 def copy_origin(from_node, to_node):
   """Copies the origin info from a node to another, recursively."""
   origin = anno.Basic.ORIGIN.of(from_node, default=None)
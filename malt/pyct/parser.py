@@ -19,14 +19,19 @@ Adapted from Tangent.
 """
 
 import ast
+import collections
+import copy
 import inspect
 import io
 import linecache
 import re
 import sys
+import threading
 import tokenize
+import types
 
 from malt.pyct import errors, inspect_utils
+from malt.utils import stats
 
 STANDARD_PREAMBLE = ''
 MAX_SIZE = sys.maxsize
@@ -43,7 +48,22 @@ def _unfold_continuations(code_string):
 
 def dedent_block(code_string):
   """Dedents a code so that its first line starts at row zero."""
+  return _dedent_block(code_string)[0]
 
+
+def _dedent_block(code_string):
+  """Like dedent_block, and also returns the comments of the code.
+
+  Args:
+    code_string: Text
+
+  Returns:
+    Text, Optional[Dict[int, Text]]: the dedented code; its comments by line
+    number, in the format of origin_info.resolve, or None if they can't be
+    determined from the tokens of the code.
+  """
+  # Unfolding the continuations shifts the lines of the code.
+  has_continuations = '\\\n' in code_string
   code_string = _unfold_continuations(code_string)
 
   token_gen = tokenize.generate_tokens(io.StringIO(code_string).readline)
@@ -53,11 +73,20 @@ def dedent_block(code_string):
   try:
     for tok in token_gen:
       tokens.append(tok)
+    complete = True
   except tokenize.TokenError:
     # Resolution of lambda functions may yield incomplete code, which can
     # in turn generate this error. We silently ignore this error because the
     # parser may still be able to deal with it.
-    pass
+    complete = False
+
+  comments = None
+  if complete and not has_continuations:
+    comments = {
+        tok.start[0]: tok.string.strip()[1:].strip()
+        for tok in tokens
+        if tok.type == tokenize.COMMENT
+    }
 
   for tok in tokens:
     tok_type, tok_string, _, _, _ = tok
@@ -71,7 +100,7 @@ def dedent_block(code_string):
       break
 
   if not block_indentation:
-    return code_string
+    return code_string, comments
 
   block_level = len(block_indentation)
   first_indent_uses_tabs = '\t' in block_indentation
@@ -106,7 +135,41 @@ def dedent_block(code_string):
     dedented_code.append(dedented_line)
   new_code = '\n'.join(dedented_code)
 
-  return new_code
+  return new_code, comments
+
+
+class SourceInfo(object):
+  """The source code of an entity, as fetched for its conversion.
+
+  It's fetched once by `parse_entity_source` and used for parsing, for origin
+  resolution (see origin_info.resolve_source_info) and for
+  transformer.EntityInfo.
+
+  Attributes:
+    source: Text, the source code that was parsed: the dedented definition of
+      the entity, prefixed by its future imports.
+    source_file: Text, the file in which the entity is defined.
+    lineno: int, the line of that file at which the definition starts.
+    col_offset: int, the indentation of that line.
+    future_features: Tuple[Text], the future features of the entity.
+    comments: Optional[Dict[int, Text]], the comments of `source` by line
+      number, if they were found while fetching the source.
+  """
+
+  __slots__ = ('source', 'source_file', 'lineno', 'col_offset',
+               'future_features', 'comments')
+
+  def __init__(self, source, source_file, lines, lnum, future_features,
+               comments=None):
+    self.source = source
+    self.source_file = source_file
+    self.lineno = lnum + 1
+    # Poor man's attempt at guessing the column offset: count the leading
+    # whitespace. This might not work well with tabs.
+    definition_line = lines[lnum]
+    self.col_offset = len(definition_line) - len(definition_line.lstrip())
+    self.future_features = tuple(future_features)
+    self.comments = comments
 
 
 def parse_entity(entity, future_features):
@@ -122,27 +185,59 @@ def parse_entity(entity, future_features):
     ast.AST, Text: the parsed AST node; the source code that was parsed to
     generate the AST (including any prefixes that this function may have added).
   """
-  if inspect_utils.islambda(entity):
-    return _parse_lambda(entity)
+  node, source_info = parse_entity_source(entity, future_features)
+  return node, source_info.source
 
-  try:
-    original_source = inspect_utils.getimmediatesource(entity)
-  except OSError as e:
-    raise errors.InaccessibleSourceCodeError(
-        f'Unable to locate the source code of {entity}. Note that functions'
-        ' defined in certain environments, like the interactive Python shell,'
-        ' do not expose their source code. If that is the case, you should'
-        ' define them in a .py source file. If you are certain the code is'
-        ' graph-compatible, wrap the call using'
-        f' @tf.autograph.experimental.do_not_convert. Original error: {e}')
 
-  source = dedent_block(original_source)
+def parse_entity_source(entity, future_features):
+  """Like parse_entity, but returns a SourceInfo instead of the source code.
 
-  future_statements = tuple(
-      'from __future__ import {}'.format(name) for name in future_features)
-  source = '\n'.join(future_statements + (source,))
+  Args:
+    entity: Same as for parse_entity.
+    future_features: Same as for parse_entity.
 
-  return parse(source, preamble_len=len(future_features)), source
+  Returns:
+    ast.AST, SourceInfo: the parsed AST node; the source code that was parsed
+    to generate the AST, and its location.
+  """
+  if inspect_utils.islambda(entity):
+    with stats.stage('parse'):
+      node, source = _parse_lambda(entity)
+    with stats.stage('source'):
+      lines, lnum = inspect.findsource(entity)
+      source_info = SourceInfo(source, inspect.getsourcefile(entity), lines,
+                               lnum, future_features)
+    return node, source_info
+
+  with stats.stage('source'):
+    try:
+      lines, lnum = inspect_utils.getimmediatesourcelines(entity)
+    except OSError as e:
+      raise errors.InaccessibleSourceCodeError(
+          f'Unable to locate the source code of {entity}. Note that functions'
+          ' defined in certain environments, like the interactive Python'
+          ' shell, do not expose their source code. If that is the case, you'
+          ' should define them in a .py source file. If you are certain the'
+          ' code is graph-compatible, wrap the call using'
+          f' @tf.autograph.experimental.do_not_convert. Original error: {e}')
+    original_source = ''.join(inspect.getblock(lines[lnum:]))
+
+    source, comments = _dedent_block(original_source)
+
+    future_statements = tuple(
+        'from __future__ import {}'.format(name) for name in future_features)
+    source = '\n'.join(future_statements + (source,))
+    if comments and future_statements:
+      comments = {
+          lineno + len(future_statements): comment
+          for lineno, comment in comments.items()
+      }
+
+    source_info = SourceInfo(source, inspect.getsourcefile(entity), lines,
+                             lnum, future_features, comments)
+
+  with stats.stage('parse'):
+    return parse(source, preamble_len=len(future_features)), source_info
 
 
 def _without_context(node, lines, minl, maxl):
@@ -210,6 +305,261 @@ def _node_matches_argspec(node, func):
   return True
 
 
+class _LambdaIndex(object):
+  """The lambda nodes of a module, indexed by the lines that they span."""
+
+  __slots__ = ('lines', 'entries', 'by_line')
+
+  def __init__(self, lines):
+    # The lines are kept to detect changes of the source, see _lambda_index.
+    self.lines = lines
+    # List[Tuple[ast.Lambda, int, int]], each lambda node and the first and
+    # last line that it spans.
+    self.entries = []
+    # Maps line numbers to the indices of the entries spanning them.
+    self.by_line = {}
+
+    for node in parse(''.join(lines), preamble_len=0, single_node=False):
+      for ln in ast.walk(node):
+        if not isinstance(ln, ast.Lambda):
+          continue
+        minl, maxl = MAX_SIZE, 0
+        for n in ast.walk(ln):
+          minl = min(minl, getattr(n, 'lineno', minl))
+          lineno = getattr(n, 'lineno', maxl)
+          end_lineno = getattr(n, 'end_lineno', None)
+          if end_lineno is not None:
+            # end_lineno is more precise, but lineno should almost always work
+            # too.
+            lineno = end_lineno
+          maxl = max(maxl, lineno)
+        i = len(self.entries)
+        self.entries.append((ln, minl, maxl))
+        for line in range(minl, maxl + 1):
+          self.by_line.setdefault(line, []).append(i)
+
+  def spanning(self, line):
+    """Returns the entries of the lambdas which span the given line."""
+    return [self.entries[i] for i in self.by_line.get(line, ())]
+
+
+# Maps source file names to their _LambdaIndex, in order of recency. Each index
+# holds the lines and lambda nodes of a whole file, so only a few are kept.
+_lambda_indexes = collections.OrderedDict()
+_LAMBDA_INDEXES_MAX_ENTRIES = 16
+_lambda_indexes_lock = threading.Lock()
+
+
+def _is_current(filename, index):
+  """Returns True if linecache still holds the lines of a _LambdaIndex."""
+  entry = linecache.cache.get(filename)
+  return entry is not None and len(entry) > 2 and entry[2] is index.lines
+
+
+def _lambda_index(filename, lines):
+  """Returns the _LambdaIndex of a source file, parsing it if needed."""
+  # linecache returns the same list of lines until the file is reloaded, e.g.
+  # by linecache.checkcache after it changed.
+  with _lambda_indexes_lock:
+    index = _lambda_indexes.get(filename)
+    if index is not None and index.lines is lines:
+      _lambda_indexes.move_to_end(filename)
+      stats.hit('lambda_index')
+      return index
+
+  stats.miss('lambda_index')
+  index = _LambdaIndex(lines)
+  with _lambda_indexes_lock:
+    # Indexes of files whose lines were since replaced in linecache are
+    # dropped, rather than waiting for the next lookup of their file.
+    for other_filename, other_index in tuple(_lambda_indexes.items()):
+      if not _is_current(other_filename, other_index):
+        del _lambda_indexes[other_filename]
+    _lambda_indexes[filename] = index
+    _lambda_indexes.move_to_end(filename)
+    if len(_lambda_indexes) > _LAMBDA_INDEXES_MAX_ENTRIES:
+      _lambda_indexes.popitem(last=False)
+  return index
+
+
+# Code objects record the location of their instructions since Python 3.11.
+_HAS_CODE_POSITIONS = hasattr(types.CodeType, 'co_positions')
+
+_CLOSING_BRACKETS = {'(': ')', '[': ']', '{': '}'}
+
+# Matches the whitespace, line continuations and comments between tokens.
+_INSIGNIFICANT_TEXT = re.compile(r'(?:[ \t\f]|\\$)*(?:#.*)?')
+
+# Matches the tokens which may follow a complete lambda: the delimiters of the
+# surrounding expression, an assignment or a comprehension.
+_LAMBDA_TERMINATOR = re.compile(r'[)\]},:;]|=(?!=)|(?:for|async)(?!\w)')
+
+
+def _code_span(code):
+  """Returns the first and last location covered by the instructions of code.
+
+  Args:
+    code: types.CodeType
+
+  Returns:
+    Optional[Tuple[Tuple[int, int], Tuple[int, int]]], the (line, column) at
+    which the instructions start and end, if they have known locations. The
+    columns are UTF-8 byte offsets, like those of the AST.
+  """
+  start = end = None
+  for lineno, end_lineno, col_offset, end_col_offset in code.co_positions():
+    if None in (lineno, end_lineno, col_offset, end_col_offset):
+      continue
+    if (lineno, col_offset) == (end_lineno, end_col_offset):
+      # Artificial instructions, like RESUME, have empty locations.
+      continue
+    if start is None or (lineno, col_offset) < start:
+      start = lineno, col_offset
+    if end is None or (end_lineno, end_col_offset) > end:
+      end = end_lineno, end_col_offset
+  if start is None:
+    return None
+  return start, end
+
+
+def _unclosed_brackets(code_string):
+  """Returns the brackets of a code fragment which it doesn't close."""
+  brackets = []
+  try:
+    for tok in tokenize.generate_tokens(io.StringIO(code_string).readline):
+      if tok.type != tokenize.OP:
+        continue
+      if tok.string in _CLOSING_BRACKETS:
+        brackets.append(tok.string)
+      elif brackets and tok.string == _CLOSING_BRACKETS[brackets[-1]]:
+        brackets.pop()
+  except tokenize.TokenError:
+    # Raised at the end of fragments with unclosed brackets.
+    pass
+  return brackets
+
+
+def _lambda_end(lines, lineno, col_offset, closing_brackets):
+  """Returns the end of the source of a lambda, given the end of its body.
+
+  The body may only be followed by the brackets closing any parentheses around
+  it, and then by the end of the line or by one of _LAMBDA_TERMINATOR.
+
+  Args:
+    lines: List[Text], the lines of the source file.
+    lineno: int, the line at which the body ends.
+    col_offset: int, the UTF-8 byte offset at which the body ends.
+    closing_brackets: List[Text], the brackets expected after the body.
+
+  Returns:
+    Optional[Tuple[int, int]], the (line, column) at which the lambda ends, or
+    None if its source appears to continue beyond its body.
+  """
+  closing_brackets = list(closing_brackets)
+  end = lineno, col_offset
+  first_line = lines[lineno - 1].encode('utf-8')
+  rest = first_line[col_offset:].decode('utf-8')
+  for i, text in enumerate([rest] + lines[lineno:]):
+    text = text.rstrip('\r\n')
+    pos = _INSIGNIFICANT_TEXT.match(text).end()
+    while closing_brackets and pos < len(text):
+      if text[pos] != closing_brackets[0]:
+        return None
+      del closing_brackets[0]
+      end_col_offset = len(text[:pos + 1].encode('utf-8'))
+      if i == 0:
+        end_col_offset += col_offset
+      end = lineno + i, end_col_offset
+      pos = _INSIGNIFICANT_TEXT.match(text, pos + 1).end()
+    if not closing_brackets:
+      if pos == len(text) or _LAMBDA_TERMINATOR.match(text, pos):
+        return end
+      return None
+  return None
+
+
+def _parse_lambda_by_positions(lam, lines):
+  """Parses the exact source of a lambda, as located by its code object.
+
+  This parses only the lambda itself, so it's faster than parsing its entire
+  module, and it can tell apart lambdas defined on the same line. The code
+  object only records the location of the body though, which is searched
+  backwards for the `lambda` keyword.
+
+  Args:
+    lam: types.LambdaType
+    lines: List[Text], the lines of the source file of lam.
+
+  Returns:
+    Optional[Tuple[ast.AST, Text]], the same as _parse_lambda, or None if the
+    lambda could not be located this way.
+  """
+  span = _code_span(lam.__code__)
+  if span is None:
+    return None
+  (body_lineno, body_col_offset), body_end = span
+
+  def_lineno = lam.__code__.co_firstlineno
+  if not 0 < def_lineno <= body_lineno <= body_end[0] <= len(lines):
+    return None
+  def_line = lines[def_lineno - 1].encode('utf-8')
+  if body_lineno == def_lineno:
+    def_line = def_line[:body_col_offset]
+
+  def source_between(start, end):
+    fragment = [l.encode('utf-8') for l in lines[start[0] - 1:end[0]]]
+    fragment[-1] = fragment[-1][:end[1]]
+    fragment[0] = fragment[0][start[1]:]
+    return b''.join(fragment).decode('utf-8')
+
+  # The closest `lambda` keyword is tried first; those before it may belong
+  # to lambdas which have this one in their default arguments.
+  keywords = list(re.finditer(rb'(?<!\w)lambda(?!\w)', def_line))
+  for keyword in reversed(keywords):
+    start = def_lineno, keyword.start()
+    closing_brackets = [
+        _CLOSING_BRACKETS[b]
+        for b in reversed(_unclosed_brackets(source_between(start, body_end)))
+    ]
+    # Parts of the body may have been optimized away, e.g. unreachable
+    # branches of conditional expressions, in which case the source continues
+    # beyond its instructions.
+    end = _lambda_end(lines, body_end[0], body_end[1], closing_brackets)
+    if end is None:
+      continue
+
+    try:
+      node = ast.parse(
+          '({})'.format(source_between(start, end)), mode='eval').body
+    except SyntaxError:
+      continue
+    if not isinstance(node, ast.Lambda):
+      continue
+
+    # Move the node to its location in the source file, accounting for the
+    # parenthesis that was added.
+    for n in ast.walk(node):
+      if getattr(n, 'lineno', None) is None:
+        continue
+      if n.lineno == 1:
+        n.col_offset += start[1] - 1
+      if n.end_lineno == 1:
+        n.end_col_offset += start[1] - 1
+      n.lineno += def_lineno - 1
+      n.end_lineno += def_lineno - 1
+
+    if (node.body.end_lineno, node.body.end_col_offset) != body_end:
+      continue
+    if (node.end_lineno, node.end_col_offset) != end:
+      continue
+    if not _node_matches_argspec(node, lam):
+      continue
+
+    return _without_context(node, lines, node.lineno, node.end_lineno)
+
+  return None
+
+
 def _parse_lambda(lam):
   """Returns the AST and source code of given lambda function.
 
@@ -220,56 +570,42 @@ def _parse_lambda(lam):
     ast.AST, Text: the parsed AST node; the source code that was parsed to
     generate the AST (including any prefixes that this function may have added).
   """
-  # TODO(mdan): Use a fast path if the definition is not multi-line.
-  # We could detect that the lambda is in a multi-line expression by looking
-  # at the surrounding code - an surrounding set of parentheses indicates a
-  # potential multi-line definition.
+  with stats.stage('source'):
+    mod = inspect.getmodule(lam)
+    f = inspect.getsourcefile(lam)
 
-  mod = inspect.getmodule(lam)
-  f = inspect.getsourcefile(lam)
-  def_line = lam.__code__.co_firstlineno
+    # This method is more robust that just calling inspect.getsource(mod), as
+    # it works in interactive shells, where getsource would fail. This is the
+    # same procedure followed by inspect for non-modules:
+    # https://github.com/python/cpython/blob/3.8/Lib/inspect.py#L772
+    lines = linecache.getlines(f, mod.__dict__)
 
-  # This method is more robust that just calling inspect.getsource(mod), as it
-  # works in interactive shells, where getsource would fail. This is the
-  # same procedure followed by inspect for non-modules:
-  # https://github.com/python/cpython/blob/3.8/Lib/inspect.py#L772
-  lines = linecache.getlines(f, mod.__dict__)
-  source = ''.join(lines)
-
-  # Narrow down to the last node starting before our definition node.
-  all_nodes = parse(source, preamble_len=0, single_node=False)
-  search_nodes = []
-  for node in all_nodes:
-    # Also include nodes without a line number, for safety. This is defensive -
-    # we don't know whether such nodes might exist, and if they do, whether
-    # they are not safe to skip.
-    # TODO(mdan): Replace this check with an assertion or skip such nodes.
-    if getattr(node, 'lineno', def_line) <= def_line:
-      search_nodes.append(node)
-    else:
-      # Found a node starting past our lambda - can stop the search.
-      break
+  if _HAS_CODE_POSITIONS:
+    result = _parse_lambda_by_positions(lam, lines)
+    if result is not None:
+      return result
+
+  return _parse_lambda_by_index(lam, f, lines)
+
+
+def _parse_lambda_by_index(lam, f, lines):
+  """Finds a lambda among all the lambdas of its module, see _LambdaIndex.
+
+  Args:
+    lam: types.LambdaType
+    f: Text, the source file of lam.
+    lines: List[Text], the lines of f.
+
+  Returns:
+    ast.AST, Text: the same as _parse_lambda.
+  """
+  def_line = lam.__code__.co_firstlineno
+  index = _lambda_index(f, lines)
 
-  # Extract all lambda nodes from the shortlist.
-  lambda_nodes = []
-  for node in search_nodes:
-    lambda_nodes.extend(
-        n for n in ast.walk(node) if isinstance(n, ast.Lambda))
-
-  # Filter down to lambda nodes which span our actual lambda.
-  candidates = []
-  for ln in lambda_nodes:
-    minl, maxl = MAX_SIZE, 0
-    for n in ast.walk(ln):
-      minl = min(minl, getattr(n, 'lineno', minl))
-      lineno = getattr(n, 'lineno', maxl)
-      end_lineno = getattr(n, 'end_lineno', None)
-      if end_lineno is not None:
-        # end_lineno is more precise, but lineno should almost always work too.
-        lineno = end_lineno
-      maxl = max(maxl, lineno)
-    if minl <= def_line <= maxl:
-      candidates.append((ln, minl, maxl))
+  # Filter down to lambda nodes which span our actual lambda. The nodes are
+  # shared by all the lambdas of the module, and _without_context modifies them.
+  candidates = [(copy.deepcopy(ln), minl, maxl)
+                for ln, minl, maxl in index.spanning(def_line)]
 
   # Happy path: exactly one node found.
   if len(candidates) == 1:
@@ -277,7 +613,8 @@ def _parse_lambda(lam):
     return _without_context(node, lines, minl, maxl)
 
   elif not candidates:
-    lambda_codes = '\n'.join([unparse(l) for l in lambda_nodes])
+    lambda_codes = '\n'.join(
+        [unparse(l) for l, minl, _ in index.entries if minl <= def_line])
     raise errors.UnsupportedLanguageElementError(
         f'could not parse the source code of {lam}:'
         f' no matching AST found among candidates:\n{lambda_codes}')
@@ -15,9 +15,14 @@
 # ==============================================================================
 """Generic source code transformation infrastructure."""
 
+import collections
+import contextlib
 import inspect
+import marshal
+import sys
 import threading
 import types
+import weakref
 
 import ast
 
@@ -30,6 +35,7 @@ from malt.pyct import parser
 from malt.pyct import templates
 from malt.pyct import transformer
 from malt.utils import ag_logging as logging
+from malt.utils import stats
 
 
 def _wrap_into_factory(nodes, entity_name, inner_factory_name,
@@ -138,6 +144,54 @@ def _wrap_into_factory(nodes, entity_name, inner_factory_name,
       outer_factory_name=outer_factory_name)
 
 
+class _PersistedFactory(
+    collections.namedtuple(
+        '_PersistedFactory',
+        ('name', 'outer_factory_name', 'source', 'code', 'source_map'))):
+  """Serializable form of a _PythonFnFactory.
+
+  Used to save transformed functions to the persistent cache (see
+  `PyToPy.set_persistent_cache`) and to transfer them between processes (see
+  `PyToPy.precompile`).
+
+  Attributes:
+    name: Text, the name of the generated function.
+    outer_factory_name: Text, the name of the outer factory in the generated
+      module.
+    source: Text, the generated source code.
+    code: bytes, the compiled generated module, in marshal format.
+    source_map: Tuple[Tuple[int, origin_info.OriginInfo], ...], the source
+      map, keyed by line number only since the name of the generated file is
+      different in each process.
+  """
+  pass
+
+
+def _source_map_to_json(source_map):
+  """Converts the source map of a _PersistedFactory to JSON-compatible lists."""
+  return [[
+      lineno,
+      list(origin.loc),
+      origin.function_name,
+      origin.source_code_line,
+      origin.comment,
+  ] for lineno, origin in source_map]
+
+
+def _source_map_from_json(rows, file_name):
+  """Inverse of _source_map_to_json, for a module loaded from file_name."""
+  return {
+      origin_info.LineLocation(file_name, lineno): origin_info.OriginInfo(
+          origin_info.Location(*loc), function_name, source_code_line, comment)
+      for lineno, loc, function_name, source_code_line, comment in rows
+  }
+
+
+# Maps source functions to their latest instance, see
+# _PythonFnFactory.instance.
+_instances = weakref.WeakKeyDictionary()
+
+
 class _PythonFnFactory(object):
   """Helper object that wraps a Python function factory."""
 
@@ -155,9 +209,20 @@ class _PythonFnFactory(object):
     self._extra_locals = extra_locals
 
     self._unbound_factory = None
+    self._outer_factory_name = None
     self.module = None
+    self.source = None
     self.source_map = None
 
+  def _wrap(self, nodes, namer, inner_factory_name, outer_factory_name,
+            future_features):
+    inner_factory_name = namer.new_symbol(inner_factory_name, ())
+    outer_factory_name = namer.new_symbol(outer_factory_name, ())
+    nodes = _wrap_into_factory(nodes, self._name, inner_factory_name,
+                               outer_factory_name, self._freevars,
+                               self._extra_locals.keys(), future_features)
+    return nodes, outer_factory_name
+
   def create(self,
              nodes,
              namer,
@@ -168,19 +233,131 @@ class _PythonFnFactory(object):
     if self._unbound_factory is not None:
       raise ValueError('double initialization; create a new object instead')
 
-    inner_factory_name = namer.new_symbol(inner_factory_name, ())
-    outer_factory_name = namer.new_symbol(outer_factory_name, ())
-    nodes = _wrap_into_factory(nodes, self._name, inner_factory_name,
-                               outer_factory_name, self._freevars,
-                               self._extra_locals.keys(), future_features)
+    nodes, outer_factory_name = self._wrap(
+        nodes, namer, inner_factory_name, outer_factory_name, future_features)
+
+    module, source, source_map = loader.load_ast(
+        nodes, include_source_map=True, in_memory=True)
+    self._bind(module, outer_factory_name, source, source_map)
+
+  def generate(self,
+               nodes,
+               namer,
+               inner_factory_name='inner_factory',
+               outer_factory_name='outer_factory',
+               future_features=()):
+    """Like `create`, but returns the generated code instead of loading it.
+
+    The result can be loaded by `restore`, possibly in a different process.
+
+    Args:
+      nodes: Same as for `create`.
+      namer: Same as for `create`.
+      inner_factory_name: Same as for `create`.
+      outer_factory_name: Same as for `create`.
+      future_features: Same as for `create`.
+
+    Returns:
+      _PersistedFactory
+    """
+    nodes, outer_factory_name = self._wrap(
+        nodes, namer, inner_factory_name, outer_factory_name, future_features)
+    if not isinstance(nodes, (list, tuple)):
+      nodes = (nodes,)
+
+    # The actual file name is only known at load time; see restore.
+    file_name = '<{}>'.format(self._name)
+    with stats.stage('unparse'):
+      source = parser.unparse(nodes)
+    with stats.stage('compile'):
+      code = compile(source, file_name, 'exec', dont_inherit=True)
+    with stats.stage('source_map'):
+      source_map = origin_info.create_source_map(nodes, source, file_name)
+    return _PersistedFactory(
+        name=self._name,
+        outer_factory_name=outer_factory_name,
+        source=source,
+        code=marshal.dumps(code),
+        source_map=tuple(
+            (loc.lineno, origin) for loc, origin in source_map.items()))
+
+  def load_file(self, file_name, module_name, outer_factory_name, source_map):
+    """Initializes a function from a module generated ahead of time.
+
+    Args:
+      file_name: Text, the source file of the module.
+      module_name: Text, the name of the module.
+      outer_factory_name: Text, the name of the outer factory in the module.
+      source_map: The source map, as returned by `_source_map_to_json`.
+    """
+    if self._unbound_factory is not None:
+      raise ValueError('double initialization; create a new object instead')
 
-    module, _, source_map = loader.load_ast(
-        nodes, include_source_map=True)
+    module = loader.load_file(file_name, module_name)
+    # The source code is not loaded; tools read it from the file as needed.
+    self._bind(module, outer_factory_name, None,
+               _source_map_from_json(source_map, module.__file__))
+
+  def _bind(self, module, outer_factory_name, source, source_map):
     outer_factory = getattr(module, outer_factory_name)
     self._unbound_factory = outer_factory()
+    self._outer_factory_name = outer_factory_name
     self.module = module
+    self.source = source
     self.source_map = source_map
 
+  @property
+  def nbytes(self):
+    """Estimates the memory held by the generated module, in bytes.
+
+    This accounts for the generated source code, which is held by both this
+    object and `linecache`, and for the source map.
+    """
+    if self._unbound_factory is None:
+      return 0
+    size = 0
+    if self.source is not None:
+      size += 2 * sys.getsizeof(self.source)
+    for origin in self.source_map.values():
+      size += sys.getsizeof(origin) + sys.getsizeof(origin.source_code_line)
+    return size
+
+  def unload(self):
+    """Releases the global references to the generated module."""
+    if self.module is not None:
+      loader.unload(self.module)
+
+  def persist(self):
+    """Returns a _PersistedFactory that can recreate this factory."""
+    if self._unbound_factory is None:
+      raise ValueError('call create first')
+    code = compile(self.source, self.module.__file__, 'exec', dont_inherit=True)
+    source_map = tuple(
+        (loc.lineno, origin) for loc, origin in self.source_map.items())
+    return _PersistedFactory(
+        name=self._name,
+        outer_factory_name=self._outer_factory_name,
+        source=self.source,
+        code=marshal.dumps(code),
+        source_map=source_map)
+
+  def restore(self, persisted):
+    """Initializes a function from the output of `persist`."""
+    if self._unbound_factory is not None:
+      raise ValueError('double initialization; create a new object instead')
+
+    module, file_name = loader.load_code(
+        marshal.loads(persisted.code),
+        persisted.source,
+        delete_on_exit=True,
+        in_memory=True)
+    source_map = {
+        origin_info.LineLocation(file_name, lineno): origin
+        for lineno, origin in persisted.source_map
+    }
+    self._bind(module, persisted.outer_factory_name, persisted.source,
+               source_map)
+
   def instantiate(self,
                   globals_,
                   closure,
@@ -217,6 +394,44 @@ class _PythonFnFactory(object):
 
     return new_fn
 
+  def instance(self, fn):
+    """Returns a function instance equivalent to `fn`, reusing it if possible.
+
+    The instance is reused for as long as `fn` keeps the same globals, closure
+    and defaults. Instances share that state with `fn`, so they are only kept
+    if it can't refer back to `fn`, see inspect_utils.isselfcontained.
+
+    Args:
+      fn: The function from which this factory was created, or a function with
+        the same code.
+
+    Returns:
+      Tuple[Callable, bool], the instance and whether it was reused.
+    """
+    owner = getattr(fn, '__func__', fn)
+    globals_ = fn.__globals__
+    closure = fn.__closure__ or ()
+    defaults = fn.__defaults__
+    kwdefaults = getattr(fn, '__kwdefaults__', None)
+
+    cached = _instances.get(owner)
+    if (cached is not None and cached[0]() is self and
+        cached[1] is globals_ and cached[2] is closure and
+        cached[3] is defaults and cached[4] is kwdefaults):
+      return cached[5], True
+
+    new_fn = self.instantiate(
+        globals_=globals_,
+        closure=closure,
+        defaults=defaults,
+        kwdefaults=kwdefaults)
+    if inspect_utils.isselfcontained(owner):
+      # The factory is referenced weakly, so that evicting it from the cache
+      # releases it.
+      _instances[owner] = (weakref.ref(self), globals_, closure, defaults,
+                           kwdefaults, new_fn)
+    return new_fn, False
+
 
 class GenericTranspiler(object):
   """A generic transpiler for Python functions.
@@ -336,25 +551,29 @@ class GenericTranspiler(object):
       together with a `transformer.Context` containing information about the
       transformation process.
     """
-    future_features = inspect_utils.getfutureimports(fn)
-    node, source = parser.parse_entity(fn, future_features=future_features)
-    logging.log(3, 'Source code of %s:\n\n%s\n', fn, source)
-
-    origin_info.resolve_entity(node, source, fn)
-
-    namespace = inspect_utils.getnamespace(fn)
-    namer = naming.Namer(namespace)
-    new_name = namer.new_symbol(self.get_transformed_name(node), ())
-    entity_info = transformer.EntityInfo(
-        name=new_name,
-        source_code=source,
-        source_file='<fragment>',
-        future_features=future_features,
-        namespace=namespace)
-    context = transformer.Context(entity_info, namer, user_context)
-
-    node = self._erase_arg_defaults(node)
-    result = self.transform_ast(node, context)
+    with stats.function(fn):
+      future_features = inspect_utils.getfutureimports(fn)
+      node, source_info = parser.parse_entity_source(
+          fn, future_features=future_features)
+      source = source_info.source
+      logging.log(3, 'Source code of %s:\n\n%s\n', fn, source)
+
+      with stats.stage('origin_info'):
+        origin_info.resolve_source_info(node, source_info)
+
+      namespace = inspect_utils.getnamespace(fn)
+      namer = naming.Namer(namespace)
+      new_name = namer.new_symbol(self.get_transformed_name(node), ())
+      entity_info = transformer.EntityInfo(
+          name=new_name,
+          source_code=source,
+          source_file='<fragment>',
+          future_features=source_info.future_features,
+          namespace=namespace)
+      context = transformer.Context(entity_info, namer, user_context)
+
+      node = self._erase_arg_defaults(node)
+      result = self.transform_ast(node, context)
 
     return result, context
 
@@ -390,8 +609,70 @@ class PyToPy(GenericTranspiler):
   """
 
   def __init__(self):
-    self._cache_lock = threading.RLock()
-    self._cache = cache.CodeObjectCache()
+    # Conversions are serialized per (code object, caching key), see
+    # _conversion_lock.
+    self._conversion_locks_lock = threading.Lock()
+    self._conversion_locks = {}
+    self._conversion_state = threading.local()
+    self._cache = cache.CodeObjectCache(
+        sizeof=lambda factory: factory.nbytes,
+        on_evict=lambda factory: factory.unload())
+    self._persistent_cache = None
+    self._aot_store = None
+
+  def set_cache_limits(self, max_entries=None, max_bytes=None,
+                       policy=cache.EvictionPolicy.LRU):
+    """Bounds the in-memory cache of transformed functions.
+
+    By default, transformed functions are cached for as long as the code of
+    the original function is alive. Evicted functions are transformed again if
+    needed, and their generated modules are unloaded.
+
+    Args:
+      max_entries: Optional[int], the maximum number of cached functions, each
+        caching key counting separately.
+      max_bytes: Optional[int], the maximum memory held by the cache, as
+        estimated from the generated code and source maps.
+      policy: cache.EvictionPolicy, selects the entries to evict first.
+    """
+    self._cache.set_limits(
+        max_entries=max_entries, max_bytes=max_bytes, policy=policy)
+
+  def set_persistent_cache(self, directory):
+    """Enables an on-disk cache of transformed code, shared across processes.
+
+    When enabled, functions missing from the in-memory cache are first looked
+    up in the given directory, which lets a new process skip parsing and
+    transforming code that a previous process already transformed. Entries are
+    keyed by the function's source code and location, its future imports, the
+    names visible in its namespace and `get_persistent_caching_key`.
+
+    Args:
+      directory: Optional[Text], the cache directory, which is created if
+        missing. None disables the on-disk cache.
+    """
+    if directory is None:
+      self._persistent_cache = None
+    else:
+      self._persistent_cache = cache.PersistentCache(directory)
+
+  def set_aot_directory(self, directory):
+    """Enables loading functions transformed ahead of time.
+
+    When enabled, functions missing from the in-memory cache are first looked
+    up in the given directory, which is typically generated by `malt.aot`.
+    Lookups are keyed by the function's module, qualified name, a fingerprint
+    of its code object and `get_persistent_caching_key`, so they don't require
+    reading or parsing the source code of the function.
+
+    Args:
+      directory: Optional[Text], the directory holding the generated modules.
+        None disables the lookup.
+    """
+    if directory is None:
+      self._aot_store = None
+    else:
+      self._aot_store = cache.GeneratedModuleStore(directory)
 
   def get_extra_locals(self):
     """Returns extra static local variables to be made to transformed code.
@@ -404,6 +685,24 @@ class PyToPy(GenericTranspiler):
     """
     raise NotImplementedError('subclasses must override this')
 
+  def get_extra_definitions(self, node, ctx):
+    """Returns extra statements to precede the transformed code.
+
+    The statements run each time a function is instantiated from the
+    transformed code, in the scope of the factory that creates it, and the
+    symbols they define are visible to the transformed code as closure
+    variables. Subclasses may override this.
+
+    Args:
+      node: ast.AST, the output of `transform_ast`.
+      ctx: transformer.Context.
+
+    Returns:
+      List[ast.AST], the statements.
+    """
+    del node, ctx
+    return []
+
   def get_caching_key(self, user_context):
     """Returns a unique key to use for caching.
 
@@ -421,12 +720,321 @@ class PyToPy(GenericTranspiler):
     """
     raise NotImplementedError('subclasses must override this')
 
+  def get_persistent_caching_key(self, user_context):
+    """Returns a key to use for caching across processes.
+
+    Subclasses may override this to enable the on-disk cache, see
+    `set_persistent_cache`. Unlike `get_caching_key`, the result must be
+    stable across processes, so its `repr` should only depend on its value.
+    It should also change whenever the transformation logic does, for example
+    by including the version of the transformer.
+
+    Args:
+      user_context: The context object which was passed to `transform`.
+
+    Returns:
+      Any, or None if the result of the transformation should not be persisted.
+    """
+    del user_context
+    return None
+
+  def _persistent_cache_key(self, fn, user_context):
+    """Returns the on-disk cache key for fn, or None if it can't be cached."""
+    subkey = self.get_persistent_caching_key(user_context)
+    if subkey is None:
+      return None
+    try:
+      source = inspect_utils.getimmediatesource(fn)
+    except (OSError, TypeError):
+      return None
+    code = fn.__code__
+    # The generated names avoid collisions with the names in the namespace,
+    # so these may alter the generated code.
+    namespace_names = sorted(fn.__globals__) + sorted(code.co_freevars)
+    return self._persistent_cache.digest((
+        type(self).__module__,
+        type(self).__qualname__,
+        repr(subkey),
+        sys.version,
+        code.co_filename,
+        code.co_firstlineno,
+        inspect_utils.getfutureimports(fn),
+        '\n'.join(namespace_names),
+        source,
+    ))
+
+  def aot_key(self, fn, user_context):
+    """Returns the key of fn in ahead of time stores, or None.
+
+    See `set_aot_directory`.
+
+    Args:
+      fn: A function or lambda.
+      user_context: The context object which would be passed to `transform`.
+
+    Returns:
+      Optional[Text], None if the transformation of fn can't be stored.
+    """
+    subkey = self.get_persistent_caching_key(user_context)
+    if subkey is None:
+      return None
+    return cache.digest((
+        type(self).__module__,
+        type(self).__qualname__,
+        repr(subkey),
+        sys.version_info[:2],
+        fn.__module__,
+        fn.__qualname__,
+        cache.code_fingerprint(fn.__code__),
+    ))
+
+  def store_precompiled(self, store, fn, user_context, precompiled):
+    """Adds the output of `precompile` to an ahead of time store.
+
+    Args:
+      store: cache.GeneratedModuleStore, the store to add to.
+      fn: The function that was passed to `precompile`.
+      user_context: The context object which was passed to `precompile`.
+      precompiled: The output of `precompile`.
+
+    Returns:
+      bool, whether the function was added.
+    """
+    key = self.aot_key(fn, user_context)
+    if key is None:
+      return False
+    store.put(
+        key,
+        precompiled.source,
+        _source_map_to_json(precompiled.source_map),
+        function='{}.{}'.format(fn.__module__, fn.__qualname__),
+        name=precompiled.name,
+        outer_factory_name=precompiled.outer_factory_name)
+    return True
+
+  def _aot_factory(self, fn, user_context):
+    key = self.aot_key(fn, user_context)
+    if key is None:
+      return None
+    try:
+      entry = self._aot_store.get(key)
+      if entry is None:
+        return None
+      factory = _PythonFnFactory(
+          entry['name'], fn.__code__.co_freevars, self.get_extra_locals())
+      factory.load_file(
+          self._aot_store.module_path(key), entry['module'],
+          entry['outer_factory_name'], entry['source_map'])
+    except Exception:  # pylint:disable=broad-except
+      logging.log(1, 'Could not load %s from %s', fn, self._aot_store.directory,
+                  exc_info=True)
+      return None
+    logging.log(3, 'Ahead of time hit for %s: %s', fn, key)
+    return factory
+
+  def _restored_factory(self, fn, persistent_key):
+    persisted = self._persistent_cache.get(persistent_key)
+    if persisted is None:
+      return None
+    factory = _PythonFnFactory(
+        persisted.name, fn.__code__.co_freevars, self.get_extra_locals())
+    try:
+      factory.restore(persisted)
+    except Exception:  # pylint:disable=broad-except
+      logging.log(1, 'Could not restore %s from the persistent cache', fn,
+                  exc_info=True)
+      return None
+    logging.log(3, 'Persistent cache hit for %s: %s', fn, persistent_key)
+    return factory
+
+  @contextlib.contextmanager
+  def _conversion_lock(self, fn, cache_subkey):
+    """Serializes the conversions of a function for a given caching key.
+
+    This gives single-flight semantics: the first thread to convert a function
+    does so, while other threads requesting the same conversion wait for its
+    result. Conversions of different functions proceed concurrently.
+
+    Threads which are already converting a function (for example, because
+    `transform_ast` triggers the conversion of other functions) never wait.
+    If the lock is taken, they convert the function again instead. This
+    avoids deadlocks between threads converting functions which depend on
+    each other, at the expense of duplicate work.
+
+    Args:
+      fn: The function to convert.
+      cache_subkey: The caching key, see `get_caching_key`.
+
+    Yields:
+      None.
+    """
+    lock_key = (fn.__code__, cache_subkey)
+    with self._conversion_locks_lock:
+      entry = self._conversion_locks.get(lock_key)
+      if entry is None:
+        entry = self._conversion_locks[lock_key] = [threading.RLock(), 0]
+      entry[1] += 1
+
+    state = self._conversion_state
+    depth = getattr(state, 'depth', 0)
+    lock = entry[0]
+    acquired = lock.acquire(blocking=not depth)
+    state.depth = depth + 1
+    try:
+      yield
+    finally:
+      state.depth = depth
+      if acquired:
+        lock.release()
+      with self._conversion_locks_lock:
+        entry[1] -= 1
+        if not entry[1]:
+          del self._conversion_locks[lock_key]
+
   def _cached_factory(self, fn, cache_subkey):
-    cached_factory = self._cache[fn][cache_subkey]
-    logging.log(3, 'Cache hit for %s subkey %s: %s', fn, cache_subkey,
-                cached_factory)
+    # Note: the cache may evict entries concurrently, so has() followed by a
+    # lookup would be racy.
+    cached_factory = self._cache.get(fn, cache_subkey)
+    if cached_factory is not None:
+      if logging.enabled:
+        logging.log(3, 'Cache hit for %s subkey %s: %s', fn, cache_subkey,
+                    cached_factory)
     return cached_factory
 
+  def _transform_to_nodes(self, fn, user_context):
+    """Transforms a function, returning the AST of the generated definition."""
+    # TODO(mdan): Confusing overloading pattern. Fix.
+    nodes, ctx = super(PyToPy, self).transform_function(fn, user_context)
+    definitions = self.get_extra_definitions(nodes, ctx)
+
+    if isinstance(nodes, ast.Lambda):
+      nodes = ast.Assign(
+          targets=[
+              ast.Name(
+                  ctx.info.name,
+                  ctx=ast.Store())
+          ],
+          value=nodes)
+    else:
+      nodes.name = ctx.info.name
+
+    if definitions:
+      nodes = definitions + [nodes]
+
+    if logging.has_verbosity(2):
+      logging.log(2, 'Transformed %s:\n\n%s\n', fn, parser.unparse(nodes))
+
+    return nodes, ctx
+
+  def _create_factory(self, fn, user_context):
+    """Transforms a function and loads the result into a new factory."""
+    with stats.function(fn):
+      nodes, ctx = self._transform_to_nodes(fn, user_context)
+      factory = _PythonFnFactory(
+          ctx.info.name, fn.__code__.co_freevars, self.get_extra_locals())
+      factory.create(
+          nodes, ctx.namer, future_features=ctx.info.future_features)
+    return factory
+
+  def precompile(self, fn, user_context):
+    """Transforms a function without loading the generated code.
+
+    This is useful to parallelize transformations across processes: the
+    result is picklable, and can be passed to `load_precompiled` in the
+    process that calls the function.
+
+    Args:
+      fn: A function or lambda.
+      user_context: An opaque object (may be None) that is forwarded to
+        transform_ast, through the ctx.user attribute.
+
+    Returns:
+      An opaque, picklable object.
+    """
+    with stats.function(fn):
+      nodes, ctx = self._transform_to_nodes(fn, user_context)
+      factory = _PythonFnFactory(
+          ctx.info.name, fn.__code__.co_freevars, self.get_extra_locals())
+      return factory.generate(
+          nodes, ctx.namer, future_features=ctx.info.future_features)
+
+  def load_precompiled(self, fn, user_context, precompiled):
+    """Caches the output of `precompile`, as if fn had been transformed.
+
+    Args:
+      fn: The function that was passed to `precompile`.
+      user_context: The context object which was passed to `precompile`.
+      precompiled: The output of `precompile`.
+    """
+    cache_subkey = self.get_caching_key(user_context)
+    with self._conversion_lock(fn, cache_subkey):
+      if self._cached_factory(fn, cache_subkey) is not None:
+        return
+      factory = _PythonFnFactory(
+          precompiled.name, fn.__code__.co_freevars, self.get_extra_locals())
+      factory.restore(precompiled)
+      if self._persistent_cache is not None:
+        persistent_key = self._persistent_cache_key(fn, user_context)
+        if persistent_key is not None:
+          self._persistent_cache.put(persistent_key, precompiled)
+      self._cache[fn][cache_subkey] = factory
+
+  def load_cached(self, fn, user_context):
+    """Loads the transformation of a function from the caches, if available.
+
+    Unlike `transform`, this does not transform the function on cache misses.
+
+    Args:
+      fn: A function or lambda.
+      user_context: The context object which would be passed to `transform`.
+
+    Returns:
+      bool, whether the transformation of fn is now in the in-memory cache.
+    """
+    cache_subkey = self.get_caching_key(user_context)
+    if self._cached_factory(fn, cache_subkey) is not None:
+      return True
+    if self._aot_store is None and self._persistent_cache is None:
+      return False
+    with self._conversion_lock(fn, cache_subkey):
+      if self._cached_factory(fn, cache_subkey) is not None:
+        return True
+      factory, _ = self._stored_factory(fn, user_context)
+      if factory is None:
+        return False
+      self._cache[fn][cache_subkey] = factory
+      return True
+
+  def _stored_factory(self, fn, user_context):
+    """Loads a factory from the ahead of time store or the persistent cache.
+
+    Args:
+      fn: A function or lambda.
+      user_context: The context object which was passed to `transform`.
+
+    Returns:
+      Tuple[Optional[_PythonFnFactory], Optional[Text]], the factory, if found,
+      and the persistent cache key of fn, if the persistent cache is enabled.
+    """
+    if self._aot_store is not None:
+      factory = self._aot_factory(fn, user_context)
+      if factory is not None:
+        stats.hit('aot')
+        return factory, None
+      stats.miss('aot')
+
+    if self._persistent_cache is None:
+      return None, None
+    persistent_key = self._persistent_cache_key(fn, user_context)
+    if persistent_key is None:
+      return None, None
+    factory = self._restored_factory(fn, persistent_key)
+    if factory is None:
+      stats.miss('persistent')
+    else:
+      stats.hit('persistent')
+    return factory, persistent_key
+
   def transform_function(self, fn, user_context):
     """Transforms a function. See GenericTranspiler.trasnform_function.
 
@@ -448,44 +1056,31 @@ class PyToPy(GenericTranspiler):
     """
     cache_subkey = self.get_caching_key(user_context)
 
-    if self._cache.has(fn, cache_subkey):
-      # Fast path: use a lock-free check.
-      factory = self._cached_factory(fn, cache_subkey)
+    # Fast path: use a lock-free check.
+    factory = self._cached_factory(fn, cache_subkey)
 
+    if factory is not None:
+      stats.hit('transpiler')
     else:
-      with self._cache_lock:
+      stats.miss('transpiler')
+      with self._conversion_lock(fn, cache_subkey):
         # Check again under lock.
-        if self._cache.has(fn, cache_subkey):
-          factory = self._cached_factory(fn, cache_subkey)
+        factory = self._cached_factory(fn, cache_subkey)
 
-        else:
+        if factory is None:
           logging.log(1, '%s is not cached for subkey %s', fn, cache_subkey)
-          # TODO(mdan): Confusing overloading pattern. Fix.
-          nodes, ctx = super(PyToPy, self).transform_function(fn, user_context)
-
-          if isinstance(nodes, ast.Lambda):
-            nodes = ast.Assign(
-                targets=[
-                    ast.Name(
-                        ctx.info.name,
-                        ctx=ast.Store())
-                ],
-                value=nodes)
-          else:
-            nodes.name = ctx.info.name
-
-          if logging.has_verbosity(2):
-            logging.log(2, 'Transformed %s:\n\n%s\n', fn, parser.unparse(nodes))
-
-          factory = _PythonFnFactory(
-              ctx.info.name, fn.__code__.co_freevars, self.get_extra_locals())
-          factory.create(
-              nodes, ctx.namer, future_features=ctx.info.future_features)
+          factory, persistent_key = self._stored_factory(fn, user_context)
+
+          if factory is None:
+            factory = self._create_factory(fn, user_context)
+            if persistent_key is not None:
+              self._persistent_cache.put(persistent_key, factory.persist())
+
           self._cache[fn][cache_subkey] = factory
 
-    transformed_fn = factory.instantiate(
-        globals_=fn.__globals__,
-        closure=fn.__closure__ or (),
-        defaults=fn.__defaults__,
-        kwdefaults=getattr(fn, '__kwdefaults__', None))
+    transformed_fn, reused = factory.instance(fn)
+    if reused:
+      stats.hit('instance')
+    else:
+      stats.miss('instance')
     return transformed_fn, factory.module, factory.source_map
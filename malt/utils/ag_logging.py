@@ -28,6 +28,16 @@ DEFAULT_VERBOSITY = 0
 verbosity_level = None  # vlog-like. Takes precedence over the env variable.
 echo_log_to_stdout = False
 
+# The effective verbosity, cached because it is checked on hot paths. Updated
+# by set_verbosity and refresh_verbosity.
+verbosity = DEFAULT_VERBOSITY
+# Whether any logging is enabled. Log statements on hot paths check this flag
+# first, to skip the call altogether:
+#
+#   if ag_logging.enabled:
+#     ag_logging.log(2, 'Allowlisted %s', f)
+enabled = False
+
 # In interactive Python, logging echo is enabled by default.
 if hasattr(sys, 'ps1') or hasattr(sys, 'ps2'):
   echo_log_to_stdout = True
@@ -47,7 +57,8 @@ def set_verbosity(level, alsologtostdout=False):
 
    * The `AUTOGRAPH_VERBOSITY` environment variable
 
-  `set_verbosity` takes precedence over the environment variable.
+  `set_verbosity` takes precedence over the environment variable. The
+  environment variable is read on import, and again by `refresh_verbosity`.
 
   For example:
 
@@ -56,12 +67,14 @@ def set_verbosity(level, alsologtostdout=False):
   import tensorflow as tf
 
   os.environ['AUTOGRAPH_VERBOSITY'] = '5'
+  refresh_verbosity()
   # Verbosity is now 5
 
   malt.set_verbosity(0)
   # Verbosity is now 0
 
   os.environ['AUTOGRAPH_VERBOSITY'] = '1'
+  refresh_verbosity()
   # No effect, because set_verbosity was already called.
   ```
 
@@ -81,6 +94,18 @@ def set_verbosity(level, alsologtostdout=False):
   global echo_log_to_stdout
   verbosity_level = level
   echo_log_to_stdout = alsologtostdout
+  refresh_verbosity()
+
+
+def refresh_verbosity():
+  """Updates the cached verbosity, e.g. after changing `AUTOGRAPH_VERBOSITY`."""
+  global verbosity
+  global enabled
+  if verbosity_level is not None:
+    verbosity = verbosity_level
+  else:
+    verbosity = int(os.getenv(VERBOSITY_VAR_NAME, DEFAULT_VERBOSITY))
+  enabled = verbosity > 0
 
 
 def trace(*args):
@@ -106,14 +131,11 @@ def trace(*args):
 
 
 def get_verbosity():
-  global verbosity_level
-  if verbosity_level is not None:
-    return verbosity_level
-  return int(os.getenv(VERBOSITY_VAR_NAME, DEFAULT_VERBOSITY))
+  return verbosity
 
 
 def has_verbosity(level):
-  return get_verbosity() >= level
+  return verbosity >= level
 
 
 def _output_to_stdout(msg, *args, **kwargs):
@@ -123,14 +145,14 @@ def _output_to_stdout(msg, *args, **kwargs):
 
 
 def error(level, msg, *args, **kwargs):
-  if has_verbosity(level):
+  if verbosity >= level:
     logging.error(msg, *args, **kwargs)
     if echo_log_to_stdout:
       _output_to_stdout('ERROR: ' + msg, *args, **kwargs)
 
 
 def log(level, msg, *args, **kwargs):
-  if has_verbosity(level):
+  if verbosity >= level:
     logging.info(msg, *args, **kwargs)
     if echo_log_to_stdout:
       _output_to_stdout(msg, *args, **kwargs)
@@ -141,3 +163,6 @@ def warning(msg, *args, **kwargs):
   if echo_log_to_stdout:
     _output_to_stdout('WARNING: ' + msg, *args, **kwargs)
     sys.stdout.flush()
+
+
+refresh_verbosity()
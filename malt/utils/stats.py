@@ -0,0 +1,193 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Conversion timing and cache statistics.
+
+Conversion code is instrumented with `stage` and `function` blocks, and cache
+lookups with `hit` and `miss`. Stage times are exclusive: the time spent in a
+nested stage is only attributed to the innermost one. When tracing is enabled,
+stages and functions are also recorded as trace spans, see `tracing`.
+"""
+
+import contextlib
+import threading
+import time
+
+from malt.utils import tracing
+
+_lock = threading.Lock()
+_state = threading.local()
+
+# Stage name -> [calls, seconds]
+_stages = {}
+# Cache name -> [hits, misses]
+_caches = {}
+# Function name -> _FunctionStats
+_functions = {}
+
+
+class _FunctionStats(object):
+
+  __slots__ = ('conversions', 'seconds', 'stages')
+
+  def __init__(self):
+    self.conversions = 0
+    self.seconds = 0.0
+    self.stages = {}
+
+
+def _function_name(fn):
+  return '{}.{}'.format(
+      getattr(fn, '__module__', None),
+      getattr(fn, '__qualname__', getattr(fn, '__name__', fn)))
+
+
+def _stack():
+  stack = getattr(_state, 'stack', None)
+  if stack is None:
+    stack = _state.stack = []
+  return stack
+
+
+def _functions_stack():
+  stack = getattr(_state, 'functions', None)
+  if stack is None:
+    stack = _state.functions = []
+  return stack
+
+
+@contextlib.contextmanager
+def function(fn):
+  """Attributes the stages that run inside the block to the conversion of fn.
+
+  Nested blocks for the same function are ignored.
+
+  Args:
+    fn: The function being converted.
+
+  Yields:
+    None.
+  """
+  functions = _functions_stack()
+  if functions and functions[-1] is fn:
+    yield
+    return
+
+  functions.append(fn)
+  start = time.perf_counter()
+  try:
+    yield
+  finally:
+    elapsed = time.perf_counter() - start
+    functions.pop()
+    name = _function_name(fn)
+    if tracing.enabled:
+      tracing.complete('convert ' + name, 'conversion', start * 1e6,
+                       elapsed * 1e6)
+    with _lock:
+      record = _functions.get(name)
+      if record is None:
+        record = _functions[name] = _FunctionStats()
+      record.conversions += 1
+      record.seconds += elapsed
+
+
+@contextlib.contextmanager
+def stage(name):
+  """Measures the time spent in a block, as a named conversion stage.
+
+  Args:
+    name: Text, the stage name.
+
+  Yields:
+    None.
+  """
+  stack = _stack()
+  # Each frame holds the time spent in nested stages.
+  frame = [0.0]
+  stack.append(frame)
+  start = time.perf_counter()
+  try:
+    yield
+  finally:
+    elapsed = time.perf_counter() - start
+    stack.pop()
+    if stack:
+      stack[-1][0] += elapsed
+    exclusive = elapsed - frame[0]
+    if tracing.enabled:
+      tracing.complete(name, 'conversion_stage', start * 1e6, elapsed * 1e6)
+
+    functions = _functions_stack()
+    fn_name = _function_name(functions[-1]) if functions else None
+    with _lock:
+      totals = _stages.get(name)
+      if totals is None:
+        totals = _stages[name] = [0, 0.0]
+      totals[0] += 1
+      totals[1] += exclusive
+      if fn_name is not None:
+        record = _functions.get(fn_name)
+        if record is None:
+          record = _functions[fn_name] = _FunctionStats()
+        record.stages[name] = record.stages.get(name, 0.0) + exclusive
+
+
+def _cache_counts(cache_name):
+  counts = _caches.get(cache_name)
+  if counts is None:
+    counts = _caches.setdefault(cache_name, [0, 0])
+  return counts
+
+
+def hit(cache_name):
+  """Counts a cache hit."""
+  # Note: these counters are not locked, because they are updated on hot
+  # paths. Concurrent updates may rarely be lost.
+  _cache_counts(cache_name)[0] += 1
+
+
+def miss(cache_name):
+  """Counts a cache miss."""
+  _cache_counts(cache_name)[1] += 1
+
+
+def snapshot():
+  """Returns a copy of the statistics. See `malt.stats`."""
+  with _lock:
+    return {
+        'stages': {
+            name: {'calls': calls, 'seconds': seconds}
+            for name, (calls, seconds) in _stages.items()
+        },
+        'caches': {
+            name: {'hits': hits, 'misses': misses}
+            for name, (hits, misses) in _caches.items()
+        },
+        'functions': {
+            name: {
+                'conversions': record.conversions,
+                'seconds': record.seconds,
+                'stages': dict(record.stages),
+            } for name, record in _functions.items()
+        },
+    }
+
+
+def reset():
+  """Clears all statistics."""
+  with _lock:
+    _stages.clear()
+    _caches.clear()
+    _functions.clear()
@@ -0,0 +1,165 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Timeline tracing, in the Chrome trace event format.
+
+The output can be loaded in https://ui.perfetto.dev or chrome://tracing.
+
+Tracing is disabled by default. Instrumented code checks the `enabled` flag
+before doing any work, so the cost of disabled tracing is a global lookup.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+
+TRACE_FILE_VAR_NAME = 'AUTOGRAPH_TRACE_FILE'
+
+enabled = False
+
+_events = []
+_state = threading.local()
+
+
+def _now_us():
+  return time.perf_counter() * 1e6
+
+
+def _open_spans():
+  spans = getattr(_state, 'spans', None)
+  if spans is None:
+    spans = _state.spans = []
+  return spans
+
+
+class _Span(object):
+  """Context manager which records a span, if tracing is enabled."""
+
+  __slots__ = ('name', 'cat', 'args', '_start')
+
+  def __init__(self, name, cat, args=None):
+    self.name = name
+    self.cat = cat
+    self.args = args if args is not None else {}
+    self._start = None
+
+  def __enter__(self):
+    if enabled:
+      _open_spans().append(self)
+      self._start = _now_us()
+    return self
+
+  def __exit__(self, exc_type, exc_value, tb):
+    if self._start is None:
+      return
+    spans = _open_spans()
+    if spans and spans[-1] is self:
+      spans.pop()
+    if exc_type is not None:
+      self.args['error'] = exc_type.__name__
+    complete(self.name, self.cat, self._start, _now_us() - self._start,
+             self.args)
+
+
+def span(name, cat, args=None):
+  """Returns a context manager which records a span, if tracing is enabled.
+
+  Args:
+    name: Text, the span name.
+    cat: Text, the span category.
+    args: Optional[Dict[Text, Any]], additional information displayed with the
+      span. See also `annotate`.
+
+  Returns:
+    A context manager.
+  """
+  return _Span(name, cat, args)
+
+
+def annotate(**kwargs):
+  """Adds information to the innermost open span of the current thread."""
+  spans = _open_spans()
+  if spans:
+    spans[-1].args.update(kwargs)
+
+
+def complete(name, cat, start_us, duration_us, args=None):
+  """Records a span that already ended, if tracing is enabled.
+
+  Args:
+    name: Text, the span name.
+    cat: Text, the span category.
+    start_us: float, the start time, in microseconds, as measured by
+      `time.perf_counter`.
+    duration_us: float, the duration, in microseconds.
+    args: Optional[Dict[Text, Any]], additional information.
+  """
+  if not enabled:
+    return
+  event = {
+      'name': name,
+      'cat': cat,
+      'ph': 'X',
+      'ts': start_us,
+      'dur': duration_us,
+      'pid': os.getpid(),
+      'tid': threading.get_ident(),
+  }
+  if args:
+    event['args'] = {k: str(v) for k, v in args.items()}
+  # list.append is atomic.
+  _events.append(event)
+
+
+def start():
+  """Starts recording, discarding previously recorded events."""
+  global enabled
+  del _events[:]
+  enabled = True
+
+
+def stop():
+  """Stops recording.
+
+  Returns:
+    List[Dict[Text, Any]], the recorded events.
+  """
+  global enabled
+  enabled = False
+  return list(_events)
+
+
+def write(path, events=None):
+  """Writes events to a file in the Chrome trace JSON format.
+
+  Args:
+    path: Text, the output file.
+    events: Optional[List[Dict[Text, Any]]], the events to write. Defaults to
+      the events recorded so far.
+  """
+  if events is None:
+    events = list(_events)
+  with open(path, 'w', encoding='utf-8') as f:
+    json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def _write_on_exit(path):
+  write(path, stop())
+
+
+if os.environ.get(TRACE_FILE_VAR_NAME):
+  start()
+  atexit.register(_write_on_exit, os.environ[TRACE_FILE_VAR_NAME])
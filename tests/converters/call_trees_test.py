@@ -15,9 +15,11 @@
 """Tests for call_trees module."""
 
 import imp
+import math
 
 from malt.converters import call_trees
 from malt.converters import functions
+from malt.pyct import parser
 from ..core import converter_testing
 from tensorflow.python.platform import test
 
@@ -225,6 +227,54 @@ class CallTreesTest(converter_testing.TestCase):
     tr()
     self.assertListEqual(tracking_list, [1])
 
+  def test_direct_calls(self):
+
+    def g(a):
+      return a + 300
+
+    converter_testing.allowlist(g)
+
+    def h(a):
+      return a + 4000
+
+    def f(a):
+      return abs(a) + math.floor(20.5) + g(a) + h(a)
+
+    tr, mock = self._transform_with_mock(f)
+
+    self.assertEqual(tr(-1), 4319)
+    # Builtins and allowlisted functions are called directly.
+    self.assertListEqual(mock.calls, [((-1,), None)])
+
+  def test_direct_calls_not_used_for_local_names(self):
+
+    def f(a):
+      abs = lambda x: x  # pylint:disable=redefined-builtin
+      return abs(a)
+
+    tr, mock = self._transform_with_mock(f)
+
+    self.assertEqual(tr(-1), -1)
+    self.assertListEqual(mock.calls, [((-1,), None)])
+
+  def test_call_site_caches(self):
+
+    def f(g, a):
+      return g(a) + g(a)
+
+    mock = MockConvertedCall()
+    tr, node, _ = self.transform(
+        f, (functions, call_trees),
+        include_ast=True,
+        ag_overrides={'converted_call': mock})
+
+    self.assertEqual(tr(lambda x: x + 1, 1), 4)
+    # Calls which miss their site go through converted_call.
+    self.assertListEqual(mock.calls, [((1,), None), ((1,), None)])
+    source = parser.unparse(node)
+    self.assertIn('ag__call_site.converted_call(', source)
+    self.assertIn('ag__call_site_1.converted_call(', source)
+
   def test_class_method(self):
 
     class TestClass(object):
@@ -0,0 +1,91 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for config_lib module."""
+
+import types
+
+from malt.core import config_lib
+from tensorflow.python.platform import test
+
+
+def _module(name):
+  return types.ModuleType(name)
+
+
+class RuleIndexTest(test.TestCase):
+
+  def assertAction(self, index, module_name, expected_action):
+    action, _ = index.get_action(_module(module_name))
+    self.assertEqual(action, expected_action)
+
+  def test_first_matching_rule_wins(self):
+    rules = (
+        config_lib.Convert('a.b.c'),
+        config_lib.DoNotConvert('a'),
+        config_lib.Convert('a.b'),
+    )
+    index = config_lib.RuleIndex(rules)
+
+    self.assertAction(index, 'a', config_lib.Action.DO_NOT_CONVERT)
+    self.assertAction(index, 'a.b', config_lib.Action.DO_NOT_CONVERT)
+    self.assertAction(index, 'a.b.c', config_lib.Action.CONVERT)
+    self.assertAction(index, 'a.b.c.d', config_lib.Action.CONVERT)
+    self.assertAction(index, 'ab', config_lib.Action.NONE)
+    self.assertAction(index, 'b', config_lib.Action.NONE)
+
+  def test_returns_matching_rule(self):
+    rule = config_lib.DoNotConvert('a.b')
+    index = config_lib.RuleIndex((rule,))
+
+    self.assertEqual(index.get_action(_module('a.b.c')),
+                     (config_lib.Action.DO_NOT_CONVERT, rule))
+    self.assertEqual(index.get_action(_module('a')),
+                     (config_lib.Action.NONE, None))
+
+  def test_matches_linear_scan(self):
+    rules = (
+        config_lib.DoNotConvert('x.y'),
+        config_lib.Convert('x'),
+        config_lib.DoNotConvert('x.y.z'),
+        config_lib.Convert('w.v'),
+    )
+    index = config_lib.RuleIndex(rules)
+
+    for name in ('x', 'x.y', 'x.y.z', 'x.yz', 'w', 'w.v.u', 'v'):
+      expected = config_lib.Action.NONE
+      for rule in rules:
+        expected = rule.get_action(_module(name))
+        if expected != config_lib.Action.NONE:
+          break
+      self.assertAction(index, name, expected)
+
+  def test_custom_rules(self):
+
+    class DoNotConvertPrivate(config_lib.Rule):
+
+      action = config_lib.Action.DO_NOT_CONVERT
+
+      def matches(self, module_name):
+        return module_name.split('.')[-1].startswith('_')
+
+    index = config_lib.RuleIndex(
+        (DoNotConvertPrivate(None), config_lib.Convert('a')))
+
+    self.assertAction(index, 'a._b', config_lib.Action.DO_NOT_CONVERT)
+    self.assertAction(index, 'a.b', config_lib.Action.CONVERT)
+
+
+if __name__ == '__main__':
+  test.main()
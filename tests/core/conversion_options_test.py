@@ -0,0 +1,52 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the interning of converter.ConversionOptions."""
+
+import copy
+import pickle
+
+from malt.core import converter
+from tensorflow.python.platform import test
+
+
+class ConversionOptionsInterningTest(test.TestCase):
+
+  def test_interning(self):
+    opts = converter.ConversionOptions(
+        recursive=True, optional_features=converter.Feature.LISTS)
+
+    self.assertIs(
+        opts,
+        converter.ConversionOptions(
+            recursive=True, optional_features=(converter.Feature.LISTS,)))
+    self.assertIs(
+        opts,
+        converter.ConversionOptions(
+            recursive=True, optional_features=[converter.Feature.LISTS]))
+    self.assertIsNot(opts, converter.ConversionOptions(recursive=True))
+    self.assertIs(opts.call_options(), opts.call_options())
+    self.assertIs(copy.deepcopy(opts), opts)
+    self.assertIs(pickle.loads(pickle.dumps(opts)), opts)
+
+  def test_immutable(self):
+    opts = converter.ConversionOptions()
+
+    with self.assertRaises(AttributeError):
+      opts.recursive = True
+    self.assertFalse(opts.recursive)
+
+
+if __name__ == '__main__':
+  test.main()
@@ -1,3 +1,4 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
 # Copyright 2017 The TensorFlow Authors. All Rights Reserved.
 #
 # Licensed under the Apache License, Version 2.0 (the "License");
@@ -45,7 +46,9 @@ def is_inside_generated_code():
   try:
     frame = frame.f_back
 
-    internal_stack_functions = ('converted_call', '_call_unconverted')
+    internal_stack_functions = ('converted_call', '_converted_call',
+                                '_call_converted', '_call_unconverted',
+                                '_indirect_call', 'dispatch')
     # Walk up the stack until we're out of the internal functions.
     while (frame is not None and
            frame.f_code.co_name in internal_stack_functions):
@@ -58,7 +61,7 @@ def is_inside_generated_code():
     del frame
 
 
-class TestingTranspiler(api.PyToTF):
+class TestingTranspiler(api.PyToPy):
   """Testing version that only applies given transformations."""
 
   def __init__(self, converters, ag_overrides):
@@ -113,8 +116,13 @@ class TestCase(test.TestCase):
 
   def transform(
       self, f, converter_module, include_ast=False, ag_overrides=None):
+    # Name scopes and automatic control dependencies are not supported.
     program_ctx = converter.ProgramContext(
-        options=converter.ConversionOptions(recursive=True),
+        options=converter.ConversionOptions(
+            recursive=True,
+            optional_features=converter.Feature.all_but(
+                (converter.Feature.NAME_SCOPES,
+                 converter.Feature.AUTO_CONTROL_DEPS))),
         autograph_module=api)
 
     tr = TestingTranspiler(converter_module, ag_overrides)
@@ -22,6 +22,7 @@ import gc
 import imp
 import inspect
 import io
+import math
 import os
 import re
 import sys
@@ -31,6 +32,7 @@ import types
 import numpy as np
 
 from malt.core import ag_ctx
+from malt.core import config
 from malt.core import converter
 from ..core import converter_testing
 from malt.impl import api
@@ -58,6 +60,12 @@ global_n = 2
 DEFAULT_RECURSIVE = converter.ConversionOptions(recursive=True)
 
 
+def precompile_test_fn(x):
+  while x > 0:
+    x -= 1
+  return x
+
+
 class TestResource:
 
   def __init__(self):
@@ -920,6 +928,21 @@ class ApiTest(test.TestCase):
     # No new entries should appear in the allowlist cache.
     self.assertEqual(len(conversion._ALLOWLIST_CACHE), cache_size_before + 1)
 
+  def test_register_conversion_rules(self):
+
+    def test_fn(x):
+      return x - 1
+
+    rules = config.CONVERSION_RULES
+    try:
+      api.register_conversion_rules(config.DoNotConvert(__name__))
+      self.assertTrue(conversion.is_allowlisted(test_fn))
+
+      api.register_conversion_rules(config.Convert(__name__))
+      self.assertFalse(conversion.is_allowlisted(test_fn))
+    finally:
+      config.CONVERSION_RULES = rules
+
   def test_context_tracking_direct_calls(self):
 
     @api.do_not_convert()
@@ -1112,6 +1135,73 @@ class ApiTest(test.TestCase):
     with self.assertRaisesRegex(Exception, 'try passing.*python_function'):
       api.to_code(test_fn)
 
+  def test_precompile(self):
+
+    def local_fn(x):
+      return x + 1 if x > 0 else x
+
+    program_ctx = converter.ProgramContext(options=DEFAULT_RECURSIVE)
+    api.precompile([precompile_test_fn, local_fn],
+                   options=DEFAULT_RECURSIVE,
+                   workers=2)
+
+    self.assertTrue(api._TRANSPILER.load_cached(precompile_test_fn,
+                                                program_ctx))
+    self.assertTrue(api._TRANSPILER.load_cached(local_fn, program_ctx))
+    self.assertEqual(api.converted_call(precompile_test_fn, (3,), None,
+                                        options=DEFAULT_RECURSIVE), 0)
+
+  def test_compile_ahead_of_time(self):
+    directory = self.get_temp_dir()
+    count, errors = api.compile_ahead_of_time([precompile_test_fn],
+                                              directory,
+                                              workers=1)
+    # One module for to_graph, and one for recursive calls.
+    self.assertEqual(count, 2)
+    self.assertEmpty(errors)
+
+  def test_stats(self):
+
+    def test_fn(x):
+      while x > 0:
+        x -= 1
+      return x
+
+    api.reset_stats()
+    converted_fn = api.to_graph(test_fn)
+    self.assertEqual(converted_fn(3), 0)
+    api.to_graph(test_fn)
+
+    s = api.stats()
+    self.assertIn('parse', s['stages'])
+    self.assertIn('converters.control_flow', s['stages'])
+    self.assertEqual(s['caches']['transpiler'], {'hits': 1, 'misses': 1})
+    record = s['functions'][__name__ + '.' + test_fn.__qualname__]
+    self.assertEqual(record['conversions'], 1)
+    self.assertIn('converters.control_flow', record['stages'])
+
+  def test_trace(self):
+
+    def g(x):
+      return x + 1
+
+    def f(x):
+      return g(x)
+
+    converted_fn = api.to_graph(f)
+    api.start_trace()
+    converted_fn(1)
+    converted_fn(1)
+    events = api.stop_trace()
+
+    calls = [e for e in events if e['cat'] == 'converted_call']
+    self.assertLen(calls, 2)
+    self.assertEqual(calls[0]['args'], {'decision': 'convert'})
+    conversions = [e for e in events if e['cat'] == 'conversion']
+    self.assertLen(conversions, 1)
+    # The conversion of g is nested inside the first call.
+    self.assertGreaterEqual(conversions[0]['ts'], calls[0]['ts'])
+
   def test_tf_convert_overrides_current_context(self):
 
     def f(expect_converted):
@@ -0,0 +1,170 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the caches of the conversion module."""
+
+import collections
+import imp
+import sys
+
+from malt.core import config
+from malt.core import converter
+from malt.impl import conversion
+from tensorflow.python.platform import test
+
+
+class ConversionCacheTest(test.TestCase):
+
+  def test_is_unsupported_permanently_allowed_module(self):
+
+    def test_fn():
+      pass
+
+    self.assertTrue(conversion.is_unsupported(collections.namedtuple))
+    self.assertFalse(conversion.is_unsupported(test_fn))
+
+    allowed_mod = imp.new_module('test_permanently_allowed')
+    sys.modules['test_permanently_allowed'] = allowed_mod
+    with test.mock.patch.object(
+        config, 'PERMANENTLY_ALLOWED_MODULES', ('test_permanently_allowed',)):
+      self.assertFalse(conversion.is_unsupported(test_fn))
+      # Members added after the first check are also found.
+      allowed_mod.test_fn = test_fn
+      self.assertTrue(conversion.is_unsupported(test_fn))
+
+  def test_is_unsupported_permanently_allowed_module_rebound(self):
+
+    def test_fn():
+      pass
+
+    allowed_mod = imp.new_module('test_permanently_allowed_rebound')
+    allowed_mod.test_fn = lambda: None
+    replaced_fn = allowed_mod.test_fn
+    sys.modules['test_permanently_allowed_rebound'] = allowed_mod
+    with test.mock.patch.object(
+        config, 'PERMANENTLY_ALLOWED_MODULES',
+        ('test_permanently_allowed_rebound',)):
+      self.assertTrue(conversion.is_unsupported(replaced_fn))
+      self.assertFalse(conversion.is_unsupported(test_fn))
+      # Rebinding a member leaves the size of the namespace unchanged.
+      allowed_mod.test_fn = test_fn
+      self.assertTrue(conversion.is_unsupported(test_fn))
+      self.assertFalse(conversion.is_unsupported(replaced_fn))
+
+  def test_allowlist_cache_unhashable_and_non_weakrefable(self):
+
+    class SlotsCallable(object):
+      __slots__ = ()
+
+      def __call__(self):
+        pass
+
+    class UnhashableCallable(object):
+      __hash__ = None
+
+      def __call__(self):
+        pass
+
+    options = converter.ConversionOptions(recursive=True)
+    for entity in (SlotsCallable(), UnhashableCallable()):
+      self.assertFalse(conversion.is_in_allowlist_cache(entity, options))
+      conversion.cache_allowlisted(entity, options)
+      self.assertTrue(conversion.is_in_allowlist_cache(entity, options))
+      self.assertFalse(
+          conversion.is_in_allowlist_cache(type(entity)(), options))
+
+    conversion.clear_allowlist_cache()
+    self.assertFalse(conversion.is_in_allowlist_cache(entity, options))
+
+  def test_is_allowlisted_owner_memoized(self):
+
+    allowlisted_mod = imp.new_module('test_allowlisted_owner')
+    sys.modules['test_allowlisted_owner'] = allowlisted_mod
+
+    class TestClass:
+
+      def test_method(self):
+        pass
+
+    TestClass.__module__ = 'test_allowlisted_owner'
+
+    class Subclass(TestClass):
+      pass
+
+    tc = Subclass()
+
+    self.assertFalse(conversion.is_allowlisted(tc.test_method))
+    # Replacing the rules invalidates the memoized verdict.
+    with test.mock.patch.object(
+        config, 'CONVERSION_RULES',
+        (config.DoNotConvert('test_allowlisted_owner'),) +
+        config.CONVERSION_RULES):
+      self.assertTrue(conversion.is_allowlisted(tc.test_method))
+
+      # So does overriding the method.
+      def test_method(self):
+        del self
+
+      Subclass.test_method = test_method
+      self.assertFalse(conversion.is_allowlisted(tc.test_method))
+
+  def test_is_allowlisted_owner_superclass_changes(self):
+
+    allowlisted_mod = imp.new_module('test_allowlisted_superclass')
+    sys.modules['test_allowlisted_superclass'] = allowlisted_mod
+
+    class A:
+
+      def test_method(self):
+        pass
+
+    class B(A):
+      pass
+
+    class C(B):
+      pass
+
+    class D:
+
+      def test_method(self):
+        pass
+
+    D.__module__ = 'test_allowlisted_superclass'
+
+    tc = C()
+
+    with test.mock.patch.object(
+        config, 'CONVERSION_RULES',
+        (config.DoNotConvert('test_allowlisted_superclass'),) +
+        config.CONVERSION_RULES):
+      self.assertFalse(conversion.is_allowlisted(tc.test_method))
+      # Changing the module of the defining class invalidates the verdict.
+      A.__module__ = 'test_allowlisted_superclass'
+      self.assertTrue(conversion.is_allowlisted(tc.test_method))
+      A.__module__ = __name__
+      self.assertFalse(conversion.is_allowlisted(tc.test_method))
+
+      # So do changes to the bases of intermediate classes.
+      class E(A):
+        pass
+
+      B.__bases__ = (E,)
+      self.assertFalse(conversion.is_allowlisted(tc.test_method))
+      D.test_method = A.test_method
+      E.__bases__ = (D,)
+      self.assertTrue(conversion.is_allowlisted(tc.test_method))
+
+
+if __name__ == '__main__':
+  test.main()
@@ -0,0 +1,236 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the dispatch decisions of api.converted_call."""
+
+import gc
+import inspect
+import math
+import types
+import weakref
+
+from malt.core import config
+from malt.core import converter
+from malt.impl import api
+from malt.impl import conversion
+from tensorflow.python.platform import test
+
+DEFAULT_RECURSIVE = converter.ConversionOptions(
+    recursive=True, optional_features=None)
+
+
+class DispatchCacheTest(test.TestCase):
+
+  def test_converted_call_caches_dispatch_decision(self):
+
+    class TestClass:
+
+      def test_method(self, x):
+        return x + 1
+
+    def test_fn(x):
+      return x - 1
+
+    tc = TestClass()
+    self.assertEqual(
+        api.converted_call(test_fn, (1,), None, options=DEFAULT_RECURSIVE), 0)
+    self.assertEqual(
+        api.converted_call(
+            tc.test_method, (1,), None, options=DEFAULT_RECURSIVE), 2)
+
+    with test.mock.patch.object(
+        conversion, 'is_allowlisted',
+        side_effect=AssertionError('decision not cached')):
+      self.assertEqual(
+          api.converted_call(test_fn, (2,), None, options=DEFAULT_RECURSIVE),
+          1)
+      # The decision is shared by all instances.
+      self.assertEqual(
+          api.converted_call(
+              TestClass().test_method, (2,), None, options=DEFAULT_RECURSIVE),
+          3)
+
+  def test_converted_call_dispatch_decision_invalidation(self):
+
+    def test_fn(x):
+      return x - 1
+
+    def other_fn(x):
+      return x + 1
+
+    self.assertEqual(
+        api.converted_call(test_fn, (1,), None, options=DEFAULT_RECURSIVE), 0)
+
+    test_fn.__code__ = other_fn.__code__
+    self.assertEqual(
+        api.converted_call(test_fn, (1,), None, options=DEFAULT_RECURSIVE), 2)
+
+    rules = config.CONVERSION_RULES
+    config.CONVERSION_RULES = (config.DoNotConvert(__name__),) + rules
+    try:
+      with test.mock.patch.object(api, '_convert_actual') as convert_mock:
+        self.assertEqual(
+            api.converted_call(test_fn, (1,), None, options=DEFAULT_RECURSIVE),
+            2)
+        convert_mock.assert_not_called()
+    finally:
+      config.CONVERSION_RULES = rules
+
+  def test_converted_call_dispatch_decision_releases_callables(self):
+
+    def make_class():
+
+      class BaseClass:
+
+        def test_method(self, x):
+          return x
+
+      class TestClass(BaseClass):
+
+        def test_method(self, x):
+          return super().test_method(x) + 1
+
+      return TestClass
+
+    def make_recursive_fns():
+
+      def test_fn(n):
+        return n if n <= 0 else other_fn(n - 1)
+
+      def other_fn(n):
+        return test_fn(n)
+
+      return test_fn
+
+    def convert_twice():
+      test_class = make_class()
+      test_fn = make_recursive_fns()
+      for _ in range(2):
+        self.assertEqual(
+            api.converted_call(
+                test_class().test_method, (1,), None,
+                options=DEFAULT_RECURSIVE), 2)
+        self.assertEqual(
+            api.converted_call(test_fn, (3,), None, options=DEFAULT_RECURSIVE),
+            0)
+      return weakref.ref(test_class), weakref.ref(test_fn)
+
+    # The converted functions refer to the callables through their closures,
+    # so the cache must not keep them.
+    test_class_ref, test_fn_ref = convert_twice()
+    gc.collect()
+    self.assertIsNone(test_class_ref())
+    self.assertIsNone(test_fn_ref())
+
+  def test_direct_calls_are_checked_at_runtime(self):
+
+    mod = types.ModuleType('test_direct_calls')
+    mod.floor = math.floor
+
+    def test_fn(x):
+      return mod.floor(x)
+
+    converted_fn = api.to_graph(
+        test_fn,
+        experimental_optional_features=converter.Feature.DIRECT_CALLS)
+    self.assertIn('ag__.direct_callee(', inspect.getsource(converted_fn))
+    # The first call finds the overload of the builtin.
+    self.assertEqual(converted_fn(1.5), 1)
+    with test.mock.patch.object(
+        api, 'converted_call', wraps=api.converted_call) as converted_call:
+      self.assertEqual(converted_fn(1.5), 1)
+      converted_call.assert_not_called()
+
+      def user_floor(x):
+        return x - 0.5
+
+      mod.floor = user_floor
+      self.assertEqual(converted_fn(1.5), 1)
+      converted_call.assert_called_once()
+
+  def test_direct_calls_keyword_arguments(self):
+
+    mod = types.ModuleType('test_direct_calls')
+    mod.floor = math.floor
+
+    def test_fn(x):
+      return mod.floor(x, f=1, caller_fn_scope=2)
+
+    converted_fn = api.to_graph(
+        test_fn,
+        experimental_optional_features=converter.Feature.DIRECT_CALLS)
+
+    # The keyword arguments must not clash with those of direct_callee.
+    def user_floor(x, f=0, caller_fn_scope=0):
+      return x + f + caller_fn_scope
+
+    mod.floor = user_floor
+    self.assertEqual(converted_fn(1), 4)
+
+  def _call_site_stats(self, callee):
+    sites = api.stats()['call_sites']
+    (label,) = [l for l in sites if l.startswith(callee + ' at ')]
+    return sites[label]
+
+  def test_call_site_caches(self):
+
+    def site_callee(x):
+      return x + 1
+
+    def test_fn(x):
+      return site_callee(x)
+
+    converted_fn = api.to_graph(
+        test_fn,
+        experimental_optional_features=converter.Feature.CALL_SITE_CACHES)
+    api.reset_stats()
+    for x in range(3):
+      self.assertEqual(converted_fn(x), x + 1)
+
+    s = self._call_site_stats('site_callee')
+    self.assertEqual(s['state'], api.CallSite.MONOMORPHIC)
+    # The first call converts site_callee, the second one fills the site.
+    self.assertEqual(s['hits'], 1)
+    self.assertEqual(s['misses'], 2)
+
+    # Like converted_call, the site notices changes to its callee.
+    site_callee.__code__ = (lambda x: x - 1).__code__
+    self.assertEqual(converted_fn(1), 0)
+
+  def test_call_site_caches_megamorphic(self):
+
+    def test_fn(polymorphic_callee, x):
+      return polymorphic_callee(x)
+
+    converted_fn = api.to_graph(
+        test_fn,
+        experimental_optional_features=converter.Feature.CALL_SITE_CACHES)
+    callees = [
+        lambda x, i=i: x + i
+        for i in range(api.CallSite.MAX_POLYMORPHIC_CALLEES + 1)
+    ]
+    for _ in range(2):
+      for f in callees[:2]:
+        converted_fn(f, 1)
+    self.assertEqual(self._call_site_stats('polymorphic_callee')['state'],
+                     api.CallSite.POLYMORPHIC)
+
+    for _ in range(2):
+      for i, f in enumerate(callees):
+        self.assertEqual(converted_fn(f, 1), i + 1)
+    self.assertEqual(self._call_site_stats('polymorphic_callee')['state'],
+                     api.CallSite.MEGAMORPHIC)
+
+if __name__ == '__main__':
+  test.main()
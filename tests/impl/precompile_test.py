@@ -0,0 +1,58 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the precompilation of the api module."""
+
+from malt.core import converter
+from malt.impl import api
+from malt.pyct import cache
+from tensorflow.python.platform import test
+
+DEFAULT_RECURSIVE = converter.ConversionOptions(
+    recursive=True, optional_features=None)
+
+
+def precompile_test_fn(x):
+  return abs(x) + 1
+
+
+class PrecompileTest(test.TestCase):
+
+  def test_precompile_in_worker(self):
+    code = precompile_test_fn.__code__
+    precompiled = api._precompile_in_worker(
+        __name__, 'precompile_test_fn', cache.code_fingerprint(code),
+        DEFAULT_RECURSIVE)
+    self.assertIsNotNone(precompiled)
+
+  def test_precompile_in_worker_changed_source(self):
+    code = precompile_test_fn.__code__
+    # Versions of the source code which only differ in their constants or
+    # names compile to the same bytecode.
+    changed_codes = (
+        code.replace(co_consts=tuple(
+            2 if c == 1 else c for c in code.co_consts)),
+        code.replace(co_names=tuple(
+            'max' if n == 'abs' else n for n in code.co_names)),
+    )
+    for changed_code in changed_codes:
+      self.assertEqual(changed_code.co_code, code.co_code)
+      self.assertIsNone(
+          api._precompile_in_worker(
+              __name__, 'precompile_test_fn',
+              cache.code_fingerprint(changed_code), DEFAULT_RECURSIVE))
+
+
+if __name__ == '__main__':
+  test.main()
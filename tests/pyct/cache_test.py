@@ -14,6 +14,8 @@
 # ==============================================================================
 """Tests for cache module."""
 
+import os
+
 from malt.pyct import cache
 from tensorflow.python.platform import test
 
@@ -70,6 +72,164 @@ class CacheTest(test.TestCase):
     self.assertIs(c[o2.method][1], dummy)
     self.assertEqual(len(c), 1)
 
+  def _functions(self, n):
+    # Distinct code objects are distinct keys in a CodeObjectCache.
+    fns = []
+    for i in range(n):
+      namespace = {}
+      exec('def f{}(): pass'.format(i), namespace)  # pylint:disable=exec-used
+      fns.append(namespace['f{}'.format(i)])
+    return fns
+
+  def test_bounded_lru(self):
+    evicted = []
+    c = cache.CodeObjectCache(on_evict=evicted.append)
+    c.set_limits(max_entries=2, policy=cache.EvictionPolicy.LRU)
+    f1, f2, f3 = self._functions(3)
+
+    c[f1][0] = 'v1'
+    c[f2][0] = 'v2'
+    self.assertTrue(c.has(f1, 0))  # f2 is now least recently used.
+    c[f3][0] = 'v3'
+
+    self.assertTrue(c.has(f1, 0))
+    self.assertFalse(c.has(f2, 0))
+    self.assertTrue(c.has(f3, 0))
+    self.assertEqual(evicted, ['v2'])
+    self.assertEqual(c.evictions, 1)
+    self.assertEqual(len(c), 2)
+
+  def test_bounded_lfu(self):
+    c = cache.CodeObjectCache()
+    c.set_limits(max_entries=2, policy=cache.EvictionPolicy.LFU)
+    f1, f2, f3 = self._functions(3)
+
+    c[f1][0] = 'v1'
+    c[f2][0] = 'v2'
+    c.has(f1, 0)
+    c.has(f1, 0)
+    c.has(f2, 0)
+    c[f3][0] = 'v3'
+
+    self.assertIsNone(c.get(f2, 0))
+    self.assertEqual(c.get(f1, 0), 'v1')
+    self.assertEqual(c.get(f3, 0), 'v3')
+
+  def test_bounded_by_size(self):
+    c = cache.CodeObjectCache(sizeof=len)
+    c.set_limits(max_bytes=10)
+    f1, f2 = self._functions(2)
+
+    c[f1][0] = 'a' * 6
+    c[f1][1] = 'b' * 3
+    self.assertEqual(c.evictions, 0)
+    c[f2][0] = 'c' * 6
+
+    self.assertFalse(c.has(f1, 0))
+    self.assertTrue(c.has(f1, 1))
+    self.assertTrue(c.has(f2, 0))
+    self.assertEqual(c.evictions, 1)
+
+  def test_set_limits_evicts_existing_entries(self):
+    c = cache.CodeObjectCache()
+    fns = self._functions(3)
+    for f in fns:
+      c[f][0] = f.__name__
+
+    c.set_limits(max_entries=1)
+
+    self.assertEqual(len(c), 1)
+    self.assertTrue(c.has(fns[-1], 0))
+    self.assertEqual(c.evictions, 2)
+
+  def test_bounded_forgets_collected_keys(self):
+    c = cache.CodeObjectCache()
+    c.set_limits(max_entries=1)
+    f1, = self._functions(1)
+
+    c[f1][0] = 'v1'
+    del f1
+    f2, = self._functions(1)
+    c[f2][0] = 'v2'
+
+    self.assertEqual(c.evictions, 0)
+    self.assertTrue(c.has(f2, 0))
+
+  def test_persistent_cache(self):
+    c = cache.PersistentCache(self.get_temp_dir())
+
+    key = c.digest(('a', 1))
+    self.assertNotEqual(key, c.digest(('a1',)))
+    self.assertIsNone(c.get(key))
+
+    c.put(key, {'value': (1, 'a')})
+    self.assertEqual(c.get(key), {'value': (1, 'a')})
+
+    other = cache.PersistentCache(c.directory)
+    self.assertEqual(other.get(key), {'value': (1, 'a')})
+
+  def test_persistent_cache_corrupted_entry(self):
+    c = cache.PersistentCache(self.get_temp_dir())
+
+    key = c.digest(('a',))
+    with open(os.path.join(c.directory, key + '.pkl'), 'wb') as f:
+      f.write(b'not a pickle')
+
+    self.assertIsNone(c.get(key))
+
+  def test_code_fingerprint(self):
+
+    def f(x):
+      return x + 1
+
+    def same_f(x):
+      return x + 1
+
+    def other_f(x):
+      return x + 2
+
+    self.assertEqual(
+        cache.code_fingerprint(f.__code__), cache.code_fingerprint(f.__code__))
+    # Line numbers are included.
+    self.assertNotEqual(
+        cache.code_fingerprint(f.__code__),
+        cache.code_fingerprint(same_f.__code__))
+    self.assertEqual(
+        cache.code_fingerprint(f.__code__),
+        cache.code_fingerprint(
+            same_f.__code__.replace(
+                co_name='f', co_firstlineno=f.__code__.co_firstlineno)))
+    self.assertNotEqual(
+        cache.code_fingerprint(f.__code__),
+        cache.code_fingerprint(
+            other_f.__code__.replace(
+                co_name='f', co_firstlineno=f.__code__.co_firstlineno)))
+
+  def test_code_fingerprint_ignores_file_name(self):
+
+    def f(x):
+      return x + 1
+
+    self.assertEqual(
+        cache.code_fingerprint(f.__code__),
+        cache.code_fingerprint(f.__code__.replace(co_filename='other.py')))
+
+  def test_generated_module_store(self):
+    directory = self.get_temp_dir()
+    store = cache.GeneratedModuleStore(directory)
+    store.put('a' * 64, 'x = 1\n', [[1, ['f.py', 2, 0], 'f', 'y', None]],
+              name='f')
+    self.assertLen(store, 1)
+    store.save()
+
+    store = cache.GeneratedModuleStore(directory)
+    self.assertIsNone(store.get('b' * 64))
+    entry = store.get('a' * 64)
+    self.assertEqual(entry['name'], 'f')
+    self.assertEqual(entry['source_map'], [[1, ['f.py', 2, 0], 'f', 'y', None]])
+    with open(store.module_path('a' * 64)) as f:
+      self.assertEqual(f.read(), 'x = 1\n')
+
 
 if __name__ == '__main__':
   test.main()
@@ -121,6 +121,41 @@ class ErrorMetadataBaseTest(test.TestCase):
                     r'"/path/three.py", line 171, in test_fn_3  \*\*.*'
                     r'Test message'), re.DOTALL))
 
+  def test_get_message_traceback_translated_lazily(self):
+
+    class TrackingSourceMap(dict):
+
+      def __init__(self):
+        super(TrackingSourceMap, self).__init__()
+        self.lookups = 0
+
+      def __contains__(self, key):
+        self.lookups += 1
+        return super(TrackingSourceMap, self).__contains__(key)
+
+    def test_fn():
+      raise ValueError()
+
+    try:
+      test_fn()
+    except ValueError as e:
+      callsite_tb = e.__traceback__
+
+    source_map = TrackingSourceMap()
+    em = error_utils.ErrorMetadataBase(
+        callsite_tb=callsite_tb,
+        cause_metadata=None,
+        cause_message='Test message',
+        source_map=source_map,
+        converter_filename=None)
+    self.assertEqual(source_map.lookups, 0)
+    self.assertRegex(
+        em.get_message(),
+        re.compile((r'in test_fn.*'
+                    r'raise ValueError\(\).*'
+                    r'Test message'), re.DOTALL))
+    self.assertEqual(source_map.lookups, 2)
+
 
 if __name__ == '__main__':
   test.main()
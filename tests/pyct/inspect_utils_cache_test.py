@@ -0,0 +1,82 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the index of loaded modules of the inspect_utils module."""
+
+import gc
+import imp
+import sys
+import weakref
+
+from malt.pyct import inspect_utils
+from tensorflow.python.platform import test
+
+
+class InspectUtilsCacheTest(test.TestCase):
+
+  def test_module_of_file(self):
+    self.assertIs(
+        inspect_utils._module_of_file(inspect_utils.__file__), inspect_utils)
+
+    test_mod = imp.new_module('test_module_of_file')
+    test_mod.__file__ = '/path/to/test_module_of_file.py'
+    with test.mock.patch.dict(sys.modules,
+                              {'test_module_of_file': test_mod}):
+      # Modules loaded after the index was built are also found.
+      self.assertIs(
+          inspect_utils._module_of_file(test_mod.__file__), test_mod)
+    self.assertIsNone(inspect_utils._module_of_file(test_mod.__file__))
+
+  def test_module_of_file_modules_replaced(self):
+    old_mod = imp.new_module('test_module_of_file_old')
+    old_mod.__file__ = '/path/to/test_module_of_file_old.py'
+    new_mod = imp.new_module('test_module_of_file_new')
+    new_mod.__file__ = '/path/to/test_module_of_file_new.py'
+
+    with test.mock.patch.dict(sys.modules,
+                              {'test_module_of_file_old': old_mod}):
+      self.assertIs(
+          inspect_utils._module_of_file(old_mod.__file__), old_mod)
+
+      # Unloading a module and loading another one leaves the number of
+      # loaded modules unchanged.
+      del sys.modules['test_module_of_file_old']
+      sys.modules['test_module_of_file_new'] = new_mod
+      self.assertIs(
+          inspect_utils._module_of_file(new_mod.__file__), new_mod)
+
+      # So does replacing a module.
+      sys.modules['test_module_of_file_new'] = old_mod
+      self.assertIs(
+          inspect_utils._module_of_file(old_mod.__file__), old_mod)
+      self.assertIsNone(inspect_utils._module_of_file(new_mod.__file__))
+
+  def test_module_of_file_releases_unloaded_modules(self):
+    test_mod = imp.new_module('test_module_of_file_unloaded')
+    test_mod.__file__ = '/path/to/test_module_of_file_unloaded.py'
+    mod_ref = weakref.ref(test_mod)
+
+    with test.mock.patch.dict(sys.modules,
+                              {'test_module_of_file_unloaded': test_mod}):
+      self.assertIs(
+          inspect_utils._module_of_file(test_mod.__file__), test_mod)
+    del test_mod
+    gc.collect()
+    self.assertIsNone(mod_ref())
+    self.assertIsNone(inspect_utils._module_of_file(
+        '/path/to/test_module_of_file_unloaded.py'))
+
+
+if __name__ == '__main__':
+  test.main()
@@ -15,6 +15,7 @@
 # ==============================================================================
 """Tests for loader module."""
 
+import linecache
 import os
 import textwrap
 
@@ -114,5 +115,55 @@ class LoaderTest(test.TestCase):
     # latter can deal with that situation.
     os.unlink(filename)
 
+  def test_load_source_in_memory(self):
+    test_source = textwrap.dedent(u"""
+      # coding=utf-8
+      def f(a):
+        return a + 1
+    """)
+    module, filename = loader.load_source(
+        test_source, delete_on_exit=True, in_memory=True)
+
+    self.assertEqual(module.f(1), 2)
+    self.assertEqual(module.__file__, filename)
+    self.assertFalse(os.path.exists(filename))
+    self.assertEqual(''.join(linecache.getlines(filename)), test_source)
+    self.assertEqual(
+        textwrap.dedent(tf_inspect.getsource(module.f)),
+        'def f(a):\n  return a + 1\n')
+
+  def test_load_ast_in_memory(self):
+    def test_fn(x):
+      return x + 1
+
+    node, _ = parser.parse_entity(test_fn, future_features=())
+    module, source, source_map = loader.load_ast(
+        node, include_source_map=True, in_memory=True)
+
+    self.assertEqual(module.test_fn(1), 2)
+    self.assertAstMatches(node, tf_inspect.getsource(module.test_fn))
+    self.assertAstMatches(node, source)
+    for loc in source_map:
+      self.assertEqual(loc.filename, module.__file__)
+
+  def test_load_source_in_memory_with_dump_dir(self):
+    dump_dir = self.get_temp_dir()
+    test_source = textwrap.dedent(u"""
+      def f(a):
+        return a + 1
+    """)
+    loader.set_dump_dir(dump_dir)
+    try:
+      module, filename = loader.load_source(
+          test_source, delete_on_exit=True, in_memory=True)
+    finally:
+      loader.set_dump_dir(None)
+
+    self.assertEqual(module.f(1), 2)
+    self.assertEqual(os.path.dirname(filename), dump_dir)
+    with open(filename, 'r') as f:
+      self.assertEqual(f.read(), test_source)
+
+
 if __name__ == '__main__':
   test.main()
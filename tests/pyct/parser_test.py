@@ -14,6 +14,9 @@
 # ==============================================================================
 """Tests for parser module."""
 
+import collections
+import inspect
+import linecache
 import re
 import textwrap
 
@@ -67,6 +70,47 @@ class ParserTest(test.TestCase):
     self.assertAstMatches(node, source)
     self.assertAstMatches(node, expected_node_src)
 
+  def test_parse_lambda_module_index_reused(self):
+
+    l = lambda x: x + 1
+    f = inspect.getsourcefile(l)
+    lines = linecache.getlines(f)
+
+    node, _ = parser._parse_lambda_by_index(l, f, lines)
+    index = parser._lambda_indexes[inspect.getsourcefile(l)]
+    other_node, source = parser._parse_lambda_by_index(l, f, lines)
+
+    self.assertIs(parser._lambda_indexes[inspect.getsourcefile(l)], index)
+    # Each lambda gets its own copy of the node.
+    self.assertIsNot(other_node, node)
+    self.assertEqual(other_node.lineno, node.lineno)
+    self.assertAstMatches(other_node, source)
+    self.assertAstMatches(other_node, 'lambda x: (x + 1)')
+
+  def test_parse_lambda_module_index_bounded(self):
+
+    def cache_source(filename, source):
+      lines = [source]
+      linecache.cache[filename] = (len(source), None, lines, filename)
+      return lines
+
+    with test.mock.patch.dict(linecache.cache), test.mock.patch.object(
+        parser, '_lambda_indexes', collections.OrderedDict()):
+      lines = cache_source('<stale>', 'f = lambda x: x\n')
+      parser._lambda_index('<stale>', lines)
+      self.assertIn('<stale>', parser._lambda_indexes)
+
+      # Indexes of replaced sources are dropped when other files are indexed.
+      cache_source('<stale>', 'f = lambda y: y\n')
+      for i in range(parser._LAMBDA_INDEXES_MAX_ENTRIES + 1):
+        filename = '<file_{}>'.format(i)
+        lines = cache_source(filename, 'f = lambda: 0\n')
+        parser._lambda_index(filename, lines)
+        self.assertNotIn('<stale>', parser._lambda_indexes)
+
+      self.assertLen(parser._lambda_indexes, parser._LAMBDA_INDEXES_MAX_ENTRIES)
+      self.assertNotIn('<file_0>', parser._lambda_indexes)
+
   def test_parse_lambda_resolution_by_location(self):
 
     _ = lambda x: x + 1
@@ -95,9 +139,31 @@ class ParserTest(test.TestCase):
     self.assertAstMatches(node, expected_node_src)
     self.assertEqual(source, 'lambda x, y: x + y')
 
+  def test_parse_lambda_resolution_by_positions(self):
+    if not parser._HAS_CODE_POSITIONS:
+      self.skipTest('code objects do not record column positions')
+
+    l = lambda x: lambda x: 2 * x
+
+    node, source = parser.parse_entity(l, future_features=())
+    self.assertAstMatches(node, 'lambda x: (lambda x: (2 * x))')
+    self.assertEqual(source, 'lambda x: lambda x: 2 * x')
+
+    node, source = parser.parse_entity(l(0), future_features=())
+    self.assertAstMatches(node, 'lambda x: (2 * x)')
+    self.assertEqual(source, 'lambda x: 2 * x')
+
+    # The source continues beyond the instructions, so the lambda is found
+    # by its signature instead.
+    l = lambda x: x if True else 3  # pylint:disable=using-constant-test
+    _, source = parser.parse_entity(l, future_features=())
+    self.assertEqual(source, 'lambda x: x if True else 3')
+
   def test_parse_lambda_resolution_ambiguous(self):
 
     l = lambda x: lambda x: 2 * x
+    f = inspect.getsourcefile(l)
+    lines = linecache.getlines(f)
 
     expected_exception_text = re.compile(r'found multiple definitions'
                                          r'.+'
@@ -108,12 +174,12 @@ class ParserTest(test.TestCase):
     with self.assertRaisesRegex(
         errors.UnsupportedLanguageElementError,
         expected_exception_text):
-      parser.parse_entity(l, future_features=())
+      parser._parse_lambda_by_index(l, f, lines)
 
     with self.assertRaisesRegex(
         errors.UnsupportedLanguageElementError,
         expected_exception_text):
-      parser.parse_entity(l(0), future_features=())
+      parser._parse_lambda_by_index(l(0), f, lines)
 
   def assertMatchesWithPotentialGarbage(self, source, expected, garbage):
     # In runtimes which don't track end_col_number, the source contains the
@@ -222,6 +288,26 @@ class ParserTest(test.TestCase):
     node, _ = parser.parse_entity(f, future_features=('print_function',))
     self.assertEqual('f', node.name)
 
+  def test_parse_entity_source(self):
+
+    def f(x):
+      # comment
+      return x + 1  # trailing comment
+
+    node, source_info = parser.parse_entity_source(
+        f, future_features=('print_function',))
+    self.assertEqual('f', node.name)
+
+    lines, lineno = inspect.getsourcelines(f)
+    self.assertEqual(source_info.source_file, inspect.getsourcefile(f))
+    self.assertEqual(source_info.lineno, lineno)
+    self.assertEqual(source_info.col_offset, lines[0].index('def'))
+    self.assertEqual(source_info.future_features, ('print_function',))
+    # The comments are numbered by their line in the parsed source, which
+    # starts with the future import.
+    self.assertEqual(source_info.comments,
+                     {3: 'comment', 4: 'trailing comment'})
+
   def test_parse_comments(self):
 
     def f():
@@ -14,10 +14,17 @@
 # ==============================================================================
 """Tests for transpiler module."""
 
+import functools
+import gc
+import os
+import pickle
+import sys
 import threading
+import weakref
 
 import ast
 
+from malt.pyct import cache
 from malt.pyct import transformer
 from malt.pyct import transpiler
 from tensorflow.python.platform import test
@@ -101,6 +108,71 @@ class PyToPyTest(test.TestCase):
     b = 1
     self.assertEqual(f(1), 1 - 2 - 1)
 
+  def test_instances_reused(self):
+
+    def make_f(b):
+      def f(a, c=1):
+        return a + b + c
+      return f
+
+    tr = TestTranspiler()
+    f1 = make_f(1)
+    tf1, _, _ = tr.transform(f1, None)
+    self.assertIs(tr.transform(f1, None)[0], tf1)
+
+    # Closures of the same function get their own instances.
+    tf2, _, _ = tr.transform(make_f(2), None)
+    self.assertIsNot(tf2, tf1)
+    self.assertEqual(tf1(1), 1 - 1 - 1)
+    self.assertEqual(tf2(1), 1 - 2 - 1)
+
+    # So do functions whose defaults changed.
+    f1.__defaults__ = (3,)
+    tf1_new, _, _ = tr.transform(f1, None)
+    self.assertIsNot(tf1_new, tf1)
+    self.assertEqual(tf1_new(1), 1 - 1 - 3)
+
+  def test_instances_not_visible(self):
+
+    def f(a):
+      return a + 1
+
+    tr = TestTranspiler()
+    tf, _, _ = tr.transform(f, None)
+    self.assertIs(tr.transform(f, None)[0], tf)
+    self.assertEqual(vars(f), {})
+
+    @functools.wraps(f)
+    def wrapper(a):
+      return f(a)
+
+    self.assertEqual(vars(wrapper), {'__wrapped__': f})
+
+  def test_instances_release_closures(self):
+
+    def make_class():
+
+      class TestClass:
+
+        def f(self, a):
+          super().__init__()
+          return a + 1
+
+      return TestClass
+
+    def transform():
+      test_class = make_class()
+      tr = TestTranspiler()
+      tr.transform(test_class.f, None)
+      tr.transform(test_class.f, None)
+      return weakref.ref(test_class)
+
+    # The instances share the __class__ cell of the method, so they must not
+    # be kept against it.
+    test_class_ref = transform()
+    gc.collect()
+    self.assertIsNone(test_class_ref())
+
   def test_call_tree(self):
 
     def g(a):
@@ -192,6 +264,87 @@ class PyToPyTest(test.TestCase):
     # (non-deterministically, but with high likelihood).
     self.assertEqual(len(set(outputs)), 1)
 
+  def test_concurrency_different_functions(self):
+
+    def f():
+      return 1 + 1
+
+    def g():
+      return 1 + 2
+
+    # Each conversion waits for the other one to start, which requires them to
+    # run concurrently.
+    barrier = threading.Barrier(2, timeout=10)
+
+    class BlockingTranspiler(TestTranspiler):
+
+      def transform_ast(self, node, ctx):
+        barrier.wait()
+        return super(BlockingTranspiler, self).transform_ast(node, ctx)
+
+    tr = BlockingTranspiler()
+    outputs = {}
+    errors = []
+
+    def conversion_thread(fn):
+      try:
+        new_fn, _, _ = tr.transform(fn, None)
+        outputs[fn.__name__] = new_fn()
+      except Exception as e:  # pylint:disable=broad-except
+        errors.append(e)
+
+    threads = tuple(
+        threading.Thread(target=conversion_thread, args=(fn,))
+        for fn in (f, g))
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+
+    self.assertEmpty(errors)
+    self.assertEqual(outputs, {'f': 0, 'g': -1})
+
+  def test_concurrency_single_flight(self):
+
+    def f():
+      pass
+
+    started = threading.Event()
+    release = threading.Event()
+
+    class CountingTranspiler(TestTranspiler):
+
+      def __init__(self):
+        super(CountingTranspiler, self).__init__()
+        self.transform_count = 0
+
+      def transform_ast(self, node, ctx):
+        self.transform_count += 1
+        started.set()
+        release.wait(10)
+        return super(CountingTranspiler, self).transform_ast(node, ctx)
+
+    tr = CountingTranspiler()
+    outputs = []
+
+    def conversion_thread():
+      new_f, _, _ = tr.transform(f, None)
+      outputs.append(new_f)
+
+    first = threading.Thread(target=conversion_thread)
+    first.start()
+    started.wait(10)
+    others = tuple(
+        threading.Thread(target=conversion_thread) for _ in range(5))
+    for t in others:
+      t.start()
+    release.set()
+    for t in (first,) + others:
+      t.join()
+
+    self.assertEqual(tr.transform_count, 1)
+    self.assertLen(outputs, 6)
+
   def test_reentrance(self):
 
     def test_fn():
@@ -235,6 +388,161 @@ class PyToPyTest(test.TestCase):
         obj.global_var_for_test_namespace_collisions, None)
     self.assertIs(f(obj), global_var_for_test_namespace_collisions)
 
+  def test_persistent_cache(self):
+
+    def f(a):
+      return a + 1
+
+    class CountingTranspiler(TestTranspiler):
+
+      def __init__(self):
+        super(CountingTranspiler, self).__init__()
+        self.transform_count = 0
+
+      def get_persistent_caching_key(self, ctx):
+        del ctx
+        return 0
+
+      def transform_ast(self, node, ctx):
+        self.transform_count += 1
+        return super(CountingTranspiler, self).transform_ast(node, ctx)
+
+    cache_dir = self.get_temp_dir()
+
+    tr = CountingTranspiler()
+    tr.set_persistent_cache(cache_dir)
+    new_f, _, source_map = tr.transform(f, None)
+    self.assertEqual(new_f(1), 0)
+    self.assertEqual(tr.transform_count, 1)
+
+    # A fresh transpiler has an empty in-memory cache.
+    tr = CountingTranspiler()
+    tr.set_persistent_cache(cache_dir)
+    new_f, module, restored_source_map = tr.transform(f, None)
+    self.assertEqual(new_f(1), 0)
+    self.assertEqual(tr.transform_count, 0)
+
+    self.assertEqual(
+        sorted(restored_source_map.values()), sorted(source_map.values()))
+    for loc in restored_source_map:
+      self.assertEqual(loc.filename, module.__file__)
+
+  def test_persistent_cache_disabled_by_default(self):
+
+    def f(a):
+      return a + 1
+
+    tr = TestTranspiler()
+    tr.set_persistent_cache(self.get_temp_dir())
+    new_f, _, _ = tr.transform(f, None)
+
+    self.assertEqual(new_f(1), 0)
+    self.assertEmpty(os.listdir(tr._persistent_cache.directory))
+
+  def test_cache_limits_unload_evicted_modules(self):
+
+    def f(a):
+      return a + 1
+
+    def g(a):
+      return a + 2
+
+    tr = TestTranspiler()
+    tr.set_cache_limits(max_entries=1)
+
+    _, f_module, _ = tr.transform(f, None)
+    self.assertIn(f_module.__name__, sys.modules)
+    new_g, _, _ = tr.transform(g, None)
+
+    self.assertNotIn(f_module.__name__, sys.modules)
+    self.assertEqual(new_g(1), -1)
+
+    # Evicted functions are transformed again.
+    new_f, new_f_module, _ = tr.transform(f, None)
+    self.assertEqual(new_f(1), 0)
+    self.assertIsNot(new_f_module, f_module)
+
+  def test_precompile(self):
+
+    def f(a):
+      return a + 1
+
+    tr = TestTranspiler()
+    self.assertFalse(tr.load_cached(f, None))
+
+    # Precompiled factories are sent across processes.
+    precompiled = pickle.loads(pickle.dumps(tr.precompile(f, None)))
+    self.assertFalse(tr.load_cached(f, None))
+
+    tr.load_precompiled(f, None, precompiled)
+    self.assertTrue(tr.load_cached(f, None))
+
+    new_f, module, source_map = tr.transform(f, None)
+    self.assertEqual(new_f(1), 0)
+    self.assertNotEmpty(source_map)
+    for loc in source_map:
+      self.assertEqual(loc.filename, module.__file__)
+
+  def test_aot_directory(self):
+
+    def f(a):
+      return a + 1
+
+    class PersistableTranspiler(TestTranspiler):
+
+      def get_persistent_caching_key(self, ctx):
+        del ctx
+        return 0
+
+    directory = self.get_temp_dir()
+    tr = PersistableTranspiler()
+    store = cache.GeneratedModuleStore(directory)
+    self.assertTrue(
+        tr.store_precompiled(store, f, None, tr.precompile(f, None)))
+    store.save()
+
+    tr = PersistableTranspiler()
+    tr.transform_ast = None  # Must not be called.
+    tr.set_aot_directory(directory)
+    new_f, module, source_map = tr.transform(f, None)
+
+    self.assertEqual(new_f(1), 0)
+    self.assertEqual(
+        os.path.dirname(os.path.abspath(module.__file__)),
+        os.path.abspath(directory))
+    self.assertNotEmpty(source_map)
+    for loc, origin in source_map.items():
+      self.assertEqual(loc.filename, module.__file__)
+      self.assertEqual(origin.loc.filename, f.__code__.co_filename)
+
+  def test_aot_directory_ignores_changed_functions(self):
+
+    def f(a):
+      return a + 1
+
+    def g(a):
+      return a + 2
+
+    class PersistableTranspiler(TestTranspiler):
+
+      def get_persistent_caching_key(self, ctx):
+        del ctx
+        return 0
+
+    directory = self.get_temp_dir()
+    tr = PersistableTranspiler()
+    store = cache.GeneratedModuleStore(directory)
+    tr.store_precompiled(store, f, None, tr.precompile(f, None))
+    store.save()
+
+    # Same name, different code.
+    g.__qualname__ = f.__qualname__
+    tr = PersistableTranspiler()
+    tr.set_aot_directory(directory)
+    self.assertFalse(tr.load_cached(g, None))
+    new_g, _, _ = tr.transform(g, None)
+    self.assertEqual(new_g(1), -1)
+
 
 if __name__ == '__main__':
   test.main()
@@ -0,0 +1,72 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for ag_logging module."""
+
+import os
+from unittest import mock
+
+from malt.utils import ag_logging
+from tensorflow.python.platform import test
+
+
+class AgLoggingTest(test.TestCase):
+
+  def setUp(self):
+    super(AgLoggingTest, self).setUp()
+    self._verbosity_level = ag_logging.verbosity_level
+    self._echo_log_to_stdout = ag_logging.echo_log_to_stdout
+
+  def tearDown(self):
+    ag_logging.verbosity_level = self._verbosity_level
+    ag_logging.echo_log_to_stdout = self._echo_log_to_stdout
+    ag_logging.refresh_verbosity()
+    super(AgLoggingTest, self).tearDown()
+
+  def test_set_verbosity(self):
+    ag_logging.set_verbosity(3)
+    self.assertEqual(ag_logging.get_verbosity(), 3)
+    self.assertTrue(ag_logging.enabled)
+    self.assertTrue(ag_logging.has_verbosity(3))
+    self.assertFalse(ag_logging.has_verbosity(4))
+
+    ag_logging.set_verbosity(0)
+    self.assertEqual(ag_logging.get_verbosity(), 0)
+    self.assertFalse(ag_logging.enabled)
+
+  def test_environment_variable_is_cached(self):
+    ag_logging.verbosity_level = None
+    ag_logging.refresh_verbosity()
+    before = ag_logging.get_verbosity()
+    with mock.patch.dict(os.environ, {ag_logging.VERBOSITY_VAR_NAME: '2'}):
+      self.assertEqual(ag_logging.get_verbosity(), before)
+      ag_logging.refresh_verbosity()
+      self.assertEqual(ag_logging.get_verbosity(), 2)
+      self.assertTrue(ag_logging.enabled)
+
+      ag_logging.set_verbosity(1)
+      ag_logging.refresh_verbosity()
+      self.assertEqual(ag_logging.get_verbosity(), 1)
+
+  def test_log_disabled(self):
+    ag_logging.set_verbosity(1)
+    with mock.patch.object(ag_logging.logging, 'info') as info:
+      ag_logging.log(2, 'message %s', 'arg')
+      info.assert_not_called()
+      ag_logging.log(1, 'message %s', 'arg')
+      info.assert_called_once_with('message %s', 'arg')
+
+
+if __name__ == '__main__':
+  test.main()
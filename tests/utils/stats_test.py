@@ -0,0 +1,79 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for stats module."""
+
+import time
+
+from malt.utils import stats
+from tensorflow.python.platform import test
+
+
+class StatsTest(test.TestCase):
+
+  def setUp(self):
+    super(StatsTest, self).setUp()
+    stats.reset()
+
+  def test_stages_are_exclusive(self):
+    with stats.stage('outer'):
+      with stats.stage('inner'):
+        time.sleep(0.02)
+
+    s = stats.snapshot()
+    self.assertEqual(s['stages']['outer']['calls'], 1)
+    self.assertEqual(s['stages']['inner']['calls'], 1)
+    self.assertGreaterEqual(s['stages']['inner']['seconds'], 0.02)
+    self.assertLess(s['stages']['outer']['seconds'], 0.02)
+
+  def test_function_breakdown(self):
+
+    def f():
+      pass
+
+    with stats.function(f):
+      with stats.stage('a'):
+        pass
+      with stats.function(f):
+        with stats.stage('b'):
+          pass
+    with stats.stage('c'):
+      pass
+
+    s = stats.snapshot()
+    record = s['functions'][__name__ + '.' + f.__qualname__]
+    self.assertEqual(record['conversions'], 1)
+    self.assertEqual(set(record['stages']), {'a', 'b'})
+    self.assertIn('c', s['stages'])
+
+  def test_caches(self):
+    stats.hit('c')
+    stats.hit('c')
+    stats.miss('c')
+
+    self.assertEqual(stats.snapshot()['caches'], {'c': {'hits': 2, 'misses': 1}})
+
+  def test_reset(self):
+    stats.hit('c')
+    with stats.stage('a'):
+      pass
+
+    stats.reset()
+
+    self.assertEqual(stats.snapshot(),
+                     {'stages': {}, 'caches': {}, 'functions': {}})
+
+
+if __name__ == '__main__':
+  test.main()
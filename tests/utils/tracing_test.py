@@ -0,0 +1,85 @@
+# Copyright 2024 Xanadu Quantum Technologies Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for tracing module."""
+
+import json
+import os
+
+from malt.utils import stats
+from malt.utils import tracing
+from tensorflow.python.platform import test
+
+
+class TracingTest(test.TestCase):
+
+  def tearDown(self):
+    tracing.stop()
+    super(TracingTest, self).tearDown()
+
+  def test_disabled_by_default(self):
+    with tracing.span('a', 'test'):
+      tracing.annotate(x=1)
+
+    self.assertEmpty(tracing.stop())
+
+  def test_span(self):
+    tracing.start()
+    with tracing.span('outer', 'test'):
+      with tracing.span('inner', 'test'):
+        tracing.annotate(x=1)
+      tracing.annotate(y=2)
+    events = tracing.stop()
+
+    inner, outer = events
+    self.assertEqual(inner['name'], 'inner')
+    self.assertEqual(inner['args'], {'x': '1'})
+    self.assertEqual(outer['name'], 'outer')
+    self.assertEqual(outer['args'], {'y': '2'})
+    self.assertEqual(outer['ph'], 'X')
+    self.assertLessEqual(outer['ts'], inner['ts'])
+    self.assertGreaterEqual(outer['ts'] + outer['dur'],
+                            inner['ts'] + inner['dur'])
+
+  def test_span_records_errors(self):
+    tracing.start()
+    with self.assertRaises(ValueError):
+      with tracing.span('a', 'test'):
+        raise ValueError()
+    event, = tracing.stop()
+
+    self.assertEqual(event['args'], {'error': 'ValueError'})
+
+  def test_stats_stages(self):
+    tracing.start()
+    with stats.stage('a'):
+      pass
+    event, = tracing.stop()
+
+    self.assertEqual(event['name'], 'a')
+
+  def test_write(self):
+    tracing.start()
+    with tracing.span('a', 'test'):
+      pass
+    events = tracing.stop()
+    path = os.path.join(self.get_temp_dir(), 'trace.json')
+    tracing.write(path, events)
+
+    with open(path) as f:
+      self.assertEqual(json.load(f)['traceEvents'], events)
+
+
+if __name__ == '__main__':
+  test.main()